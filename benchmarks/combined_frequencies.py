@@ -0,0 +1,104 @@
+"""
+Benchmark of combined word/bigram counting: the original string based
+get_combined_frequencies() against the integer encoded implementation.
+
+    python3 -m benchmarks.combined_frequencies [processed_datafile]
+
+Without a processed datafile (e.g. data/processed_data.txt), reviews are
+generated from the words/bigrams in data/bigram_vocabulary.txt.
+"""
+from collections import Counter
+import random
+import sys
+import time
+from cs4041.review import read_reviews
+from cs4041.vocabulary import (get_combined_frequencies,
+                               get_bigram_frequencies,
+                               read_vocabulary)
+
+VOCABULARY_FNAME = "data/bigram_vocabulary.txt"
+NO_OF_REVIEWS = 20000
+REPEAT = 3
+
+
+def baseline_get_combined_frequencies(strings, min_bigram_occur=3):
+    """
+    get_combined_frequencies() as it was before integer encoding.
+    """
+    def make_bigram(word1, word2):
+        return ' '.join([word1, word2])
+
+    counter = Counter()
+    bigram_counter = get_bigram_frequencies(strings)
+
+    # Add the bigram counts
+    counter.update(bigram_counter)
+
+    for string in strings:
+        words = string.split()
+        no_of_words = len(words)
+        for i, word in enumerate(words):
+            curr_bigrams = []
+            if i >= 1:
+                curr_bigrams.append(make_bigram(words[i-1], words[i]))
+            if i < no_of_words - 1:
+                curr_bigrams.append(make_bigram(words[i], words[i+1]))
+
+            if all([bigram_counter[bigram] < min_bigram_occur
+                    for bigram in curr_bigrams]):
+                counter.update([word])
+
+    return counter
+
+
+def make_reviews(no_of_reviews, seed=0):
+    """
+    Generate reviews from the (Zipf distributed) words/bigrams of the
+    bigram vocabulary.
+    """
+    rng = random.Random(seed)
+    tokens = sorted(read_vocabulary(VOCABULARY_FNAME))
+    weights = [1 / (rank + 1) for rank in range(len(tokens))]
+    rng.shuffle(tokens)
+
+    return [' '.join(rng.choices(tokens, weights, k=rng.randint(3, 40)))
+            for _ in range(no_of_reviews)]
+
+
+def run(name, func, strings):
+    """
+    Time func over the strings, print tokens/sec and return its result.
+    """
+    no_of_tokens = sum(len(string.split()) for string in strings)
+
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = func(strings)
+        best = min(best, time.perf_counter() - start)
+
+    print('{:<36} {:>12.0f} tokens/sec ({:.3f} s)'.format(
+        name, no_of_tokens / best, best))
+
+    return result
+
+
+def main():
+    if len(sys.argv) > 1:
+        strings = [review_text
+                   for review_list in read_reviews(sys.argv[1]).values()
+                   for review_text in review_list]
+    else:
+        strings = make_reviews(NO_OF_REVIEWS)
+
+    print('{} reviews'.format(len(strings)))
+    before = run('get_combined_frequencies (before)',
+                 baseline_get_combined_frequencies, strings)
+    after = run('get_combined_frequencies', get_combined_frequencies,
+                strings)
+
+    assert before == after
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark of review page extraction: pages/sec of the BeautifulSoup
+extractor against the HTMLParser based one, checking that both return
+identical reviews for every page.
+
+    python3 -m benchmarks.extract [cachedir]
+
+The pages are the HTML files saved by stage1 in cachedir (data/cache by
+default), or generated review pages if there are none.
+"""
+import os
+import random
+import sys
+import time
+from cs4041.extract import EXTRACTORS
+
+CACHE_DIRNAME = "data/cache"
+NO_OF_PAGES = 100
+REVIEWS_PER_PAGE = 10
+REPEAT = 3
+
+WORDS = ['great', 'product', 'battery', 'broke', 'after', 'two', 'weeks',
+         'works', 'fine', 'would', 'not', 'buy', 'again', 'love', 'it']
+
+
+def read_pages(dirname):
+    """
+    Return the text of all HTML files in the directory (recursively).
+    """
+    pages = []
+
+    for dirpath, _, fnames in os.walk(dirname):
+        for fname in sorted(fnames):
+            if fname.endswith('.html'):
+                with open(os.path.join(dirpath, fname),
+                          encoding='utf-8') as f:
+                    pages.append(f.read())
+
+    return pages
+
+
+def make_review(rng):
+    """
+    Generate the HTML of a review with some markup and entities.
+    """
+    words = [rng.choice(WORDS) for _ in range(rng.randint(10, 100))]
+
+    for i in range(0, len(words), 15):
+        words[i] = rng.choice(['<br>', '<br/>', '&amp;', '&quot;', '&#39;',
+                               '<b>' + words[i] + '</b>',
+                               '<!-- x -->' + words[i]])
+
+    return ' '.join(words)
+
+
+def make_pages(no_of_pages, seed=0):
+    """
+    Generate review pages, with filler markup around the reviews.
+    """
+    rng = random.Random(seed)
+    filler = ''.join('<div class="a-row"><a href="/x?{0}">link {0}</a>'
+                     '<img src="/{0}.png"></div>'.format(i)
+                     for i in range(50))
+    script = '<script>var x = "<span class=\\"review-text\\">";</script>'
+
+    pages = []
+    for _ in range(no_of_pages):
+        reviews = ''.join(
+            '<div class="a-section review"><div class="a-row">{}</div>'
+            '<span class="a-size-base review-text">{}</span></div>'.format(
+                filler[:500], make_review(rng))
+            for _ in range(REVIEWS_PER_PAGE))
+        pages.append('<!DOCTYPE html><html><head>{}</head><body>{}'
+                     '<div id="cm_cr-review_list">{}</div>{}</body></html>'
+                     .format(script, filler, reviews, filler))
+
+    return pages
+
+
+def run(name, extractor, pages, limit):
+    """
+    Time extractor over the pages, print pages/sec and return its results.
+    """
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = [extractor(page, limit) for page in pages]
+        best = min(best, time.perf_counter() - start)
+
+    print('{:<24} limit={:<6} {:>10.0f} pages/sec ({:.3f} s)'.format(
+        name, str(limit), len(pages) / best, best))
+
+    return result
+
+
+def main():
+    dirname = sys.argv[1] if len(sys.argv) > 1 else CACHE_DIRNAME
+    pages = read_pages(dirname)
+
+    if not pages:
+        pages = make_pages(NO_OF_PAGES)
+
+    print('{} pages, {:.1f} MB'.format(
+        len(pages), sum(len(page) for page in pages) / 2**20))
+
+    for limit in [None, 5]:
+        results = {name: run(name, extractor, pages, limit)
+                   for name, extractor in EXTRACTORS.items()}
+
+        reference = results.pop('bs4')
+        for name, result in results.items():
+            assert result == reference, name
+
+
+if __name__ == '__main__':
+    main()
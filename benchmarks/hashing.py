@@ -0,0 +1,95 @@
+"""
+Report of the 10-fold cross validation accuracy of hashed features (see
+cs4041.hashing) against the number of buckets, with the accuracy of the
+vocabulary based model for reference.
+
+    python3 -m benchmarks.hashing [datafile] [--bigram] [--bits 10 12 ...]
+
+The datafile holds the reviews (text or corpus file). Without a datafile,
+synthetic reviews are generated (see benchmarks.synthetic).
+"""
+import argparse
+import time
+from benchmarks.synthetic import make_reviews
+from cs4041.corpus import Corpus, is_corpus_file
+from cs4041.evaluate import evaluate, evaluate_with_bigram_features
+from cs4041.review import read_reviews
+from cs4041.stopwords import read_stopwords
+from cs4041.train import train, train_corpus, train_with_bigram_features
+
+STOPWORDS_FNAME = "data/stopwords.txt"
+NO_OF_REVIEWS = 20000
+BITS = [10, 12, 14, 16, 18, 20, 22]
+
+
+def run(reviews, stopwords, bigram, buckets=None):
+    """
+    Return the average 10-fold accuracy and the seconds taken.
+    """
+    start = time.perf_counter()
+    if bigram:
+        accuracies = evaluate_with_bigram_features(
+            reviews, stopwords, min_occur=3, seed=0, buckets=buckets)
+    else:
+        accuracies = evaluate(reviews, stopwords, min_occur=2, seed=0,
+                              buckets=buckets)
+    seconds = time.perf_counter() - start
+
+    return sum(accuracies) / len(accuracies), seconds
+
+
+def train_vocabulary_model(reviews, stopwords, bigram):
+    """
+    Train the vocabulary based model on all reviews.
+    """
+    if isinstance(reviews, Corpus):
+        return train_corpus(reviews, min_occur=3 if bigram else 2,
+                            bigram_features=bigram)
+    if bigram:
+        return train_with_bigram_features(reviews, stopwords, min_occur=3)
+
+    return train(reviews, stopwords, min_occur=2)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('datafile', nargs='?', default=None,
+                        help='reviews (text or corpus file)')
+    parser.add_argument('--bigram', action='store_true',
+                        help='use word/bigram features')
+    parser.add_argument('--bits', type=int, nargs='+', default=BITS,
+                        help='log2 of the numbers of buckets to try')
+    args = parser.parse_args()
+
+    stopwords = read_stopwords(STOPWORDS_FNAME)
+
+    if args.datafile is None:
+        reviews = make_reviews(NO_OF_REVIEWS, stopwords=stopwords)
+    elif is_corpus_file(args.datafile):
+        reviews = Corpus(args.datafile)
+    else:
+        reviews = read_reviews(args.datafile)
+
+    print('{:<12} {:>10} {:>10} {:>10} {:>9}'.format(
+        'features', 'columns', 'table MB', 'accuracy', 'seconds'))
+
+    # The likelihoods are one float64 per class and column (the vocabulary
+    # based model also keeps a dictionary of its features, not counted)
+    model = train_vocabulary_model(reviews, stopwords, args.bigram)
+    no_of_classes, columns = model.log_likelihoods.shape
+
+    accuracy, seconds = run(reviews, stopwords, args.bigram)
+    print('{:<12} {:>10} {:>10.2f} {:>10.4f} {:>9.2f}'.format(
+        'vocabulary', columns, columns * no_of_classes * 8 / 2**20,
+        accuracy, seconds))
+
+    for bits in args.bits:
+        buckets = 1 << bits
+        accuracy, seconds = run(reviews, stopwords, args.bigram, buckets)
+        print('{:<12} {:>10} {:>10.2f} {:>10.4f} {:>9.2f}'.format(
+            'hashed 2^{}'.format(bits), buckets,
+            buckets * no_of_classes * 8 / 2**20, accuracy, seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Load test of the classification service (see the serve script): send
+requests from concurrent clients over keep-alive connections and report
+client side latency percentiles and throughput, followed by the server's
+own counters (whose latencies leave out reading the requests and sending
+the responses, see cs4041.service.LatencyStats).
+
+    ./serve &
+    python3 -m benchmarks.load_test [--url URL] [--clients N]
+                                    [--requests N] [--batch N] [datafile]
+
+Without a datafile (CLASS<TAB>REVIEW lines), reviews are generated from the
+words in data/vocabulary.txt.
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+import urllib.parse
+import numpy as np
+from cs4041.review import iter_reviews
+from cs4041.vocabulary import read_vocabulary
+
+VOCABULARY_FNAME = "data/vocabulary.txt"
+NO_OF_REVIEWS = 10000
+
+
+def make_reviews(no_of_reviews, seed=0):
+    """
+    Generate reviews from the words in the vocabulary.
+    """
+    rng = random.Random(seed)
+    words = sorted(read_vocabulary(VOCABULARY_FNAME))
+
+    return [' '.join(rng.choice(words) for _ in range(rng.randint(5, 80)))
+            for _ in range(no_of_reviews)]
+
+
+def client(url, reviews, no_of_requests, batch, latencies, seed):
+    """
+    Send no_of_requests requests (of batch reviews each, or a single review
+    if batch is 0) over one connection, appending their latencies.
+    """
+    rng = random.Random(seed)
+    parts = urllib.parse.urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port)
+    headers = {'Content-Type': 'application/json'}
+
+    for _ in range(no_of_requests):
+        if batch:
+            request = {'reviews': rng.sample(reviews, batch)}
+        else:
+            request = {'review': rng.choice(reviews)}
+
+        start = time.perf_counter()
+        conn.request('POST', '/classify', json.dumps(request), headers)
+        resp = conn.getresponse()
+        resp.read()
+        latencies.append(time.perf_counter() - start)
+
+        if resp.status != 200:
+            raise RuntimeError('HTTP {}'.format(resp.status))
+
+    conn.close()
+
+
+def get_stats(url):
+    """
+    Return the server's counters.
+    """
+    parts = urllib.parse.urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port)
+    conn.request('GET', '/stats')
+
+    return json.loads(conn.getresponse().read().decode())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('datafile', nargs='?')
+    parser.add_argument('--url', default='http://127.0.0.1:8041/')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=500,
+                        help='number of requests per client')
+    parser.add_argument('--batch', type=int, default=0,
+                        help='number of reviews per request (0 for single '
+                             'review requests)')
+    args = parser.parse_args()
+
+    if args.datafile:
+        reviews = [review_text
+                   for _, review_text in iter_reviews(args.datafile)]
+    else:
+        reviews = make_reviews(NO_OF_REVIEWS)
+
+    latencies = []
+    threads = [threading.Thread(target=client,
+                                args=(args.url, reviews, args.requests,
+                                      args.batch, latencies, seed))
+               for seed in range(args.clients)]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    no_of_reviews = len(latencies) * max(args.batch, 1)
+    p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+
+    print('{} clients, {} requests, {} reviews in {:.2f} s'.format(
+        args.clients, len(latencies), no_of_reviews, elapsed))
+    print('client: {:.0f} requests/sec, {:.0f} reviews/sec, '
+          'p50 {:.2f} ms, p99 {:.2f} ms'.format(
+              len(latencies) / elapsed, no_of_reviews / elapsed, p50, p99))
+    print('server: {}'.format(json.dumps(get_stats(args.url), sort_keys=True)))
+
+
+if __name__ == '__main__':
+    main()
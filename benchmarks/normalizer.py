@@ -0,0 +1,110 @@
+"""
+Micro-benchmark of stop word removal: tokens/sec of the original
+re.sub/lower/split implementation of rm_stopwords() against Normalizer.
+
+    python3 -m benchmarks.normalizer [datafile]
+
+Without a datafile (CLASS<TAB>REVIEW lines, e.g. data/data.txt), reviews are
+generated from the words in data/vocabulary.txt and data/stopwords.txt.
+"""
+import random
+import re
+import sys
+import time
+from cs4041.review import read_reviews
+from cs4041.stopwords import Normalizer, read_stopwords
+from cs4041.vocabulary import read_vocabulary
+
+STOPWORDS_FNAME = "data/stopwords.txt"
+VOCABULARY_FNAME = "data/vocabulary.txt"
+NO_OF_REVIEWS = 50000
+REPEAT = 3
+
+
+def baseline_rm_stopwords(strings, stopwords):
+    """
+    rm_stopwords() as it was before Normalizer.
+    """
+    newlist = []
+
+    for string in strings:
+        newstring = re.sub(r'[^a-zA-Z\s]+', '', string)
+        newstring = newstring.lower()
+        newstring = ' '.join([word for word in newstring.split()
+                              if word not in stopwords])
+
+        if len(newstring) > 0:
+            newlist.append(newstring)
+
+    return newlist
+
+
+def make_reviews(no_of_reviews, seed=0):
+    """
+    Generate reviews with some stop words, capitals and punctuation.
+    """
+    rng = random.Random(seed)
+    words = sorted(read_vocabulary(VOCABULARY_FNAME))
+    stopwords = sorted(read_stopwords(STOPWORDS_FNAME))
+    extra = ['Great!', "don't", '5/5', 'WORST', '(really)', 'item,']
+
+    reviews = []
+    for _ in range(no_of_reviews):
+        review = []
+        for _ in range(rng.randint(5, 80)):
+            r = rng.random()
+            if r < 0.4:
+                review.append(rng.choice(stopwords).capitalize())
+            elif r < 0.5:
+                review.append(rng.choice(extra))
+            else:
+                review.append(rng.choice(words))
+        reviews.append(' '.join(review))
+
+    return reviews
+
+
+def run(name, func, reviews, no_of_tokens):
+    """
+    Time func over the reviews, print tokens/sec and return its result.
+    """
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = func(reviews)
+        best = min(best, time.perf_counter() - start)
+
+    print('{:<32} {:>12.0f} tokens/sec ({:.3f} s)'.format(
+        name, no_of_tokens / best, best))
+
+    return result
+
+
+def main():
+    if len(sys.argv) > 1:
+        reviews = [review_text
+                   for review_list in read_reviews(sys.argv[1]).values()
+                   for review_text in review_list]
+    else:
+        reviews = make_reviews(NO_OF_REVIEWS)
+
+    stopwords = read_stopwords(STOPWORDS_FNAME)
+    normalizer = Normalizer(stopwords)
+
+    before = baseline_rm_stopwords(reviews, stopwords)
+    no_of_tokens = sum(len(string.split()) for string in before)
+
+    print('{} reviews, {} tokens after stop word removal'.format(
+        len(reviews), no_of_tokens))
+    run('rm_stopwords (before)',
+        lambda strings: baseline_rm_stopwords(strings, stopwords),
+        reviews, no_of_tokens)
+    after = run('Normalizer.rm_stopwords', normalizer.rm_stopwords,
+                reviews, no_of_tokens)
+    run('Normalizer.tokenize', normalizer.tokenize, reviews, no_of_tokens)
+
+    assert before == after
+
+
+if __name__ == '__main__':
+    main()
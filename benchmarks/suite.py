@@ -0,0 +1,154 @@
+"""
+Benchmark suite: time and memory profile the main functions of cs4041 on
+synthetic reviews (see benchmarks.synthetic) of increasing size, writing
+the results as JSON.
+
+    python3 -m benchmarks.suite [--sizes 10000 100000 1000000]
+                                [--only FUNCTION ...] [--no-memory]
+                                [-o results.json]
+
+For every size and function, the JSON has the wall time (best of --repeat
+runs), the reviews/sec and, unless --no-memory, the peak memory allocated
+while the function runs (measured with tracemalloc in a separate run, as
+tracing slows it down).
+"""
+import argparse
+import datetime
+import json
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+import numpy as np
+from benchmarks.synthetic import make_reviews
+from cs4041.classify import classify_review
+from cs4041.evaluate import evaluate
+from cs4041.stopwords import Normalizer, read_stopwords, rm_stopwords
+from cs4041.train import train, train_with_bigram_features
+from cs4041.vocabulary import get_combined_frequencies, get_word_frequencies
+
+STOPWORDS_FNAME = "data/stopwords.txt"
+SIZES = [10000, 100000, 1000000]
+
+
+def make_benchmarks(reviews, stopwords):
+    """
+    Return the functions to benchmark on the given reviews.
+
+    Returns:
+        A list of (name, function of no arguments) in the order to run them.
+    """
+    all_reviews = [review for review_list in reviews.values()
+                   for review in review_list]
+    normalizer = Normalizer(stopwords)
+    cleaned = normalizer.rm_stopwords(all_reviews)
+    model = train(reviews, normalizer)
+
+    def classify_all():
+        for review in all_reviews:
+            classify_review(review, normalizer, model)
+
+    return [
+        ('rm_stopwords', lambda: rm_stopwords(all_reviews, stopwords)),
+        ('get_word_frequencies', lambda: get_word_frequencies(cleaned)),
+        ('get_combined_frequencies',
+         lambda: get_combined_frequencies(cleaned)),
+        ('train', lambda: train(reviews, stopwords)),
+        ('train_with_bigram_features',
+         lambda: train_with_bigram_features(reviews, stopwords)),
+        ('classify_review', classify_all),
+        ('evaluate', lambda: evaluate(reviews, stopwords, seed=0)),
+    ]
+
+
+def measure(func, repeat, memory):
+    """
+    Return the best wall time of func over repeat runs and (if memory) the
+    peak memory it allocates in bytes (or None).
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help='numbers of reviews to benchmark with')
+    parser.add_argument('--only', nargs='+', default=None,
+                        metavar='FUNCTION',
+                        help='benchmark these functions only')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='number of timed runs of each function')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='do not measure memory (faster)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the synthetic reviews')
+    parser.add_argument('-o', '--output', default=None,
+                        help='JSON file to write the results to '
+                             '(default: stdout)')
+    args = parser.parse_args()
+
+    stopwords = read_stopwords(STOPWORDS_FNAME)
+    results = []
+
+    for size in args.sizes:
+        reviews = make_reviews(size, stopwords=stopwords, seed=args.seed)
+        no_of_tokens = sum(len(review.split())
+                           for review_list in reviews.values()
+                           for review in review_list)
+
+        for name, func in make_benchmarks(reviews, stopwords):
+            if args.only and name not in args.only:
+                continue
+
+            seconds, peak = measure(func, args.repeat, not args.no_memory)
+            results.append({
+                'function': name,
+                'reviews': size,
+                'tokens': no_of_tokens,
+                'seconds': seconds,
+                'reviews_per_sec': size / seconds,
+                'tokens_per_sec': no_of_tokens / seconds,
+                'peak_bytes': peak,
+            })
+            print('{:>8} {:<28} {:>9.3f} s {:>12.0f} reviews/sec{}'.format(
+                size, name, seconds, size / seconds,
+                '' if peak is None else ' {:>8.1f} MB'.format(peak / 2**20)),
+                file=sys.stderr)
+
+    report = {
+        'date': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'seed': args.seed,
+        # Peak resident set size of the whole run (kilobytes on Linux)
+        'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+
+
+if __name__ == '__main__':
+    main()
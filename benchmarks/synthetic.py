@@ -0,0 +1,132 @@
+"""
+Seeded synthetic review generator for the benchmarks.
+
+Words are drawn from a Zipfian distribution over a vocabulary of made up
+(alphabetic) words, mixed with stop words, capitalised words and
+punctuation, as in real reviews. A fraction of the words of each review
+(signal) are drawn from words specific to its class instead, so that the
+classes can be told apart.
+
+    python3 -m benchmarks.synthetic NO_OF_REVIEWS [datafile]
+
+writes CLASS<TAB>REVIEW lines (to stdout without a datafile).
+"""
+import string
+import sys
+import numpy as np
+from cs4041.review import write_reviews
+
+STOPWORDS_FNAME = "data/stopwords.txt"
+PUNCTUATION = ['!', '.', ',', '?', '...', ':)', '5/5', '(really)']
+
+
+def make_words(no_of_words, rng):
+    """
+    Generate distinct alphabetic words of 2 to 12 letters.
+    """
+    letters = np.array(list(string.ascii_lowercase))
+    words = set()
+
+    while len(words) < no_of_words:
+        length = int(rng.randint(2, 13))
+        words.add(''.join(rng.choice(letters, length)))
+
+    return sorted(words)
+
+
+def zipf_probabilities(no_of_words, s):
+    """
+    Return the probability of each rank (1 to no_of_words) under a Zipfian
+    distribution with exponent s.
+    """
+    weights = 1 / np.arange(1, no_of_words + 1) ** s
+    return weights / weights.sum()
+
+
+def make_reviews(no_of_reviews, vocabulary_size=50000, s=1.1,
+                 positive_fraction=0.5, signal=0.05, mean_length=40,
+                 stopwords=None, seed=0):
+    """
+    Generate reviews of two classes.
+
+    Args:
+        no_of_reviews: total number of reviews.
+        vocabulary_size: number of distinct (non stop) words.
+        s: exponent of the Zipfian distribution of the words.
+        positive_fraction: fraction of reviews of class '+'.
+        signal: fraction of the words of a review drawn from the words
+                specific to its class.
+        mean_length: mean number of words of a review (Poisson).
+        stopwords: list of stop words to mix in (None to read
+                   data/stopwords.txt).
+        seed: seed of the generator.
+
+    Returns:
+        A dictionary with
+            - key: class ('+' or '-')
+            - value: list of reviews belonging to this class.
+    """
+    rng = np.random.RandomState(seed)
+
+    if stopwords is None:
+        with open(STOPWORDS_FNAME) as f:
+            stopwords = [line.strip() for line in f if line.strip()]
+    stopwords = sorted(stopwords)
+
+    words = np.array(make_words(vocabulary_size, rng), dtype=object)
+    rng.shuffle(words)
+    probabilities = zipf_probabilities(vocabulary_size, s)
+
+    # The words specific to each class, drawn from the 5% most frequent words
+    no_of_class_words = max(1, vocabulary_size // 20)
+    class_words = {'+': words[rng.permutation(no_of_class_words)[:50]],
+                   '-': words[rng.permutation(no_of_class_words)[:50]]}
+
+    lengths = np.maximum(1, rng.poisson(mean_length, no_of_reviews))
+    total = int(lengths.sum())
+
+    # Draw every word of every review at once, then choose for each position
+    # whether it is a stop word, a class word or (most often) a Zipfian word
+    tokens = words[rng.choice(vocabulary_size, total, p=probabilities)]
+    kinds = rng.random_sample(total)
+    stopword_tokens = np.array(stopwords, dtype=object)[
+        rng.randint(0, len(stopwords), total)]
+    tokens = np.where(kinds < 0.35, stopword_tokens, tokens)
+
+    classes = np.where(rng.random_sample(no_of_reviews) < positive_fraction,
+                       '+', '-')
+    token_classes = np.repeat(classes, lengths)
+    for class_, class_word_list in class_words.items():
+        mask = ((kinds >= 0.35) & (kinds < 0.35 + signal) &
+                (token_classes == class_))
+        tokens[mask] = class_word_list[rng.randint(0, len(class_word_list),
+                                                   int(mask.sum()))]
+
+    # Some capitalised words and punctuation
+    decorations = rng.random_sample(total)
+    capitalised = decorations < 0.05
+    tokens[capitalised] = [token.capitalize()
+                           for token in tokens[capitalised]]
+    punctuated = decorations > 0.95
+    tokens[punctuated] = [token + PUNCTUATION[i % len(PUNCTUATION)]
+                          for i, token in enumerate(tokens[punctuated])]
+
+    reviews = {'+': [], '-': []}
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).tolist()
+    tokens = tokens.tolist()
+
+    for i, class_ in enumerate(classes.tolist()):
+        reviews[class_].append(' '.join(tokens[offsets[i]:offsets[i+1]]))
+
+    return reviews
+
+
+def main():
+    reviews = make_reviews(int(sys.argv[1]))
+    fname = sys.argv[2] if len(sys.argv) > 2 else '/dev/stdout'
+
+    write_reviews(reviews, fname, seed=0)
+
+
+if __name__ == '__main__':
+    main()
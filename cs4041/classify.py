@@ -1,4 +1,7 @@
-from .stopwords import rm_stopwords
+import numpy as np
+from . import instrument
+from .model import as_model
+from .stopwords import as_normalizer
 
 
 def calculate_cond_probability(review_text, class_, trained_model):
@@ -11,128 +14,207 @@ def calculate_cond_probability(review_text, class_, trained_model):
 
     Args:
         review: a string.
-        class_: given class (+/-).
-        trained_model: A 2-tuple
-            1. class probabilities: a dictionary with
-                                    - key: class
-                                    - value: log probability of that class
-            2. likelihoods: a dictionary with
-                            - key: tuple (word/bigram, class)
-                            - value: log(likelihood of word/bigram given class)
+        class_: given class (one of the model's classes).
+        trained_model: a Model (or a 2-tuple in the format accepted by
+                       Model.from_tuple()).
 
     Return:
         Log((probability of class given review) * (probability of review))
     """
-    class_probability = trained_model[0]
-    likelihood = trained_model[1]
-
-    ans = class_probability[class_]
-    words = review_text.split()
-    no_of_words = len(words)
-
-    # Was the current word included in the bigram (previous_word, curr_word)?
-    flag = False
-
-    for idx, curr_word in enumerate(words):
-        curr_bigram = None
-        if idx < no_of_words-1:
-            curr_bigram = ' '.join([curr_word, words[idx+1]])
-
-        # Add bigram probability OR word probability OR unknown probability
-        # in that order
-        if curr_bigram is not None and (curr_bigram, class_) in likelihood:
-            ans = ans + likelihood[(curr_bigram, class_)]
-            flag = True
-        else:
-            if not flag:
-                if (curr_word, class_) in likelihood:
-                    ans = ans + likelihood[(curr_word, class_)]
-                else:
-                    ans = ans + likelihood[('<UNKNOWN>', class_)]
-            flag = False
-
-    return ans
-
-
-def classify_review(review_text, stopwords, trained_model):
+    model = as_model(trained_model)
+    ids = model.encode(review_text.split())
+
+    return float(model.log_scores(ids)[model.class_index[class_]])
+
+
+def get_class_pair(model):
+    """
+    Return the (positive, negative) classes of a model with two classes:
+    ('+', '-') if those are its classes, otherwise its classes in order.
     """
-    Given a review, classify it into +/- using given trained model.
+    if '+' in model.class_index and '-' in model.class_index:
+        return '+', '-'
+
+    positive, negative = model.classes
+
+    return positive, negative
+
+
+def classify_review(review_text, stopwords, trained_model, early_exit=False):
+    """
+    Given a review, classify it into one of the classes of the given trained
+    model.
+
+    With two classes, the review is scored in a single pass over its words
+    using the log odds of one class against the other precomputed for every
+    feature (see Model.log_odds() and get_class_pair()). With more classes
+    (e.g. star ratings), the scores of all classes are computed at once from
+    the likelihood columns of the features of the review (see
+    Model.log_scores()) and the best is taken. Either way, ties go to the
+    class that comes first in the model's list of classes, as in
+    classify_reviews().
 
     Args:
         review: a string.
-        stopwords: list of words to remove from all reviews.
-        trained_model: A 2-tuple
-            1. class probabilities: a dictionary with
-                                    - key: class
-                                    - value: log probability of that class
-            2. likelihoods: a dictionary with
-                            - key: tuple (word/bigram, class)
-                            - value: log(likelihood of word/bigram given class)
+        stopwords: list of words (or a Normalizer) to remove from all
+                   reviews.
+        trained_model: a Model (or a 2-tuple in the format accepted by
+                       Model.from_tuple()).
+        early_exit: stop scoring as soon as the remaining words cannot
+                    change the predicted class (two classes only).
 
     Return:
-        '+' or '-'
+        The predicted class ('+' or '-' for a model of these classes).
     """
-    ans = '+'
-    prob = {}
+    model = as_model(trained_model)
 
     # remove stop words
-    cleaned_review = rm_stopwords([review_text], stopwords)[0]
+    words = as_normalizer(stopwords).tokens(review_text)
+
+    if len(model.classes) == 2:
+        positive, negative = get_class_pair(model)
+        log_odds = model.log_odds(positive, negative).score(words, early_exit)
+
+        if log_odds == 0:
+            return model.classes[0]
+
+        return negative if log_odds < 0 else positive
+
+    scores = model.log_scores(model.encode(words))
 
-    for class_ in ['+', '-']:
-        prob[class_] = calculate_cond_probability(cleaned_review, class_,
-                                                  trained_model)
+    return model.classes[int(scores.argmax())]
 
-    if prob['-'] > prob['+']:
-        ans = '-'
 
-    return ans
+def classify_reviews(reviews, stopwords, trained_model):
+    """
+    Classify a batch of reviews using given trained model.
+
+    The whole batch is encoded into a sparse document-feature matrix (with
+    the same bigram/word matching as classify_review()) and the scores of
+    all classes are computed at once. Ties are resolved in favour of the
+    class that comes first in the model's list of classes.
 
+    Args:
+        reviews: list of strings.
+        stopwords: list of words (or a Normalizer) to remove from all
+                   reviews.
+        trained_model: a Model (or a 2-tuple in the format accepted by
+                       Model.from_tuple()).
 
-def calculate_accuracy(reviews, stopwords, trained_model):
+    Return:
+        A 2-tuple:
+        1. array of the predicted class of each review.
+        2. array of shape (number of reviews, number of classes) with the
+           log((probability of class given review) * (probability of
+           review)) of each review and class (in the order of the model's
+           classes).
+    """
+    model = as_model(trained_model)
+
+    # remove stop words
+    documents = as_normalizer(stopwords).tokenize(reviews)
+
+    scores = model.log_scores_batch(*model.encode_batch(documents))
+    labels = np.array(model.classes)[scores.argmax(axis=1)]
+
+    return labels, scores
+
+
+def classify_documents(corpus, docs, trained_model):
+    """
+    Classify a batch of documents of a Corpus (see corpus.Corpus), as
+    classify_reviews() does, working on their token ids.
+
+    Args:
+        corpus: a Corpus.
+        docs: list of document indices.
+        trained_model: a Model (or a 2-tuple in the format accepted by
+                       Model.from_tuple()).
+
+    Return:
+        A 2-tuple as returned by classify_reviews().
+    """
+    model = as_model(trained_model)
+
+    scores = model.log_scores_batch(*model.encode_ids(
+        *corpus.documents(docs), corpus.tokens))
+    labels = np.array(model.classes)[scores.argmax(axis=1)]
+
+    return labels, scores
+
+
+def confusion_matrix(reviews, stopwords, trained_model, corpus=None):
+    """
+    Classify all reviews (after stop word removal) using the given trained
+    model and count the reviews of each class classified as each class.
+
+    Args:
+        reviews: dictionary with
+                 - key: class
+                 - value: list of reviews belonging to this class.
+        stopwords: list of words (or a Normalizer) to remove from all
+                   reviews.
+        trained_model: a Model (or a 2-tuple in the format accepted by
+                       Model.from_tuple()).
+        corpus: a Corpus, in which case the reviews are lists of indices of
+                its (already cleaned) documents and stopwords is not used.
+
+    Return:
+        A 2-tuple:
+        1. list of classes: the model's, followed by the classes of the
+           reviews the model does not know.
+        2. array of shape (number of classes, number of classes), with the
+           number of reviews of class i classified as class j at [i, j].
+    """
+    model = as_model(trained_model)
+    classes = model.classes + [class_ for class_ in reviews
+                               if class_ not in model.class_index]
+    class_index = {class_: i for i, class_ in enumerate(classes)}
+    matrix = np.zeros((len(classes), len(classes)), dtype=np.int64)
+
+    if corpus is None:
+        normalizer = as_normalizer(stopwords)
+
+    for class_, review_list in reviews.items():
+        with instrument.phase('score', docs=len(review_list)):
+            if corpus is None:
+                _, scores = classify_reviews(review_list, normalizer, model)
+            else:
+                _, scores = classify_documents(corpus, review_list, model)
+
+        # Columns of the predicted classes (see classify_reviews())
+        matrix[class_index[class_]] += np.bincount(
+            scores.argmax(axis=1), minlength=len(classes))
+
+    return classes, matrix
+
+
+def calculate_accuracy(reviews, stopwords, trained_model, corpus=None):
     """
     Calculate the accuracy of classification of all reviews (after stop word
-    removal), using the given trained model.
+    removal), using the given trained model, from the confusion matrix (see
+    confusion_matrix()) of any number of classes.
 
-                     tp + tn
-    Accuracy = -------------------
-                fp + tp + tn + fn
+                  number of reviews classified as their class
+    Accuracy = -------------------------------------------------
+                            total number of reviews
 
-    where,
-        tp = number of true positives
-        tn = number of true negatives
-        fp = number of false positives
-        fn = number of false negatives
+    (with '+'/'-' reviews, (tp + tn) / (fp + tp + tn + fn)).
 
     Args:
         reviews: dictionary with
                  - key: class
                  - value: list of reviews belonging to this class.
-        stopwords: list of words to remove from all reviews.
-        trained_model: A 2-tuple
-            1. class probabilities: a dictionary with
-                                    - key: class
-                                    - value: log probability of that class
-            2. likelihoods: a dictionary with
-                            - key: tuple (word/bigram, class)
-                            - value: log(likelihood of word/bigram given class)
+        stopwords: list of words (or a Normalizer) to remove from all
+                   reviews.
+        trained_model: a Model (or a 2-tuple in the format accepted by
+                       Model.from_tuple()).
+        corpus: a Corpus, in which case the reviews are lists of indices of
+                its (already cleaned) documents and stopwords is not used.
 
     Return:
         Accuracy of the model in classifying given reviews.
     """
-    tp, tn, fp, fn = [0] * 4
+    _, matrix = confusion_matrix(reviews, stopwords, trained_model, corpus)
 
-    for class_, review_list in reviews.items():
-        for review_text in review_list:
-            predicted_class = classify_review(review_text, stopwords,
-                                              trained_model)
-
-            if class_ == '+' and predicted_class == '+':
-                tp = tp + 1
-            elif class_ == '-' and predicted_class == '-':
-                tn = tn + 1
-            elif class_ == '-' and predicted_class == '+':
-                fp = fp + 1
-            elif class_ == '+' and predicted_class == '-':
-                fn = fn + 1
-
-    return (tp + tn) / (tp + tn + fp + fn)
+    return float(np.trace(matrix) / matrix.sum())
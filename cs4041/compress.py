@@ -0,0 +1,266 @@
+import numpy as np
+from .model import Model, as_model
+
+# Largest magnitude of a quantized (int8) likelihood
+INT8_LEVELS = 127
+
+
+def get_feature_counts(model, alpha=1):
+    """
+    Recover the count of every token of the vocabulary in each class from
+    the (add-alpha smoothed, see train.get_likelihood_table()) likelihoods
+    of a model:
+
+        P(t | c) / P('<UNKNOWN>' | c) = (count(t, c) + alpha) / alpha
+
+    Args:
+        model: a Model.
+        alpha: smoothing count the model was trained with.
+
+    Returns:
+        An array of shape (number of classes, number of tokens).
+    """
+    log_likelihoods = np.asarray(model.log_likelihoods, dtype=np.float64)
+    unknown = log_likelihoods[:, model.unknown_id:model.unknown_id + 1]
+    counts = alpha * np.exp(log_likelihoods[:, :model.unknown_id] -
+                            unknown) - alpha
+
+    # Counts are whole numbers (up to rounding errors)
+    return np.maximum(np.round(counts), 0)
+
+
+def log_odds_scores(model, alpha=1):
+    """
+    Score every token by the largest log odds between two classes of its
+    likelihoods (|log(P(t | +) / P(t | -))| with two classes), tokens whose
+    likelihoods are nearly equal in every class hardly changing a decision.
+
+    Rare tokens get the most extreme log odds, so this is best used with a
+    threshold (to drop the nearly neutral tokens) rather than a top K. The
+    smoothing count alpha is not needed.
+    """
+    log_likelihoods = model.log_likelihoods[:, :model.unknown_id]
+
+    return log_likelihoods.max(axis=0) - log_likelihoods.min(axis=0)
+
+
+def chi2_scores(model, alpha=1):
+    """
+    Score every token by the chi-square statistic of the independence of
+    its occurrences and the classes (counted by get_feature_counts()).
+    """
+    counts = get_feature_counts(model, alpha)
+    class_totals = counts.sum(axis=1, keepdims=True)
+    token_totals = counts.sum(axis=0, keepdims=True)
+    expected = class_totals * token_totals / counts.sum()
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = np.where(expected > 0, (counts - expected) ** 2 / expected, 0)
+
+    return terms.sum(axis=0)
+
+
+def mutual_information_scores(model, alpha=1):
+    """
+    Score every token by the mutual information of the class of a token
+    occurrence and whether the occurrence is of that token (counted by
+    get_feature_counts()).
+    """
+    counts = get_feature_counts(model, alpha)
+    total = counts.sum()
+    p_class = counts.sum(axis=1, keepdims=True) / total
+
+    # Joint probabilities of (class, token) and (class, any other token)
+    p_token = counts / total
+    p_other = p_class - p_token
+    p_token_total = p_token.sum(axis=0, keepdims=True)
+
+    def terms(joint, marginal):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(joint > 0,
+                            joint * np.log(joint / (marginal * p_class)), 0)
+
+    return (terms(p_token, p_token_total).sum(axis=0) +
+            terms(p_other, 1 - p_token_total).sum(axis=0))
+
+
+SCORES = {
+    'log_odds': log_odds_scores,
+    'chi2': chi2_scores,
+    'mi': mutual_information_scores,
+}
+
+
+def select_features(model, k=None, threshold=None, score='log_odds',
+                    alpha=1):
+    """
+    Select the most useful tokens of a model.
+
+    Args:
+        model: a Model (or a 2-tuple, see Model.from_tuple()).
+        k: number of tokens to keep (the best scoring ones).
+        threshold: keep the tokens scoring at least this much.
+        score: how to score the tokens (a key of SCORES).
+        alpha: smoothing count the model was trained with.
+
+    Returns:
+        A sorted array of the columns of the tokens to keep.
+    """
+    model = as_model(model)
+    scores = SCORES[score](model, alpha)
+    keep = np.ones(len(scores), dtype=bool)
+
+    if threshold is not None:
+        keep &= scores >= threshold
+
+    if k is not None and k < np.count_nonzero(keep):
+        candidates = np.flatnonzero(keep)
+        # Stable, so that ties are broken by column
+        best = np.argsort(-scores[candidates], kind='stable')[:k]
+        keep[:] = False
+        keep[candidates[best]] = True
+
+    return np.flatnonzero(keep)
+
+
+def prune_model(model, columns):
+    """
+    Return a model with only the given tokens of a model, and a
+    '<UNKNOWN>' likelihood that is the same in every class.
+
+    The words of the other tokens are then matched as '<UNKNOWN>' (or as
+    the kept words of a dropped bigram). The '<UNKNOWN>' likelihood of a
+    trained model differs by class, which would count every dropped word
+    towards the classes with the fewest tokens; made the same in every
+    class (the mean over the classes), it leaves the decision to the kept
+    tokens.
+
+    Args:
+        model: a Model.
+        columns: sorted array of the columns of the tokens to keep.
+
+    Returns:
+        A Model.
+    """
+    columns = np.asarray(columns, dtype=np.intp)
+    tokens = [model.tokens[col] for col in columns.tolist()]
+
+    log_likelihoods = np.empty((len(model.classes), len(tokens) + 1))
+    log_likelihoods[:, :-1] = model.log_likelihoods[:, columns]
+    log_likelihoods[:, -1] = model.log_likelihoods[:, model.unknown_id].mean()
+
+    return Model(tokens, model.classes, log_likelihoods, model.log_priors)
+
+
+def count_features(model):
+    """
+    Return the number of tokens of a model whose likelihood is not the same
+    in every class (those that can change a decision).
+    """
+    log_likelihoods = model.log_likelihoods[:, :model.unknown_id]
+
+    return int(np.count_nonzero(log_likelihoods.max(axis=0) !=
+                                log_likelihoods.min(axis=0)))
+
+
+def quantize(log_likelihoods):
+    """
+    Quantize the likelihoods to int8, as
+
+        log_likelihood = offset + scale * quantized
+
+    with a scale and offset covering the range of all the likelihoods. They
+    are the same for every class (though stored per class), so that a
+    likelihood equal in every class (e.g. '<UNKNOWN>', see prune_model())
+    stays equal.
+
+    Args:
+        log_likelihoods: array of shape (number of classes, number of
+                         columns).
+
+    Returns:
+        A 3-tuple:
+        1. int8 array of the shape of log_likelihoods.
+        2. float64 array of the scale of each class.
+        3. float64 array of the offset of each class.
+    """
+    log_likelihoods = np.asarray(log_likelihoods, dtype=np.float64)
+    no_of_classes = log_likelihoods.shape[0]
+    high = log_likelihoods.max()
+    low = log_likelihoods.min()
+
+    offsets = np.full(no_of_classes, (high + low) / 2)
+    scales = np.full(no_of_classes, (high - low) / (2 * INT8_LEVELS))
+    # A single likelihood value
+    scales[scales == 0] = 1
+
+    quantized = np.round((log_likelihoods - offsets[:, None]) /
+                         scales[:, None])
+
+    return (np.clip(quantized, -INT8_LEVELS, INT8_LEVELS).astype(np.int8),
+            scales, offsets)
+
+
+def dequantize(quantized, scales, offsets):
+    """
+    Return the (float32) likelihoods of quantize()d likelihoods.
+    """
+    return (quantized.astype(np.float32) * scales[:, None].astype(np.float32)
+            + offsets[:, None].astype(np.float32))
+
+
+def round_likelihoods(model, dtype):
+    """
+    Return a model with the likelihoods of a model rounded as they are when
+    stored as dtype (see modelfile.write_model()), to measure the accuracy of
+    a model stored with fewer bits.
+
+    Args:
+        model: a Model.
+        dtype: numpy type (float64, float32, float16 or int8).
+
+    Returns:
+        A Model.
+    """
+    dtype = np.dtype(dtype)
+
+    if dtype == np.int8:
+        log_likelihoods = dequantize(*quantize(model.log_likelihoods))
+    elif dtype == np.float16:
+        log_likelihoods = model.log_likelihoods.astype(np.float16).astype(
+            np.float32)
+    else:
+        log_likelihoods = model.log_likelihoods.astype(dtype)
+
+    return Model(model.tokens, model.classes, log_likelihoods,
+                 model.log_priors, token_index=model.token_index)
+
+
+def compress_model(model, k=None, threshold=None, score='log_odds',
+                   dtype=None, alpha=1):
+    """
+    Compress a model by keeping only its most useful tokens (see
+    select_features() and prune_model()) and optionally rounding its
+    likelihoods as they are when stored as dtype (see round_likelihoods()).
+
+    Args:
+        model: a Model (or a 2-tuple, see Model.from_tuple()).
+        k: number of tokens to keep (None to keep them all).
+        threshold: keep the tokens scoring at least this much.
+        score: how to score the tokens (a key of SCORES).
+        dtype: numpy type the likelihoods will be stored as (None to keep
+               them as they are).
+        alpha: smoothing count the model was trained with.
+
+    Returns:
+        A Model.
+    """
+    model = as_model(model)
+
+    if k is not None or threshold is not None:
+        model = prune_model(model, select_features(model, k, threshold,
+                                                   score, alpha))
+    if dtype is not None:
+        model = round_likelihoods(model, dtype)
+
+    return model
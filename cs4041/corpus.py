@@ -0,0 +1,259 @@
+from array import array
+import mmap
+import numpy as np
+import struct
+from .modelfile import TokenTable, align
+
+# First bytes of every corpus file
+MAGIC = b'CS4041IC'
+VERSION = 1
+
+# Header: magic, version, number of classes, number of tokens, number of
+# documents, length of the token stream, followed by the byte offset of each
+# section:
+#   1. ids: int32 array of the token ids of all documents, one after the
+#      other
+#   2. offsets: int64 array of length no_of_docs + 1, such that the ids of
+#      document i are ids[offsets[i]:offsets[i+1]]
+#   3. labels: int32 array of the class (index) of each document
+#   4. class offsets/blob (see modelfile.TokenTable)
+#   5. token offsets/blob, such that token i is the word with id i
+# All numbers are little endian and every section is aligned to 8 bytes.
+HEADER = struct.Struct('<8sIIQQQQQQQQQQ')
+
+# Number of ids buffered in memory before writing them out
+BUFFER_SIZE = 1 << 20
+
+
+class Corpus:
+    """
+    A corpus of cleaned reviews encoded as integer token ids, memory mapped
+    from a corpus file (see CorpusWriter), so that it is read without
+    splitting (or cleaning) any text again.
+
+    Attributes:
+        fname: name of the corpus file.
+        tokens: list of words, such that tokens[id] is the word with that id.
+        classes: list of classes.
+        ids: int32 array of the token ids of all documents.
+        offsets: int64 array of offsets of each document in ids.
+        labels: int32 array of the index (in classes) of the class of each
+                document.
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+
+        with open(fname, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(buf) < HEADER.size or buf[:len(MAGIC)] != MAGIC:
+            raise ValueError('{} is not a corpus file.'.format(fname))
+
+        (_, version, no_of_classes, no_of_tokens, no_of_docs, no_of_ids,
+         ids_start, offsets_start, labels_start, class_offsets_start,
+         class_blob_start, token_offsets_start,
+         token_blob_start) = HEADER.unpack_from(buf)
+
+        if version != VERSION:
+            raise ValueError('{} is a corpus file of an unsupported version '
+                             '({}).'.format(fname, version))
+
+        def array(dtype, count, start):
+            # Converts to native byte order (with a copy) on big endian
+            # machines
+            return np.frombuffer(buf, dtype=dtype, count=count,
+                                 offset=start).astype(dtype.newbyteorder('='),
+                                                      copy=False)
+
+        def table(count, offsets_start, blob_start):
+            offsets = array(np.dtype('<u8'), count + 1, offsets_start)
+            blob = buf[blob_start:blob_start + int(offsets[-1])]
+            return list(TokenTable(offsets, blob))
+
+        self.ids = array(np.dtype('<i4'), no_of_ids, ids_start)
+        self.offsets = array(np.dtype('<i8'), no_of_docs + 1, offsets_start)
+        self.labels = array(np.dtype('<i4'), no_of_docs, labels_start)
+        self.classes = table(no_of_classes, class_offsets_start,
+                             class_blob_start)
+        self.tokens = table(no_of_tokens, token_offsets_start,
+                            token_blob_start)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __reduce__(self):
+        # Open the file again (e.g. in a worker process) instead of copying
+        # the arrays
+        return (Corpus, (self.fname,))
+
+    def class_docs(self):
+        """
+        Return the documents of each class.
+
+        Returns:
+            A dictionary (in the order of classes) with
+                - key: class
+                - value: list of the indices of the documents of this class
+                         (in the order of the corpus)
+        """
+        return {class_: np.flatnonzero(self.labels == i).tolist()
+                for i, class_ in enumerate(self.classes)}
+
+    def documents(self, docs=None):
+        """
+        Return the token ids of the given documents, one after the other.
+
+        Args:
+            docs: list of document indices (None for all documents).
+
+        Returns:
+            A 2-tuple:
+            1. ids: int64 array of the ids of all words of the documents.
+            2. offsets: array of length len(docs) + 1, such that the ids of
+                        the words of document docs[i] are
+                        ids[offsets[i]:offsets[i+1]].
+        """
+        if docs is None:
+            return self.ids.astype(np.int64), self.offsets - self.offsets[0]
+
+        docs = np.asarray(docs, dtype=np.intp)
+        starts = self.offsets[docs]
+        lengths = self.offsets[docs + 1] - starts
+
+        offsets = np.zeros(len(docs) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        # Position (in self.ids) of each id of the documents
+        positions = (np.repeat(starts - offsets[:-1], lengths) +
+                     np.arange(offsets[-1]))
+
+        return self.ids[positions].astype(np.int64), offsets
+
+    def class_documents(self):
+        """
+        Return the token ids of the documents of each class (see
+        documents()).
+
+        Returns:
+            A dictionary with
+                - key: class
+                - value: (ids, offsets) of the documents of this class
+        """
+        return {class_: self.documents(docs)
+                for class_, docs in self.class_docs().items()}
+
+
+class CorpusWriter:
+    """
+    Write cleaned reviews to a corpus file with given filename one at a time
+    (see Corpus), holding only the token dictionary and the document
+    offsets in memory.
+
+    Use as a context manager:
+
+        with CorpusWriter(fname) as writer:
+            writer.write(class_, review_text)
+    """
+
+    def __init__(self, fname):
+        self.f = open(fname, 'wb')
+        self.token_index = {}
+        self.class_index = {}
+        self.buffer = array('i')
+        self.offsets = array('q', [0])
+        self.labels = array('i')
+        self.no_of_ids = 0
+
+        # The header is written once the sizes are known
+        self.f.write(b'\0' * align(HEADER.size))
+        self.ids_start = self.f.tell()
+
+    def write(self, class_, review_text):
+        """
+        Write a review (skipping empty reviews).
+
+        Args:
+            class_: class of the review.
+            review_text: a cleaned review.
+        """
+        words = review_text.split()
+        if len(words) == 0:
+            return
+
+        token_index = self.token_index
+        self.buffer.extend([token_index.setdefault(word, len(token_index))
+                            for word in words])
+        self.no_of_ids = self.no_of_ids + len(words)
+        self.offsets.append(self.no_of_ids)
+        self.labels.append(self.class_index.setdefault(class_,
+                                                       len(self.class_index)))
+
+        if len(self.buffer) >= BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        """
+        Write out the buffered ids.
+        """
+        self.f.write(np.frombuffer(self.buffer, dtype=np.int32)
+                     .astype('<i4').tobytes())
+        self.buffer = array('i')
+
+    def close(self):
+        """
+        Write out the rest of the corpus and close the file.
+        """
+        self.flush()
+
+        classes = TokenTable.from_strings(list(self.class_index))
+        tokens = TokenTable.from_strings(list(self.token_index))
+        sections = [np.frombuffer(self.offsets, dtype=np.int64)
+                    .astype('<i8').tobytes(),
+                    np.frombuffer(self.labels, dtype=np.int32)
+                    .astype('<i4').tobytes(),
+                    classes.offsets.astype('<u8').tobytes(),
+                    classes.blob.tobytes(),
+                    tokens.offsets.astype('<u8').tobytes(),
+                    tokens.blob.tobytes()]
+
+        starts = [self.ids_start]
+        for section in sections:
+            start = align(self.f.tell())
+            self.f.write(b'\0' * (start - self.f.tell()))
+            self.f.write(section)
+            starts.append(start)
+
+        self.f.seek(0)
+        self.f.write(HEADER.pack(MAGIC, VERSION, len(self.class_index),
+                                 len(self.token_index), len(self.labels),
+                                 self.no_of_ids, *starts))
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def is_corpus_file(fname):
+    """
+    Return whether the file with given filename is a corpus file.
+    """
+    with open(fname, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def write_corpus(reviews, fname):
+    """
+    Write the (cleaned) reviews to a corpus file.
+
+    Args:
+        reviews: iterable of 2-tuples of (class, review) (e.g.
+                 iter_reviews(fname)).
+        fname: name of the corpus file.
+    """
+    with CorpusWriter(fname) as writer:
+        for class_, review_text in reviews:
+            writer.write(class_, review_text)
@@ -0,0 +1,347 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+import random
+import requests
+from requests.adapters import HTTPAdapter
+import threading
+import time
+import urllib.parse
+from .extract import extract_reviews
+
+REVIEW_BASE_URL = "http://www.amazon.{TLD}/product-reviews/"
+VALID_TLDS = ['com.au', 'com.br', 'ca', 'cn', 'fr', 'de', 'in',
+              'it', 'co.jp', 'com.mx', 'nl', 'es', 'co.uk', 'com']
+
+
+class TokenBucket:
+    """
+    A thread safe token bucket rate limiter: allow on average rate requests
+    per second, in bursts of at most capacity requests.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token from the bucket, waiting for one if it is empty.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.last) * self.rate)
+                self.last = now
+
+                if self.tokens >= 1:
+                    self.tokens = self.tokens - 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class PageCache:
+    """
+    An on-disk cache of raw pages, keyed by URL (including the query
+    string).
+
+    Each page is stored in its own file, named after the SHA-1 of its URL,
+    and written atomically so that a crash never leaves a partial page.
+
+    Attributes:
+        directory: directory the pages are stored in.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, url):
+        """
+        Return the file name of the page with given URL.
+        """
+        digest = hashlib.sha1(url.encode()).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + '.html')
+
+    def get(self, url):
+        """
+        Return the cached page with given URL, or None if it is not cached.
+        """
+        try:
+            with open(self.path(url), encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, url, text):
+        """
+        Cache the page with given URL.
+        """
+        path = self.path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+
+class CrawlState:
+    """
+    A record of the completed crawl units (asin, tld, class, page), kept in
+    a file with one JSON object per line, appended to as soon as a unit is
+    completed (so that it survives a crash).
+
+    Attributes:
+        fname: name of the file.
+        done: dictionary with
+              - key: (asin, tld, class, page)
+              - value: URL of the page
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.done = {}
+        self.lock = threading.Lock()
+
+        if os.path.exists(fname):
+            with open(fname) as f:
+                for line in f:
+                    # Skip a line left incomplete by a crash
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+
+                    unit = (record['asin'], record['tld'], record['class'],
+                            record['page'])
+                    self.done[unit] = record['url']
+
+    def is_done(self, unit):
+        """
+        Return whether the given (asin, tld, class, page) unit is completed.
+        """
+        return unit in self.done
+
+    def add(self, unit, url):
+        """
+        Record the given (asin, tld, class, page) unit as completed.
+        """
+        asin, tld, class_, page = unit
+        line = json.dumps({'asin': asin, 'tld': tld, 'class': class_,
+                           'page': page, 'url': url})
+
+        with self.lock:
+            if unit not in self.done:
+                self.done[unit] = url
+                with open(self.fname, 'a') as f:
+                    f.write(line + '\n')
+
+
+class Crawler:
+    """
+    Fetch review pages concurrently over pooled HTTP connections.
+
+    Requests are limited to per_host concurrent requests for each host and
+    (optionally) to rate requests per second in total. A request answered
+    with a 503 is retried up to max_retries times, waiting
+    backoff * 2^attempt seconds (capped at max_backoff, with jitter)
+    between attempts.
+
+    With a PageCache and a CrawlState, every page fetched is cached and
+    recorded as completed, and completed pages are read from the cache
+    instead of being fetched again. In offline mode nothing is fetched and
+    the reviews are replayed from the completed pages only.
+
+    The reviews are extracted from each page with extractor, a function
+    (text, limit) returning the list of reviews in the page (see
+    cs4041.extract).
+
+    Attributes:
+        session: requests.Session used for all requests.
+        workers: maximum number of concurrent requests.
+        base_url: base URL of the review pages, with a {TLD} placeholder.
+        cache: PageCache (or None).
+        state: CrawlState (or None).
+        offline: whether to only replay completed pages from the cache.
+        extractor: function extracting the reviews from a page.
+    """
+
+    def __init__(self, workers=8, per_host=4, rate=None, max_retries=8,
+                 backoff=1.0, max_backoff=60.0, base_url=REVIEW_BASE_URL,
+                 session=None, cache=None, state=None, offline=False,
+                 extractor=extract_reviews):
+        self.workers = workers
+        self.extractor = extractor
+        self.cache = cache
+        self.state = state
+        self.offline = offline
+        self.per_host = per_host
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.base_url = base_url
+        self.rate_limiter = None if rate is None else TokenBucket(rate)
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=max(workers, 1),
+                                  pool_maxsize=max(workers, 1))
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+
+        # key: host
+        # value: semaphore limiting the concurrent requests to the host
+        self.host_semaphores = defaultdict(
+            lambda: threading.BoundedSemaphore(self.per_host))
+        self.host_lock = threading.Lock()
+
+    def get(self, url, params=None):
+        """
+        GET the given URL, retrying (with capped exponential backoff) as long
+        as the server responds with a 503.
+
+        Args:
+            url: URL to fetch.
+            params: dictionary of query parameters.
+
+        Returns:
+            The requests.Response (which may be a 503 if all retries
+            failed).
+        """
+        with self.host_lock:
+            semaphore = self.host_semaphores[urllib.parse.urlsplit(url).netloc]
+
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            with semaphore:
+                resp = self.session.get(url, params=params)
+
+            if resp.status_code != 503 or attempt == self.max_retries:
+                return resp
+
+            delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+            time.sleep(random.uniform(delay / 2, delay))
+
+        return resp
+
+    def get_page(self, unit, url, params, raise_for_status=True):
+        """
+        Return a review page, from the cache if the unit was completed
+        before, otherwise fetching (and caching) it.
+
+        Args:
+            unit: (asin, tld, class, page) of the page.
+            url: URL of the page, without the query string.
+            params: dictionary of query parameters.
+            raise_for_status: whether to raise an error for an unsuccessful
+                              response.
+
+        Returns:
+            The text of the page (or None if it has to be fetched in offline
+            mode).
+
+        Raises:
+            HTTPError
+        """
+        full_url = requests.Request('GET', url, params=params).prepare().url
+
+        if self.cache is not None and (self.state is None or
+                                       self.state.is_done(unit)):
+            text = self.cache.get(full_url)
+            if text is not None:
+                return text
+
+        if self.offline:
+            return None
+
+        resp = self.get(url, params=params)
+
+        if raise_for_status:
+            resp.raise_for_status()
+
+        if resp.status_code == 200:
+            if self.cache is not None:
+                self.cache.put(full_url, resp.text)
+            if self.state is not None:
+                self.state.add(unit, full_url)
+
+        return resp.text
+
+    def get_reviews(self, asin, tld, class_=None, limit=10):
+        """
+        Fetch customer reviews for any Amazon product.
+
+        Args:
+            asin: Amazon Standard Identification Number.
+            tld: top level domain of the Amazon store for this ASIN.
+            class_: class of reviews to fetch => +/-/None
+            limit: maximum number of reviews to fetch.
+
+        Returns:
+            A list of reviews.
+
+        Raises:
+            HTTPError
+            ValueError
+        """
+        if tld not in VALID_TLDS:
+            raise ValueError('{} is not a valid Amazon TLD.'.format(tld))
+
+        url = urllib.parse.urljoin(self.base_url.format(TLD=tld), asin)
+        params = {'pageNumber': 1}
+        reviews = []
+
+        if class_ == '+':
+            params['filterByStar'] = "positive"
+        elif class_ == '-':
+            params['filterByStar'] = "critical"
+
+        while limit > 0:
+            # Raise an error if no reviews have been collected.
+            text = self.get_page((asin, tld, class_, params['pageNumber']),
+                                 url, params,
+                                 raise_for_status=len(reviews) == 0)
+
+            # Stop if this page was not completed before (in offline mode)
+            if text is None:
+                break
+
+            curr_reviews = self.extractor(text, limit)
+
+            # Break if this page has no reviews
+            if len(curr_reviews) == 0:
+                break
+
+            reviews.extend(curr_reviews)
+
+            limit = limit - len(curr_reviews)
+            params['pageNumber'] = params['pageNumber'] + 1
+
+        return reviews
+
+    def map(self, func, iterable):
+        """
+        Call func on each item of iterable in a pool of self.workers threads
+        (e.g. to crawl several products at once).
+
+        Args:
+            func: function of one argument.
+            iterable: items to call func on.
+
+        Returns:
+            A list of the results, in the order of iterable.
+        """
+        with ThreadPoolExecutor(max_workers=max(self.workers, 1)) as executor:
+            return list(executor.map(func, iterable))
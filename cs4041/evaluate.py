@@ -1,8 +1,26 @@
-from collections import defaultdict
+from collections import Counter, defaultdict
 import math
+from multiprocessing import Pool
 import random
+from . import instrument
 from .classify import calculate_accuracy
-from .train import train, train_with_bigram_features
+from .corpus import Corpus
+from .hashing import (count_hashed_ids,
+                      count_hashed_strings,
+                      get_hashed_model,
+                      hash_words)
+from .ngrams import (get_ngram_frequencies,
+                     get_ngram_model,
+                     train_ngram_corpus)
+from .stopwords import rm_stopwords
+from .train import get_model_from_frequencies
+from .vocabulary import (add_counts,
+                         combine_frequencies,
+                         get_bigram_contexts,
+                         get_bigram_contexts_from_ids,
+                         get_word_frequencies,
+                         get_word_frequencies_from_ids,
+                         subtract_counts)
 
 
 def join_reviews(parts):
@@ -26,16 +44,21 @@ def join_reviews(parts):
     return reviews
 
 
-def split_reviews(reviews, no_of_parts=10):
+def split_reviews(reviews, no_of_parts=10, seed=None):
     """
     Split the given reviews into x equal parts (each containing
     equal number of reviews from each class).
 
+    The reviews are shuffled (without modifying the given lists) using a
+    random number generator seeded with the given seed, so that the same
+    seed always results in the same parts.
+
     Args:
         reviews: dictionary with
                  - key: class
                  - value: list of reviews belonging to this class.
         no_of_parts: number of parts to divide into.
+        seed: seed for shuffling the reviews (None to use system entropy).
 
     Returns:
         List of parts with each element having the same type
@@ -49,11 +72,12 @@ def split_reviews(reviews, no_of_parts=10):
     reviews_per_part = {}
 
     shuffled_reviews = defaultdict(list)
+    rng = random.Random(seed)
 
     for class_, review_list in reviews.items():
         reviews_per_part[class_] = len(review_list) / no_of_parts
-        shuffled_reviews[class_] = review_list
-        random.shuffle(shuffled_reviews[class_])
+        shuffled_reviews[class_] = list(review_list)
+        rng.shuffle(shuffled_reviews[class_])
 
     # Split into parts
     for i in range(no_of_parts):
@@ -70,7 +94,465 @@ def split_reviews(reviews, no_of_parts=10):
     return parts
 
 
-def evaluate(reviews, stopwords, min_occur=2, no_of_parts=10):
+def count_words(strings):
+    """
+    Return the additive counts of a list of strings for a model with
+    word features.
+
+    Args:
+        strings: list of strings.
+
+    Returns:
+        A 1-tuple with the Counter of all words in the strings.
+    """
+    return (get_word_frequencies(strings),)
+
+
+def count_word_ids(ids, offsets, tokens):
+    """
+    Return the additive counts of integer encoded strings for a model with
+    word features (see count_words()).
+
+    Args:
+        ids: array of the ids of all words of all strings.
+        offsets: array of offsets of each string in ids.
+        tokens: list of words, such that tokens[id] is the word with that id.
+
+    Returns:
+        A 1-tuple with the Counter of all words in the strings.
+    """
+    return (get_word_frequencies_from_ids(ids, tokens),)
+
+
+def get_word_counts(counts):
+    """
+    Return the word frequencies from the counts returned by count_words().
+
+    Args:
+        counts: a 1-tuple of Counters.
+
+    Returns:
+        A Counter with
+            - key: word
+            - value: frequency of the word
+    """
+    return counts[0]
+
+
+def get_combined_counts(counts):
+    """
+    Return the word/bigram frequencies from the counts returned by
+    get_bigram_contexts().
+
+    Args:
+        counts: a 2-tuple of Counters.
+
+    Returns:
+        A Counter with
+            - key: word/bigram
+            - value: frequency of the word/bigram
+    """
+    return combine_frequencies(*counts)
+
+
+def count_part(part, stopwords, count_strings):
+    """
+    Remove stop words from and count the reviews of a part.
+
+    Args:
+        part: dictionary with
+              - key: class
+              - value: list of reviews belonging to this class.
+        stopwords: list of words to remove from all reviews.
+        count_strings: function mapping a list of strings to additive counts
+                       (a tuple of Counters).
+
+    Returns:
+        A 2-tuple:
+        1. A dictionary with
+            - key: class
+            - value: number of documents of this class in the part
+        2. A dictionary with
+            - key: class
+            - value: counts of the documents of this class in the part
+    """
+    doc_count = {}
+    counts = {}
+
+    for class_, review_list in part.items():
+        cleaned_reviews = rm_stopwords(review_list, stopwords)
+        doc_count[class_] = len(cleaned_reviews)
+        counts[class_] = count_strings(cleaned_reviews)
+
+    return doc_count, counts
+
+
+def count_corpus_part(part, corpus, count_ids):
+    """
+    Count the documents of a part of a Corpus (see count_part()).
+
+    Args:
+        part: dictionary with
+              - key: class
+              - value: list of indices of the documents of this class.
+        corpus: a Corpus.
+        count_ids: function mapping integer encoded strings (ids, offsets,
+                   tokens) to additive counts (a tuple of Counters).
+
+    Returns:
+        A 2-tuple as returned by count_part().
+    """
+    doc_count = {}
+    counts = {}
+
+    for class_, docs in part.items():
+        doc_count[class_] = len(docs)
+        counts[class_] = count_ids(*corpus.documents(docs), corpus.tokens)
+
+    return doc_count, counts
+
+
+def evaluate_part(i, state):
+    """
+    Train a model with the counts of all parts except i and calculate its
+    accuracy in classifying the reviews of part i.
+
+    Args:
+        i: index of the part to evaluate.
+        state: dictionary with the (read-only) cross evaluation state built
+               by cross_validate().
+
+    Returns:
+        Accuracy of the model trained.
+    """
+    part = state['parts'][i]
+    class_doc_count = {}
+    frequency = {}
+
+    for class_ in part.keys():
+        class_doc_count[class_] = (state['total_doc_count'][class_] -
+                                   state['doc_counts'][i][class_])
+        frequency[class_] = state['get_frequencies'](
+            subtract_counts(state['total_counts'][class_],
+                            state['counts'][i][class_]))
+
+    trained_model = get_model_from_frequencies(class_doc_count, frequency,
+                                               state['min_occur'])
+    if state['transform_model'] is not None:
+        trained_model = state['transform_model'](trained_model)
+
+    return calculate_accuracy(part, state['stopwords'], trained_model,
+                              state['corpus'])
+
+
+# Cross evaluation state of a worker process (see init_worker())
+_worker_state = None
+
+
+def init_worker(state):
+    """
+    Store the cross evaluation state in a worker process, so that it is
+    sent to each worker only once instead of with every part.
+
+    Args:
+        state: dictionary with the (read-only) cross evaluation state built
+               by cross_validate().
+    """
+    global _worker_state
+    _worker_state = state
+
+
+def evaluate_part_in_worker(i):
+    """
+    Call evaluate_part() with the state of this worker process.
+
+    Args:
+        i: index of the part to evaluate.
+
+    Returns:
+        Accuracy of the model trained.
+    """
+    return evaluate_part(i, _worker_state)
+
+
+def cross_validate(parts, stopwords, count_strings, get_frequencies,
+                   min_occur, workers=1, corpus=None, transform_model=None):
+    """
+    Do a cross evaluation over the given parts, counting each part only
+    once.
+
+    The counts of all parts are summed up, and the counts used to train the
+    model for part i are obtained by subtracting the counts of part i from
+    this total (instead of counting the remaining parts all over again).
+
+    With workers > 1, the parts are counted and evaluated in a pool of
+    worker processes. The parts (along with their counts) are sent to each
+    worker only once.
+
+    Args:
+        parts: a list of dictionaries with
+               - key: class
+               - value: list of reviews belonging to this class.
+        stopwords: list of words to remove from all reviews.
+        count_strings: function mapping a list of strings to additive counts
+                       (a tuple of Counters).
+        get_frequencies: function mapping the counts returned by
+                         count_strings to a Counter of token frequencies.
+        min_occur: minimum number of occurrences of a token for it to be
+                   included in the vocabulary.
+        workers: number of worker processes to use.
+        corpus: a Corpus, in which case the parts hold lists of indices of
+                its (already cleaned) documents, count_strings maps integer
+                encoded strings (ids, offsets, tokens) to additive counts
+                and stopwords is not used.
+        transform_model: function applied to every model trained before
+                         evaluating it (e.g. a partial of
+                         compress.compress_model()), which must be picklable
+                         with workers > 1.
+
+    Returns:
+        List of accuracies of all models trained (in the order of parts).
+    """
+    if corpus is None:
+        count = count_part
+        count_args = [(part, stopwords, count_strings) for part in parts]
+    else:
+        count = count_corpus_part
+        count_args = [(part, corpus, count_strings) for part in parts]
+
+    with instrument.phase('count', folds=len(parts)) as curr_phase:
+        if workers > 1:
+            with Pool(min(workers, len(parts))) as pool:
+                part_counts = pool.starmap(count, count_args)
+        else:
+            part_counts = [count(*args) for args in count_args]
+
+        curr_phase.set(docs=sum(sum(doc_count.values())
+                                for doc_count, _ in part_counts))
+
+    doc_counts = [doc_count for doc_count, _ in part_counts]
+    counts = [curr_counts for _, curr_counts in part_counts]
+
+    # key: class
+    # value: total number of documents/counts of this class in all parts
+    total_doc_count = defaultdict(int)
+    total_counts = {}
+
+    for curr_doc_count, curr_counts in part_counts:
+        for class_, doc_count in curr_doc_count.items():
+            total_doc_count[class_] = total_doc_count[class_] + doc_count
+
+            if class_ not in total_counts:
+                total_counts[class_] = tuple(Counter()
+                                             for _ in curr_counts[class_])
+            add_counts(total_counts[class_], curr_counts[class_])
+
+    state = {
+        'parts': parts,
+        'stopwords': stopwords,
+        'corpus': corpus,
+        'get_frequencies': get_frequencies,
+        'min_occur': min_occur,
+        'transform_model': transform_model,
+        'doc_counts': doc_counts,
+        'counts': counts,
+        'total_doc_count': total_doc_count,
+        'total_counts': total_counts,
+    }
+
+    # Train with all parts except i and classify the reviews in part i
+    if workers > 1:
+        with Pool(min(workers, len(parts)), initializer=init_worker,
+                  initargs=(state,)) as pool:
+            accuracies = pool.map(evaluate_part_in_worker, range(len(parts)))
+    else:
+        accuracies = [evaluate_part(i, state) for i in range(len(parts))]
+
+    return accuracies
+
+
+def cross_validate_hashed(parts, stopwords, buckets, bigram_features=False,
+                          corpus=None):
+    """
+    Do a cross evaluation over the given parts with hashed features (see
+    hashing.HashedModel), counting each part only once (see
+    cross_validate()).
+
+    Args:
+        parts: a list of dictionaries with
+               - key: class
+               - value: list of reviews belonging to this class.
+        stopwords: list of words to remove from all reviews.
+        buckets: number of buckets.
+        bigram_features: whether the bigrams are features too.
+        corpus: a Corpus, in which case the parts hold lists of indices of
+                its (already cleaned) documents and stopwords is not used.
+
+    Returns:
+        List of accuracies of all models trained (in the order of parts).
+    """
+    if corpus is not None:
+        word_hashes = hash_words(corpus.tokens)
+
+    doc_counts = []
+    counts = []
+
+    with instrument.phase('count', folds=len(parts)) as curr_phase:
+        for part in parts:
+            doc_count = {}
+            part_counts = {}
+
+            for class_, review_list in part.items():
+                if corpus is None:
+                    cleaned_reviews = rm_stopwords(review_list, stopwords)
+                    doc_count[class_] = len(cleaned_reviews)
+                    part_counts[class_] = count_hashed_strings(
+                        cleaned_reviews, buckets, bigram_features)
+                else:
+                    doc_count[class_] = len(review_list)
+                    part_counts[class_] = count_hashed_ids(
+                        *corpus.documents(review_list), word_hashes,
+                        buckets, bigram_features)
+
+            doc_counts.append(doc_count)
+            counts.append(part_counts)
+            curr_phase.add(docs=sum(doc_count.values()))
+
+    # key: class
+    # value: total number of documents/bucket counts of this class
+    total_doc_count = defaultdict(int)
+    total_counts = {}
+
+    for doc_count, part_counts in zip(doc_counts, counts):
+        for class_, curr_counts in part_counts.items():
+            total_doc_count[class_] += doc_count[class_]
+            if class_ in total_counts:
+                total_counts[class_] = total_counts[class_] + curr_counts
+            else:
+                total_counts[class_] = curr_counts
+
+    # Train with all parts except i and classify the reviews in part i
+    accuracies = []
+
+    for i, part in enumerate(parts):
+        trained_model = get_hashed_model(
+            {class_: total_doc_count[class_] - doc_counts[i][class_]
+             for class_ in part.keys()},
+            {class_: total_counts[class_] - counts[i][class_]
+             for class_ in part.keys()},
+            bigram_features)
+        accuracies.append(calculate_accuracy(part, stopwords, trained_model,
+                                             corpus))
+
+    return accuracies
+
+
+def evaluate_ngram_part(i, state):
+    """
+    Train a model with n-gram features (see ngrams.NgramModel) on all parts
+    except i and calculate its accuracy in classifying the reviews of part
+    i.
+
+    Args:
+        i: index of the part to evaluate.
+        state: dictionary with the (read-only) cross evaluation state built
+               by cross_validate_ngrams().
+
+    Returns:
+        Accuracy of the model trained.
+    """
+    parts = state['parts']
+    corpus = state['corpus']
+
+    if corpus is None:
+        cleaned_parts = state['cleaned_parts']
+        training = join_reviews(cleaned_parts[:i] + cleaned_parts[i+1:])
+        class_doc_count = {}
+        frequency = {}
+
+        for class_, cleaned_reviews in training.items():
+            class_doc_count[class_] = len(cleaned_reviews)
+            with instrument.phase('count', docs=len(cleaned_reviews)):
+                frequency[class_] = get_ngram_frequencies(
+                    cleaned_reviews, state['max_n'],
+                    state['min_ngram_occur'])
+
+        trained_model = get_ngram_model(class_doc_count, frequency,
+                                        state['max_n'], state['min_occur'])
+    else:
+        trained_model = train_ngram_corpus(
+            corpus, state['max_n'], state['min_occur'],
+            state['min_ngram_occur'], join_reviews(parts[:i] + parts[i+1:]))
+
+    return calculate_accuracy(parts[i], state['stopwords'], trained_model,
+                              corpus)
+
+
+def evaluate_ngram_part_in_worker(i):
+    """
+    Call evaluate_ngram_part() with the state of this worker process (see
+    init_worker()).
+    """
+    return evaluate_ngram_part(i, _worker_state)
+
+
+def cross_validate_ngrams(parts, stopwords, max_n, min_occur=3,
+                          min_ngram_occur=3, workers=1, corpus=None):
+    """
+    Do a cross evaluation over the given parts with n-gram features (see
+    ngrams.NgramModel).
+
+    The n-grams counted as features depend on the counts of all the
+    documents trained with, so the counts are not additive and the
+    remaining parts are counted again for each part (the reviews being
+    cleaned only once). With workers > 1, the parts are evaluated in a pool
+    of worker processes, each receiving the (cleaned) parts only once.
+
+    Args:
+        parts: a list of dictionaries with
+               - key: class
+               - value: list of reviews belonging to this class.
+        stopwords: list of words to remove from all reviews.
+        max_n: number of words of the longest n-grams.
+        min_occur: minimum number of occurrences of a word/n-gram for it to
+                   be included in the vocabulary.
+        min_ngram_occur: minimum number of occurrences of an n-gram in a
+                         class for it to be counted as a feature of the
+                         class.
+        workers: number of worker processes to use.
+        corpus: a Corpus, in which case the parts hold lists of indices of
+                its (already cleaned) documents and stopwords is not used.
+
+    Returns:
+        List of accuracies of all models trained (in the order of parts).
+    """
+    if corpus is None:
+        cleaned_parts = [{class_: rm_stopwords(review_list, stopwords)
+                          for class_, review_list in part.items()}
+                         for part in parts]
+    else:
+        cleaned_parts = None
+
+    state = {
+        'parts': parts,
+        'cleaned_parts': cleaned_parts,
+        'stopwords': stopwords,
+        'corpus': corpus,
+        'max_n': max_n,
+        'min_occur': min_occur,
+        'min_ngram_occur': min_ngram_occur,
+    }
+
+    if workers > 1:
+        with Pool(min(workers, len(parts)), initializer=init_worker,
+                  initargs=(state,)) as pool:
+            return pool.map(evaluate_ngram_part_in_worker, range(len(parts)))
+
+    return [evaluate_ngram_part(i, state) for i in range(len(parts))]
+
+
+def evaluate(reviews, stopwords, min_occur=2, no_of_parts=10, workers=1,
+             seed=None, buckets=None, transform_model=None):
     """
     Do a no_of_parts-fold cross evaluation.
 
@@ -89,34 +571,45 @@ def evaluate(reviews, stopwords, min_occur=2, no_of_parts=10):
         reviews: dictionary with
                  - key: class
                  - value: list of reviews belonging to this class.
+                 (or a Corpus of cleaned reviews).
         stopwords: list of words to remove from all documents.
         min_occur: minimum number of occurrences of a word for it to be
                    included in the vocabulary.
         no_of_parts: number of parts to divide into.
+        workers: number of worker processes to use.
+        seed: seed for splitting the reviews into parts.
+        buckets: hash the words into this many buckets instead of keeping a
+                 vocabulary (see hashing.HashedModel), in which case
+                 min_occur and workers are not used.
+        transform_model: function applied to every model trained before
+                         evaluating it (see cross_validate()).
 
     Returns:
         List of accuracies of all models trained.
     """
-    parts = split_reviews(reviews, no_of_parts)
+    if isinstance(reviews, Corpus):
+        parts = split_reviews(reviews.class_docs(), no_of_parts, seed)
 
-    # Accuracy of each model
-    accuracies = [0] * no_of_parts
+        if buckets is not None:
+            return cross_validate_hashed(parts, stopwords, buckets,
+                                         corpus=reviews)
 
-    # Train with all parts except i and classify the reviews in part i
-    for i in range(no_of_parts):
-        joined_part = join_reviews([
-            parts[j] for j in range(no_of_parts) if j != i
-        ])
+        return cross_validate(parts, stopwords, count_word_ids,
+                              get_word_counts, min_occur, workers, reviews,
+                              transform_model)
 
-        trained_model = train(joined_part, stopwords, min_occur)
+    parts = split_reviews(reviews, no_of_parts, seed)
 
-        accuracies[i] = calculate_accuracy(parts[i], stopwords, trained_model)
+    if buckets is not None:
+        return cross_validate_hashed(parts, stopwords, buckets)
 
-    return accuracies
+    return cross_validate(parts, stopwords, count_words, get_word_counts,
+                          min_occur, workers, transform_model=transform_model)
 
 
-def evaluate_with_bigram_features(reviews, stopwords,
-                                  min_occur=2, no_of_parts=10):
+def evaluate_with_bigram_features(reviews, stopwords, min_occur=2,
+                                  no_of_parts=10, workers=1, seed=None,
+                                  buckets=None, transform_model=None):
     """
     Similar to the above function except that this function also takes into
     account some bigram features.
@@ -125,28 +618,75 @@ def evaluate_with_bigram_features(reviews, stopwords,
         reviews: dictionary with
                  - key: class
                  - value: list of reviews belonging to this class.
+                 (or a Corpus of cleaned reviews).
         stopwords: list of words to remove from all documents.
         min_occur: minimum number of occurrences of a word/bigram for it to be
                    included in the vocabulary.
         no_of_parts: number of parts to divide into.
+        workers: number of worker processes to use.
+        seed: seed for splitting the reviews into parts.
+        buckets: hash the words and bigrams into this many buckets instead
+                 of keeping a vocabulary (see hashing.HashedModel), in which
+                 case min_occur and workers are not used.
+        transform_model: function applied to every model trained before
+                         evaluating it (see cross_validate()).
 
     Returns:
         List of accuracies of all models trained.
     """
-    parts = split_reviews(reviews, no_of_parts)
+    if isinstance(reviews, Corpus):
+        parts = split_reviews(reviews.class_docs(), no_of_parts, seed)
 
-    # Accuracy of each model
-    accuracies = [0] * no_of_parts
+        if buckets is not None:
+            return cross_validate_hashed(parts, stopwords, buckets, True,
+                                         reviews)
 
-    # Train with all parts except i and classify the reviews in part i
-    for i in range(no_of_parts):
-        joined_part = join_reviews([
-            parts[j] for j in range(no_of_parts) if j != i
-        ])
+        return cross_validate(parts, stopwords, get_bigram_contexts_from_ids,
+                              get_combined_counts, min_occur, workers,
+                              reviews, transform_model)
 
-        trained_model = train_with_bigram_features(joined_part, stopwords,
-                                                   min_occur)
+    parts = split_reviews(reviews, no_of_parts, seed)
 
-        accuracies[i] = calculate_accuracy(parts[i], stopwords, trained_model)
+    if buckets is not None:
+        return cross_validate_hashed(parts, stopwords, buckets, True)
 
-    return accuracies
+    return cross_validate(parts, stopwords, get_bigram_contexts,
+                          get_combined_counts, min_occur, workers,
+                          transform_model=transform_model)
+
+
+def evaluate_with_ngram_features(reviews, stopwords, max_n=3, min_occur=3,
+                                 min_ngram_occur=3, no_of_parts=10,
+                                 workers=1, seed=None):
+    """
+    Do a no_of_parts-fold cross evaluation (see evaluate()) with n-gram
+    features (see ngrams.NgramModel).
+
+    Args:
+        reviews: dictionary with
+                 - key: class
+                 - value: list of reviews belonging to this class.
+                 (or a Corpus of cleaned reviews).
+        stopwords: list of words to remove from all documents.
+        max_n: number of words of the longest n-grams.
+        min_occur: minimum number of occurrences of a word/n-gram for it to
+                   be included in the vocabulary.
+        min_ngram_occur: minimum number of occurrences of an n-gram in a
+                         class for it to be counted as a feature of the
+                         class.
+        no_of_parts: number of parts to divide into.
+        workers: number of worker processes to use.
+        seed: seed for splitting the reviews into parts.
+
+    Returns:
+        List of accuracies of all models trained.
+    """
+    if isinstance(reviews, Corpus):
+        parts = split_reviews(reviews.class_docs(), no_of_parts, seed)
+        return cross_validate_ngrams(parts, stopwords, max_n, min_occur,
+                                     min_ngram_occur, workers, reviews)
+
+    parts = split_reviews(reviews, no_of_parts, seed)
+
+    return cross_validate_ngrams(parts, stopwords, max_n, min_occur,
+                                 min_ngram_occur, workers)
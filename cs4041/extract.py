@@ -0,0 +1,178 @@
+from bs4 import BeautifulSoup
+from html.parser import HTMLParser
+
+# Class of the elements holding the text of a review
+REVIEW_TEXT_CLASS = 'review-text'
+
+# Elements which never have an end tag
+VOID_ELEMENTS = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img',
+                           'input', 'keygen', 'link', 'menuitem', 'meta',
+                           'param', 'source', 'track', 'wbr'])
+
+# Elements whose contents are not text
+NON_TEXT_ELEMENTS = frozenset(['script', 'style', 'template'])
+
+
+def extract_reviews_bs4(text, limit=None):
+    """
+    Extract the reviews from a review page by building the whole document
+    tree with BeautifulSoup (the reference extractor).
+
+    Args:
+        text: HTML of the page.
+        limit: maximum number of reviews to extract (None for all).
+
+    Returns:
+        A list of reviews.
+    """
+    soup = BeautifulSoup(text, 'html.parser')
+    review_soup = soup.find_all(class_=REVIEW_TEXT_CLASS, limit=limit)
+
+    return [' '.join(review.stripped_strings) for review in review_soup]
+
+
+class StopParsing(Exception):
+    """
+    Raised (and caught) by ReviewTextParser once it has enough reviews.
+    """
+
+
+class ReviewTextParser(HTMLParser):
+    """
+    Extract the reviews from a review page in a single pass over the HTML
+    events, without building a document tree.
+
+    Only a stack of the names of the open elements is kept, closing elements
+    the way BeautifulSoup's html.parser tree builder does (an end tag closes
+    the most recently opened element with that name and every element opened
+    after it), so that the reviews are exactly those of
+    extract_reviews_bs4().
+
+    Attributes:
+        limit: maximum number of reviews to extract (None for all).
+        reviews: list of lists of the (stripped) strings of each review.
+        stack: list of (element name, index in reviews or None) of the open
+               elements.
+        active: number of open review elements.
+        skip: number of open elements whose contents are not text.
+        data: list of text chunks (of open reviews) since the last tag.
+    """
+
+    def __init__(self, limit=None):
+        super().__init__(convert_charrefs=True)
+        self.limit = limit
+        self.reviews = []
+        self.stack = []
+        self.active = 0
+        self.skip = 0
+        self.data = []
+
+    def flush(self):
+        """
+        Add the text since the last tag to all open reviews (so that
+        adjacent chunks of text make up one string, as in BeautifulSoup).
+        """
+        if self.data:
+            string = ''.join(self.data).strip()
+            self.data = []
+
+            if string:
+                for _, index in self.stack:
+                    if index is not None:
+                        self.reviews[index].append(string)
+
+    def handle_starttag(self, tag, attrs):
+        self.flush()
+
+        if tag in VOID_ELEMENTS:
+            return
+
+        index = None
+        if self.limit is None or len(self.reviews) < self.limit:
+            for name, value in attrs:
+                if (name == 'class' and value is not None and
+                        REVIEW_TEXT_CLASS in value.split()):
+                    index = len(self.reviews)
+                    self.reviews.append([])
+                    self.active = self.active + 1
+                    break
+
+        if tag in NON_TEXT_ELEMENTS:
+            self.skip = self.skip + 1
+
+        self.stack.append((tag, index))
+
+    def handle_startendtag(self, tag, attrs):
+        self.flush()
+
+    def handle_endtag(self, tag):
+        self.flush()
+
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                break
+        else:
+            # Ignore an end tag without a start tag
+            return
+
+        for name, index in self.stack[i:]:
+            if index is not None:
+                self.active = self.active - 1
+            if name in NON_TEXT_ELEMENTS:
+                self.skip = self.skip - 1
+        del self.stack[i:]
+
+        if (self.limit is not None and len(self.reviews) >= self.limit and
+                not self.active):
+            raise StopParsing
+
+    def handle_data(self, data):
+        # Text outside of the reviews is never needed
+        if self.active and not self.skip:
+            self.data.append(data)
+
+    def handle_comment(self, data):
+        self.flush()
+
+    def handle_decl(self, decl):
+        self.flush()
+
+    def handle_pi(self, data):
+        self.flush()
+
+    def unknown_decl(self, data):
+        self.flush()
+
+
+def extract_reviews_html_parser(text, limit=None):
+    """
+    Extract the reviews from a review page with ReviewTextParser (the
+    default extractor), stopping as soon as limit reviews are extracted.
+
+    Args:
+        text: HTML of the page.
+        limit: maximum number of reviews to extract (None for all).
+
+    Returns:
+        A list of reviews.
+    """
+    parser = ReviewTextParser(limit)
+
+    try:
+        parser.feed(text)
+        parser.close()
+        parser.flush()
+    except StopParsing:
+        pass
+
+    return [' '.join(strings) for strings in parser.reviews]
+
+
+# key: name of the extractor
+# value: function(text, limit) returning the list of reviews in a page
+EXTRACTORS = {
+    'html.parser': extract_reviews_html_parser,
+    'bs4': extract_reviews_bs4,
+}
+
+extract_reviews = extract_reviews_html_parser
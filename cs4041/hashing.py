@@ -0,0 +1,370 @@
+from itertools import islice
+import zlib
+import numpy as np
+from .model import Model
+from .stopwords import as_normalizer
+from .vocabulary import encode_strings
+
+DEFAULT_BUCKETS = 1 << 20
+MASK32 = 0xFFFFFFFF
+
+# Multiplier combining the hashes of the two words of a bigram
+BIGRAM_MULTIPLIER = 0x9E3779B1
+
+# Number of strings whose words are hashed together (see hash_strings())
+CHUNK_SIZE = 4096
+
+
+def hash_words(words):
+    """
+    Hash each word with CRC-32, which (unlike hash()) is the same in every
+    process.
+
+    Args:
+        words: list of words.
+
+    Returns:
+        An array of 32 bit hashes (as uint64, to combine them without
+        overflow).
+    """
+    return np.array([zlib.crc32(word.encode()) for word in words],
+                    dtype=np.uint64)
+
+
+def mix(hashes):
+    """
+    Scramble an array of 32 bit hashes (the MurmurHash3 finalizer), so that
+    combinations of hashes spread evenly over the buckets.
+    """
+    hashes = hashes ^ (hashes >> np.uint64(16))
+    hashes = (hashes * np.uint64(0x85EBCA6B)) & np.uint64(MASK32)
+    hashes = hashes ^ (hashes >> np.uint64(13))
+    hashes = (hashes * np.uint64(0xC2B2AE35)) & np.uint64(MASK32)
+    return hashes ^ (hashes >> np.uint64(16))
+
+
+def hash_strings(strings, chunk_size=CHUNK_SIZE):
+    """
+    Hash every word of a list of (cleaned) strings (see hash_words()).
+
+    The strings are integer encoded (see vocabulary.encode_strings()) in
+    chunks of chunk_size strings, so that each word is hashed once per chunk
+    and no dictionary of more than a chunk's words is ever built.
+
+    Args:
+        strings: list (or any iterable) of strings.
+        chunk_size: number of strings to encode at a time.
+
+    Returns:
+        A 2-tuple:
+        1. hashes: array of the hashes of all words of all strings.
+        2. offsets: array of length len(strings) + 1, such that the hashes of
+                    the words of string i are hashes[offsets[i]:offsets[i+1]].
+    """
+    strings = iter(strings)
+    hashes = [np.zeros(0, dtype=np.uint64)]
+    lengths = [np.zeros(0, dtype=np.int64)]
+
+    while True:
+        chunk = list(islice(strings, chunk_size))
+        if not chunk:
+            break
+
+        ids, offsets, tokens = encode_strings(chunk)
+        hashes.append(hash_words(tokens)[ids])
+        lengths.append(np.diff(offsets))
+
+    lengths = np.concatenate(lengths)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    return np.concatenate(hashes), offsets
+
+
+def hash_features(hashes, offsets, buckets, bigram_features=False):
+    """
+    Map the words (and, with bigram_features, the bigrams) of strings to
+    buckets, given the hash of every word (see hash_strings()).
+
+    The bucket of a bigram is derived from the hashes of its words, so that
+    no bigram string is ever built.
+
+    Args:
+        hashes: array of the hashes of all words of all strings.
+        offsets: array of offsets of each string in hashes.
+        buckets: number of buckets.
+        bigram_features: whether to also map every bigram (every pair of
+                         consecutive words in a string) to a bucket.
+
+    Returns:
+        A 2-tuple (indptr, indices) of a sparse document-feature matrix in
+        compressed sparse row form (see Model.encode_batch()), with the
+        bucket of each feature occurrence as its column.
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    offsets = np.asarray(offsets, dtype=np.intp)
+    columns = (hashes % np.uint64(buckets)).astype(np.intp)
+
+    if not bigram_features or len(hashes) < 2:
+        return offsets, columns
+
+    # A bigram starts at every word except the last one of each string
+    no_of_docs = len(offsets) - 1
+    doc_ids = np.repeat(np.arange(no_of_docs), np.diff(offsets))
+    starts = doc_ids[:-1] == doc_ids[1:]
+
+    bigram_hashes = mix((hashes[:-1][starts] *
+                         np.uint64(BIGRAM_MULTIPLIER) +
+                         hashes[1:][starts]) & np.uint64(MASK32))
+    bigram_columns = (bigram_hashes % np.uint64(buckets)).astype(np.intp)
+
+    # Group the bigrams with the words of their string
+    all_doc_ids = np.concatenate([doc_ids, doc_ids[:-1][starts]])
+    order = np.argsort(all_doc_ids, kind='stable')
+    indptr = np.zeros(no_of_docs + 1, dtype=np.intp)
+    np.cumsum(np.bincount(all_doc_ids, minlength=no_of_docs),
+              out=indptr[1:])
+
+    return indptr, np.concatenate([columns, bigram_columns])[order]
+
+
+def count_hashed_ids(ids, offsets, word_hashes, buckets,
+                     bigram_features=False):
+    """
+    Count the features of integer encoded strings (see
+    vocabulary.encode_strings()) in each bucket (see hash_features()).
+
+    Args:
+        ids: array of the ids of all words of all strings.
+        offsets: array of offsets of each string in ids.
+        word_hashes: array of the hash of each word id (see hash_words()).
+        buckets: number of buckets.
+        bigram_features: whether the bigrams are features too.
+
+    Returns:
+        An array of length buckets with the count of each bucket.
+    """
+    _, indices = hash_features(word_hashes[np.asarray(ids, dtype=np.intp)],
+                               offsets, buckets, bigram_features)
+
+    return np.bincount(indices, minlength=buckets)
+
+
+def count_hashed_strings(strings, buckets, bigram_features=False):
+    """
+    Count the features of a list of (cleaned) strings in each bucket (see
+    hash_strings() and hash_features()).
+
+    Returns:
+        An array of length buckets with the count of each bucket.
+    """
+    _, indices = hash_features(*hash_strings(strings), buckets,
+                               bigram_features)
+
+    return np.bincount(indices, minlength=buckets)
+
+
+class HashedModel(Model):
+    """
+    A multinomial naive Bayes model over hashed features (the hashing
+    trick): every word (and with bigram_features, every bigram) is mapped to
+    one of a fixed number of buckets by a hash of it, and the likelihoods
+    are those of the buckets. The model has a fixed size and no vocabulary,
+    however many words are seen, at the cost of the words sharing a bucket
+    being confused with each other.
+
+    With bigram_features, every word and every bigram of a review is a
+    feature (there being no vocabulary to match bigrams against as the
+    Model does).
+
+    Attributes:
+        classes, class_index, log_likelihoods, log_priors: as in a Model,
+        with one column of log_likelihoods per bucket.
+        buckets: number of buckets.
+        bigram_features: whether the bigrams are features too.
+    """
+
+    def __init__(self, classes, log_likelihoods, log_priors,
+                 bigram_features=False):
+        super().__init__((), classes, log_likelihoods, log_priors,
+                         token_index={})
+        self.buckets = self.log_likelihoods.shape[1]
+        self.bigram_features = bigram_features
+
+    @property
+    def unknown_id(self):
+        """
+        -1, as every token has a bucket (there is no '<UNKNOWN>' column).
+        """
+        return -1
+
+    def to_tuple(self):
+        raise TypeError('a HashedModel has no tokens to list')
+
+    def encode(self, words):
+        """
+        Return the list of buckets of the features of a (cleaned) review.
+        """
+        return self.encode_batch([words])[1].tolist()
+
+    def encode_batch(self, documents):
+        """
+        Encode a batch of (cleaned) reviews into a sparse document-feature
+        matrix (see Model.encode_batch()), with buckets as columns.
+        """
+        return hash_features(*hash_strings(' '.join(words)
+                                           for words in documents),
+                             self.buckets, self.bigram_features)
+
+    def encode_ids(self, ids, offsets, tokens):
+        """
+        Encode a batch of integer encoded (cleaned) reviews into a sparse
+        document-feature matrix (see Model.encode_ids()), with buckets as
+        columns.
+        """
+        word_hashes = hash_words(tokens)
+
+        return hash_features(word_hashes[np.asarray(ids, dtype=np.intp)],
+                             offsets, self.buckets, self.bigram_features)
+
+    def log_odds(self, positive='+', negative='-'):
+        """
+        Return the log odds of the positive class against the negative class
+        for every bucket (computed once and cached).
+
+        Returns:
+            A HashedLogOdds.
+        """
+        log_odds = getattr(self, '_log_odds', None)
+
+        if log_odds is None or log_odds.classes != (positive, negative):
+            log_odds = HashedLogOdds(self, positive, negative)
+            self._log_odds = log_odds
+
+        return log_odds
+
+
+class HashedLogOdds:
+    """
+    Log odds of a class against another class for every bucket of a
+    HashedModel (see LogOdds).
+
+    Attributes:
+        model: the HashedModel.
+        classes: 2-tuple of the positive and negative class.
+        prior: log(P(+) / P(-)).
+        deltas: array with the log odds of each bucket.
+    """
+
+    def __init__(self, model, positive='+', negative='-'):
+        self.model = model
+        self.classes = (positive, negative)
+        self.prior = float(model.log_priors[model.class_index[positive]] -
+                           model.log_priors[model.class_index[negative]])
+        self.deltas = (model.log_likelihoods[model.class_index[positive]] -
+                       model.log_likelihoods[model.class_index[negative]])
+
+    def score(self, words, early_exit=False):
+        """
+        Calculate the log odds of the positive class given a (cleaned)
+        review (early_exit is accepted for compatibility with LogOdds, but
+        every feature is always scored).
+        """
+        return self.prior + float(self.deltas[self.model.encode(words)].sum())
+
+
+def get_hashed_model(class_doc_count, counts, bigram_features=False):
+    """
+    Create a HashedModel from the number of documents and the bucket counts
+    of each class (with add-one smoothing over the buckets).
+
+                           count(b_k, c_j) + 1
+    P(b_k | c_j) = -----------------------------------
+                     ___
+                     \\
+                     /    (count(b, c_j)) + # buckets
+                     ---
+                      b
+
+    Args:
+        class_doc_count: dictionary with
+                         - key: class
+                         - value: number of documents of this class.
+        counts: dictionary with
+                - key: class
+                - value: array with the count of each bucket in that class.
+        bigram_features: whether the bigrams were counted too.
+
+    Returns:
+        A HashedModel.
+    """
+    classes = list(counts)
+    bucket_counts = np.array([counts[class_] for class_ in classes],
+                             dtype=np.float64)
+    doc_counts = np.array([class_doc_count[class_] for class_ in classes],
+                          dtype=np.float64)
+
+    log_likelihoods = (np.log(bucket_counts + 1) -
+                       np.log(bucket_counts.sum(axis=1, keepdims=True) +
+                              bucket_counts.shape[1]))
+    log_priors = np.log(doc_counts) - np.log(doc_counts.sum())
+
+    return HashedModel(classes, log_likelihoods, log_priors, bigram_features)
+
+
+def train_hashed(documents, stopwords, buckets=DEFAULT_BUCKETS,
+                 bigram_features=False):
+    """
+    Train a multinomial naive Bayes classifier over hashed features (see
+    HashedModel) based on given list of classified documents.
+
+    Args:
+        documents: dictionary with
+                   - key: class
+                   - value: list of documents belonging to this class.
+        stopwords: list of words (or a Normalizer) to remove from all
+                   documents.
+        buckets: number of buckets.
+        bigram_features: whether the bigrams are features too.
+
+    Returns:
+        A HashedModel.
+    """
+    normalizer = as_normalizer(stopwords)
+    class_doc_count = {}
+    counts = {}
+
+    for class_, doclist in documents.items():
+        cleaned_docs = normalizer.rm_stopwords(doclist)
+        class_doc_count[class_] = len(cleaned_docs)
+        counts[class_] = count_hashed_strings(cleaned_docs, buckets,
+                                              bigram_features)
+
+    return get_hashed_model(class_doc_count, counts, bigram_features)
+
+
+def train_hashed_corpus(corpus, buckets=DEFAULT_BUCKETS,
+                        bigram_features=False):
+    """
+    Train a multinomial naive Bayes classifier over hashed features (see
+    HashedModel) on a Corpus of cleaned documents.
+
+    Args:
+        corpus: a Corpus.
+        buckets: number of buckets.
+        bigram_features: whether the bigrams are features too.
+
+    Returns:
+        A HashedModel.
+    """
+    word_hashes = hash_words(corpus.tokens)
+    class_doc_count = {}
+    counts = {}
+
+    for class_, docs in corpus.class_docs().items():
+        class_doc_count[class_] = len(docs)
+        counts[class_] = count_hashed_ids(*corpus.documents(docs),
+                                          word_hashes, buckets,
+                                          bigram_features)
+
+    return get_hashed_model(class_doc_count, counts, bigram_features)
@@ -0,0 +1,300 @@
+from collections import Counter, defaultdict
+import pickle
+from .evaluate import count_words, get_word_counts
+from .stopwords import as_normalizer
+from .train import get_model_from_frequencies
+from .vocabulary import add_counts, get_bigram_contexts
+
+
+class IncrementalModel:
+    """
+    A multinomial naive Bayes model (with word or word/bigram features)
+    keeping the counts it was trained with, so that new documents can be
+    added to it (see partial_fit()) without counting the old ones again.
+
+    The counts are additive (see evaluate.cross_validate()): the word counts
+    of each class, or with bigram features, its bigram and word context
+    counts (see vocabulary.get_bigram_contexts()), from which the
+    word/bigram frequencies are combined. The Model itself is only built
+    again from the counts when it is needed after an update, which takes
+    time in the size of the vocabulary, not of the documents counted.
+
+    With word features, the vocabulary is also kept up to date as documents
+    are added (a word joins it once its total count reaches min_occur).
+
+    With bigram features, the combined word/bigram frequencies (see
+    vocabulary.combine_frequencies()) are kept up to date too. Counts only
+    grow, so a word context only ever stops being counted, when one of its
+    bigrams reaches min_bigram_occur: an update touches the contexts of the
+    new documents and those of the bigrams reaching min_bigram_occur, each
+    context being uncounted at most once. The still counted contexts of
+    each rare bigram are indexed for this, the index being built again
+    (from the counts) in each process that adds documents.
+
+    Attributes:
+        stopwords: sorted list of the stop words removed from all documents.
+        min_occur: minimum number of occurrences of a word/bigram for it to be
+                   included in the vocabulary.
+        bigram_features: whether to use word/bigram features.
+        min_bigram_occur: minimum number of occurrences of a bigram so as to
+                          skip its constituent words' count (bigram features
+                          only).
+        class_doc_count: dictionary with
+                         - key: class
+                         - value: number of documents of this class
+        counts: dictionary with
+                - key: class
+                - value: counts of the documents of this class (a tuple of
+                         Counters)
+        class_counts: dictionary with
+                      - key: class
+                      - value: total count of all words in that class
+                      (word features only).
+        total_frequency: Counter of all words in all classes (word features
+                         only).
+        vocabulary: set of the words occurring at least min_occur times
+                    (word features only).
+        frequency: dictionary with
+                   - key: class
+                   - value: Counter of the combined word/bigram frequencies
+                            in that class (bigram features only).
+    """
+
+    def __init__(self, stopwords, min_occur=2, bigram_features=False,
+                 min_bigram_occur=3):
+        self.stopwords = sorted(as_normalizer(stopwords).stopwords)
+        self.min_occur = min_occur
+        self.bigram_features = bigram_features
+        self.min_bigram_occur = min_bigram_occur
+        self.class_doc_count = {}
+        self.counts = {}
+        self.class_counts = {}
+        self.total_frequency = Counter()
+        self.vocabulary = set()
+        self.frequency = {}
+        self._model = None
+        self._counted_contexts = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Built again from the counts when needed
+        state['_model'] = None
+        state['_counted_contexts'] = None
+        return state
+
+    def is_rare(self, bigram_counter, bigram):
+        """
+        Return whether a bigram (or None) is missing or occurs less than
+        min_bigram_occur times in a bigram Counter.
+        """
+        return (bigram is None or
+                bigram_counter[bigram] < self.min_bigram_occur)
+
+    def index_counted_contexts(self):
+        """
+        Return a dictionary with
+            - key: class
+            - value: dictionary with
+                     - key: rare bigram
+                     - value: set of the word contexts (word, previous
+                              bigram, next bigram) of the bigram counted in
+                              the combined frequencies
+        built from the counts once per process.
+        """
+        if self._counted_contexts is None:
+            self._counted_contexts = {}
+
+            for class_, (bigram_counter,
+                         context_counter) in self.counts.items():
+                index = self._counted_contexts[class_] = defaultdict(set)
+                for context in context_counter:
+                    self.index_context(index, bigram_counter, context)
+
+        return self._counted_contexts
+
+    def index_context(self, index, bigram_counter, context):
+        """
+        Index a word context under its bigrams if it is counted.
+
+        Returns:
+            Whether the context is counted.
+        """
+        _, prev_bigram, next_bigram = context
+
+        if not (self.is_rare(bigram_counter, prev_bigram) and
+                self.is_rare(bigram_counter, next_bigram)):
+            return False
+
+        for bigram in (prev_bigram, next_bigram):
+            if bigram is not None:
+                index[bigram].add(context)
+
+        return True
+
+    def add_bigram_counts(self, class_, counts):
+        """
+        Add the bigram and word context counts of documents of a class to
+        its counts, updating its combined frequencies.
+        """
+        if class_ not in self.counts:
+            self.counts[class_] = (Counter(), Counter())
+            self.frequency[class_] = Counter()
+            self.index_counted_contexts()[class_] = defaultdict(set)
+
+        bigram_counter, context_counter = self.counts[class_]
+        new_bigrams, new_contexts = counts
+        frequency = self.frequency[class_]
+        index = self.index_counted_contexts()[class_]
+
+        # Uncount the contexts of the bigrams no longer rare
+        for bigram, count in new_bigrams.items():
+            if (self.is_rare(bigram_counter, bigram) and
+                    bigram_counter[bigram] + count >= self.min_bigram_occur):
+                for context in index.pop(bigram, ()):
+                    word, prev_bigram, next_bigram = context
+                    for other in (prev_bigram, next_bigram):
+                        if other is not None and other != bigram:
+                            index[other].discard(context)
+                    frequency[word] -= context_counter[context]
+                    if frequency[word] <= 0:
+                        del frequency[word]
+
+        add_counts(self.counts[class_], counts)
+        frequency.update(new_bigrams)
+
+        for context, count in new_contexts.items():
+            if self.index_context(index, bigram_counter, context):
+                frequency[context[0]] += count
+
+    def count(self, strings):
+        """
+        Return the additive counts of a list of (cleaned) strings.
+        """
+        if self.bigram_features:
+            return get_bigram_contexts(strings)
+
+        return count_words(strings)
+
+    def add(self, class_, no_of_docs, counts):
+        """
+        Add the counts of documents of a class.
+
+        Args:
+            class_: class of the documents.
+            no_of_docs: number of documents.
+            counts: counts of the documents (as returned by count()).
+        """
+        self.class_doc_count[class_] = (self.class_doc_count.get(class_, 0) +
+                                        no_of_docs)
+
+        if self.bigram_features:
+            self.add_bigram_counts(class_, counts)
+        else:
+            if class_ not in self.counts:
+                self.counts[class_] = tuple(Counter() for _ in counts)
+            add_counts(self.counts[class_], counts)
+
+            word_counter = get_word_counts(counts)
+            self.class_counts[class_] = (self.class_counts.get(class_, 0) +
+                                         sum(word_counter.values()))
+
+            # Only the words of the new documents can join the vocabulary
+            self.total_frequency.update(word_counter)
+            for word in word_counter:
+                if self.total_frequency[word] >= self.min_occur:
+                    self.vocabulary.add(word)
+
+        self._model = None
+
+    @property
+    def model(self):
+        """
+        The Model trained with all documents added so far.
+        """
+        if self._model is None:
+            if self.bigram_features:
+                self._model = get_model_from_frequencies(
+                    self.class_doc_count, self.frequency, self.min_occur)
+            else:
+                frequency = {class_: get_word_counts(counts)
+                             for class_, counts in self.counts.items()}
+                self._model = get_model_from_frequencies(
+                    self.class_doc_count, frequency, self.min_occur,
+                    self.class_counts, sorted(self.vocabulary))
+
+        return self._model
+
+
+def partial_fit(model, new_reviews):
+    """
+    Add new reviews to an IncrementalModel, counting only the new reviews.
+
+    The resulting model (model.model) is the same as one trained with
+    train() (or train_with_bigram_features()) on all the reviews added so
+    far.
+
+    Args:
+        model: an IncrementalModel (updated in place).
+        new_reviews: dictionary with
+                     - key: class
+                     - value: list of reviews belonging to this class.
+
+    Returns:
+        The given model.
+    """
+    normalizer = as_normalizer(model.stopwords)
+
+    for class_, review_list in new_reviews.items():
+        cleaned_reviews = normalizer.rm_stopwords(review_list)
+        model.add(class_, len(cleaned_reviews),
+                  model.count(cleaned_reviews))
+
+    return model
+
+
+def fit(documents, stopwords, min_occur=2, bigram_features=False):
+    """
+    Train an IncrementalModel on a first batch of documents.
+
+    Args:
+        documents: dictionary with
+                   - key: class
+                   - value: list of documents belonging to this class.
+        stopwords: list of words (or a Normalizer) to remove from all
+                   documents.
+        min_occur: minimum number of occurrences of a word/bigram for it to be
+                   included in the vocabulary.
+        bigram_features: whether to use word/bigram features.
+
+    Returns:
+        An IncrementalModel.
+    """
+    return partial_fit(IncrementalModel(stopwords, min_occur,
+                                        bigram_features), documents)
+
+
+def read_incremental_model(fname):
+    """
+    Read an IncrementalModel from a python pickle file.
+
+    Args:
+        fname: file name.
+
+    Returns:
+        The IncrementalModel saved.
+    """
+    with open(fname, 'rb') as f:
+        return pickle.load(f)
+
+
+def write_incremental_model(model, fname):
+    """
+    Save an IncrementalModel (its counts, not the Model built from them) to
+    a python pickle file.
+
+    Args:
+        model: an IncrementalModel.
+        fname: file name.
+    """
+    with open(fname, 'wb') as f:
+        pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
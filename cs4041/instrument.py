@@ -0,0 +1,287 @@
+import contextlib
+import cProfile
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+INSTRUMENT_ENV = 'CS4041_INSTRUMENT'
+PROFILE_ENV = 'CS4041_PROFILE'
+TRACE_MEMORY_ENV = 'CS4041_TRACE_MEMORY'
+
+
+class Recorder:
+    """
+    Write instrumentation records as JSON lines.
+
+    Attributes:
+        fname: name of the file to append the records to ('-' for stderr).
+        stage: name of the stage being instrumented (added to every record).
+        trace_memory: whether to measure the peak memory allocated in each
+                      phase with tracemalloc.
+        phases: stack of the Phases in progress.
+    """
+
+    def __init__(self, fname, stage=None, trace_memory=False):
+        self.fname = fname
+        self.stage = stage
+        self.trace_memory = trace_memory
+        self.phases = []
+
+    def write(self, record):
+        """
+        Write a record (a JSON serializable dictionary).
+        """
+        line = json.dumps(dict({'stage': self.stage, 'pid': os.getpid(),
+                                'time': time.time()}, **record)) + '\n'
+
+        if self.fname == '-':
+            sys.stderr.write(line)
+            sys.stderr.flush()
+        else:
+            # Reopened for every record, as worker processes (forked with a
+            # copy of the recorder) append to the same file
+            with open(self.fname, 'a') as f:
+                f.write(line)
+
+
+class Phase:
+    """
+    A timed phase of the work of a stage, written as a record when it ends
+    (see phase()).
+
+    The record has the wall time of the phase, its counters, the documents
+    and tokens per second (from the 'docs' and 'tokens' counters), the
+    out-of-vocabulary rate (from the 'oov' and 'tokens' counters), the peak
+    resident set size of the process and, with trace_memory, the peak memory
+    allocated during the phase.
+
+    Attributes:
+        recorder: the Recorder to write the record with.
+        name: name of the phase.
+        counters: dictionary of the counters of the phase.
+    """
+
+    def __init__(self, recorder, name, counters):
+        self.recorder = recorder
+        self.name = name
+        self.counters = counters
+        self.start = None
+        self.traced_peak = 0
+
+    def add(self, **counters):
+        """
+        Add to the counters of the phase.
+        """
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, **values):
+        """
+        Set counters (or any other values) of the phase.
+        """
+        self.counters.update(values)
+
+    def fold_traced_peak(self):
+        """
+        Fold the peak traced since the last reset into the peak of this
+        phase and every enclosing phase, and reset it.
+
+        Python < 3.9 cannot reset the peak, so that the peak of a phase is
+        then the peak since tracing started.
+        """
+        _, peak = tracemalloc.get_traced_memory()
+        for phase in self.recorder.phases:
+            phase.traced_peak = max(phase.traced_peak, peak)
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+
+    def __enter__(self):
+        if self.recorder.trace_memory and self.recorder.phases:
+            self.recorder.phases[-1].fold_traced_peak()
+        self.recorder.phases.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.start
+
+        if self.recorder.trace_memory:
+            self.fold_traced_peak()
+        self.recorder.phases.pop()
+
+        counters = self.counters
+        record = {'phase': self.name, 'seconds': seconds}
+        record.update(counters)
+
+        for counter in ['docs', 'tokens']:
+            if counter in counters and seconds > 0:
+                record[counter + '_per_sec'] = counters[counter] / seconds
+        if counters.get('tokens') and 'oov' in counters:
+            record['oov_rate'] = counters['oov'] / counters['tokens']
+
+        # Peak resident set size of the process so far (kilobytes on Linux)
+        record['max_rss'] = resource.getrusage(
+            resource.RUSAGE_SELF).ru_maxrss
+        if self.recorder.trace_memory:
+            record['traced_peak_bytes'] = self.traced_peak
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+
+        self.recorder.write(record)
+
+        return False
+
+
+class NullPhase:
+    """
+    A phase doing nothing, returned by phase() while instrumentation is off.
+    """
+
+    def add(self, **counters):
+        pass
+
+    def set(self, **values):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_PHASE = NullPhase()
+
+# Recorder of the stage being instrumented (None while instrumentation is
+# off)
+_recorder = None
+
+
+def enabled():
+    """
+    Return whether instrumentation is on (for callers to skip computing
+    counters that are not free).
+    """
+    return _recorder is not None
+
+
+def phase(name, **counters):
+    """
+    Return a context manager timing a phase, e.g.
+
+        with instrument.phase('count', docs=len(docs)) as curr_phase:
+            ...
+            curr_phase.add(tokens=no_of_tokens)
+
+    Args:
+        name: name of the phase.
+        counters: initial counters of the phase.
+
+    Returns:
+        A Phase (or a NullPhase while instrumentation is off).
+    """
+    if _recorder is None:
+        return NULL_PHASE
+
+    return Phase(_recorder, name, counters)
+
+
+def count(**counters):
+    """
+    Add to the counters of the innermost phase in progress (if any).
+    """
+    if _recorder is not None and _recorder.phases:
+        _recorder.phases[-1].add(**counters)
+
+
+def configure(fname, stage=None, trace_memory=False):
+    """
+    Turn instrumentation on (or off, if fname is None).
+
+    Args:
+        fname: name of the file to append the records to ('-' for stderr).
+        stage: name of the stage being instrumented.
+        trace_memory: whether to measure the peak memory allocated in each
+                      phase with tracemalloc.
+
+    Returns:
+        The Recorder (or None).
+    """
+    global _recorder
+    _recorder = None if fname is None else Recorder(fname, stage,
+                                                    trace_memory)
+    return _recorder
+
+
+def add_arguments(parser):
+    """
+    Add the instrumentation options of a stage to an ArgumentParser (with
+    defaults from the environment).
+    """
+    group = parser.add_argument_group('instrumentation')
+    group.add_argument('--instrument', metavar='FILE',
+                       default=os.environ.get(INSTRUMENT_ENV),
+                       help='append timings and counters of each phase to '
+                            'FILE as JSON lines (- for stderr)')
+    group.add_argument('--profile', metavar='DIR',
+                       default=os.environ.get(PROFILE_ENV),
+                       help='dump a cProfile of the stage to DIR/STAGE.prof')
+    group.add_argument('--trace-memory', action='store_true',
+                       default=bool(os.environ.get(TRACE_MEMORY_ENV)),
+                       help='measure the peak memory allocated in each phase '
+                            '(slow)')
+
+
+@contextlib.contextmanager
+def stage(name, args=None):
+    """
+    Instrument a stage for the duration of the with statement, recording
+    it as a phase named 'total'.
+
+    The functions of cs4041 report the time taken by each phase of their
+    work (read, normalize, count, vocab, likelihoods, score) along with
+    counters such as the number of documents/tokens processed. Nothing is
+    recorded unless the stage is run with --instrument FILE (or
+    CS4041_INSTRUMENT=FILE), e.g.
+
+        CS4041_INSTRUMENT=data/stats.jsonl ./stage5 data/corpus.bin
+
+    --profile DIR (or CS4041_PROFILE=DIR) also dumps a cProfile of the
+    stage to DIR/STAGE.prof, and --trace-memory (or CS4041_TRACE_MEMORY=1)
+    measures the peak memory allocated in each phase with tracemalloc, which
+    slows the stage down.
+
+    Args:
+        name: name of the stage.
+        args: the arguments parsed by an ArgumentParser with the options
+              of add_arguments() (None to use the environment only).
+    """
+    fname = getattr(args, 'instrument', os.environ.get(INSTRUMENT_ENV))
+    profile_dir = getattr(args, 'profile', os.environ.get(PROFILE_ENV))
+    trace_memory = getattr(args, 'trace_memory',
+                           bool(os.environ.get(TRACE_MEMORY_ENV)))
+    trace_memory = trace_memory and fname is not None
+
+    configure(fname, name, trace_memory)
+    if trace_memory:
+        tracemalloc.start()
+
+    profiler = None
+    if profile_dir is not None:
+        os.makedirs(profile_dir, exist_ok=True)
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        with phase('total'):
+            yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(os.path.join(profile_dir, name + '.prof'))
+        if trace_memory:
+            tracemalloc.stop()
+        configure(None)
@@ -0,0 +1,386 @@
+import numpy as np
+from . import instrument
+from .vocabulary import count_bigram_ids, decode_bigrams
+
+UNKNOWN_TOKEN = '<UNKNOWN>'
+
+
+class Model:
+    """
+    A trained multinomial naive Bayes model.
+
+    Attributes:
+        tokens: list (or any sequence) of words/bigrams in the vocabulary.
+        token_index: dictionary (or any mapping with a get() method) with
+                     - key: word/bigram
+                     - value: column of this token in log_likelihoods
+        classes: list of classes.
+        log_likelihoods: array of shape (len(classes), len(tokens) + 1) with
+                         log(likelihood of token given class); the last
+                         column is the likelihood of the '<UNKNOWN>' token.
+        log_priors: array of shape (len(classes),) with the log probability
+                    of each class.
+    """
+
+    def __init__(self, tokens, classes, log_likelihoods, log_priors,
+                 token_index=None):
+        if token_index is None:
+            tokens = list(tokens)
+            token_index = {token: i for i, token in enumerate(tokens)}
+
+        self.tokens = tokens
+        self.token_index = token_index
+        self.classes = list(classes)
+        self.class_index = {class_: i for i, class_ in enumerate(self.classes)}
+        self.log_likelihoods = np.asarray(log_likelihoods)
+        self.log_priors = np.asarray(log_priors, dtype=np.float64)
+
+        # Keep float32 likelihoods (e.g. of a memory mapped model) as they are
+        if self.log_likelihoods.dtype not in (np.float32, np.float64):
+            self.log_likelihoods = self.log_likelihoods.astype(np.float64)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Derived from the other attributes, so not worth saving
+        state.pop('_log_odds', None)
+        return state
+
+    @property
+    def unknown_id(self):
+        """
+        Column of the '<UNKNOWN>' token in log_likelihoods.
+        """
+        return len(self.tokens)
+
+    @classmethod
+    def from_tuple(cls, trained_model):
+        """
+        Create a model from the 2-tuple format returned by older versions
+        of train() and train_with_bigram_features().
+
+        Args:
+            trained_model: A 2-tuple
+                1. class probabilities: a dictionary with
+                                        - key: class
+                                        - value: log probability of that class
+                2. likelihoods: a dictionary with
+                                - key: tuple (word/bigram, class)
+                                - value: log(likelihood of word/bigram
+                                         given class)
+
+        Returns:
+            A Model.
+        """
+        class_probability, likelihood = trained_model
+        classes = list(class_probability.keys())
+        tokens = sorted({token for token, _ in likelihood.keys()
+                         if token != UNKNOWN_TOKEN})
+
+        model = cls(tokens, classes,
+                    np.zeros((len(classes), len(tokens) + 1)),
+                    [class_probability[class_] for class_ in classes])
+
+        for (token, class_), value in likelihood.items():
+            col = model.token_index.get(token, model.unknown_id)
+            model.log_likelihoods[model.class_index[class_], col] = value
+
+        return model
+
+    def to_tuple(self):
+        """
+        Convert this model to the 2-tuple format accepted by
+        Model.from_tuple().
+
+        Returns:
+            A 2-tuple of the class probabilities and likelihoods dictionaries.
+        """
+        class_probability = {}
+        likelihood = {}
+
+        for i, class_ in enumerate(self.classes):
+            class_probability[class_] = float(self.log_priors[i])
+            row = self.log_likelihoods[i].tolist()
+
+            likelihood[(UNKNOWN_TOKEN, class_)] = row[self.unknown_id]
+            for token, value in zip(self.tokens, row):
+                likelihood[(token, class_)] = value
+
+        return class_probability, likelihood
+
+    def encode(self, words):
+        """
+        Map the words of a (cleaned) review to the columns of the features
+        they match, preferring bigrams over words.
+
+        A bigram (curr_word, next_word) in the vocabulary is always matched.
+        Otherwise curr_word is matched (or '<UNKNOWN>' if it is not in the
+        vocabulary), unless it was already included in the previous bigram.
+
+        Args:
+            words: list of words.
+
+        Returns:
+            A list of columns of log_likelihoods.
+        """
+        token_index = self.token_index
+        unknown_id = self.unknown_id
+        ids = []
+
+        # Was the current word included in the bigram
+        # (previous_word, curr_word)?
+        flag = False
+
+        for idx, curr_word in enumerate(words):
+            bigram_id = None
+            if idx < len(words) - 1:
+                bigram_id = token_index.get(curr_word + ' ' + words[idx+1])
+
+            if bigram_id is not None:
+                ids.append(bigram_id)
+                flag = True
+            else:
+                if not flag:
+                    ids.append(token_index.get(curr_word, unknown_id))
+                flag = False
+
+        return ids
+
+    def log_scores(self, ids):
+        """
+        Calculate the log probability of each class given a review times the
+        review probability.
+
+        Args:
+            ids: list of columns of log_likelihoods as returned by encode().
+
+        Returns:
+            An array with one log probability per class.
+        """
+        return self.log_priors + self.log_likelihoods[:, ids].sum(axis=1)
+
+    def log_odds(self, positive='+', negative='-'):
+        """
+        Return the log odds of the positive class against the negative class
+        for every feature (computed once and cached).
+
+        Args:
+            positive: the positive class.
+            negative: the negative class.
+
+        Returns:
+            A LogOdds.
+        """
+        log_odds = getattr(self, '_log_odds', None)
+
+        if log_odds is None or log_odds.classes != (positive, negative):
+            log_odds = LogOdds(self, positive, negative)
+            self._log_odds = log_odds
+
+        return log_odds
+
+    def encode_batch(self, documents):
+        """
+        Encode a batch of (cleaned) reviews into a sparse document-feature
+        matrix in compressed sparse row form.
+
+        Args:
+            documents: list of lists of words.
+
+        Returns:
+            A 2-tuple:
+            1. indptr: array of length len(documents) + 1, such that the
+                       features of document i are
+                       indices[indptr[i]:indptr[i+1]].
+            2. indices: array of columns of log_likelihoods (one per matched
+                        feature occurrence) as returned by encode().
+        """
+        indptr = np.zeros(len(documents) + 1, dtype=np.intp)
+        indices = []
+
+        for i, words in enumerate(documents):
+            indices.extend(self.encode(words))
+            indptr[i+1] = len(indices)
+
+        return indptr, np.array(indices, dtype=np.intp)
+
+    def encode_ids(self, ids, offsets, tokens):
+        """
+        Encode a batch of integer encoded (cleaned) reviews (see
+        vocabulary.encode_strings()) into a sparse document-feature matrix,
+        as encode_batch() does, without going through strings for every
+        word.
+
+        Every word contributes at most one feature: the bigram starting at
+        the word if it is in the vocabulary, otherwise the word itself
+        (or '<UNKNOWN>') unless the bigram ending at the word matched.
+
+        Args:
+            ids: array of the ids of all words of all reviews.
+            offsets: array of offsets of each review in ids.
+            tokens: list of words, such that tokens[id] is the word with
+                    that id.
+
+        Returns:
+            A 2-tuple (indptr, indices) as returned by encode_batch().
+        """
+        token_index = self.token_index
+        unknown_id = self.unknown_id
+
+        word_columns = np.array([token_index.get(token, unknown_id)
+                                 for token in tokens], dtype=np.intp)
+        columns = word_columns[ids]
+
+        # Is the bigram (ids[i], ids[i+1]) in the vocabulary?
+        matched = np.zeros(len(ids), dtype=bool)
+        pair_keys, keys, _ = count_bigram_ids(ids, offsets, len(tokens))
+
+        if len(keys) > 0:
+            key_columns = np.array([token_index.get(bigram, -1)
+                                    for bigram in decode_bigrams(keys,
+                                                                 tokens)],
+                                   dtype=np.intp)
+            pair_columns = np.full(len(pair_keys), -1, dtype=np.intp)
+            valid = pair_keys >= 0
+            pair_columns[valid] = key_columns[np.searchsorted(
+                keys, pair_keys[valid])]
+
+            matched[:-1] = pair_columns >= 0
+            columns[:-1][matched[:-1]] = pair_columns[matched[:-1]]
+
+        # A word is skipped if the previous bigram matched
+        counted = matched.copy()
+        counted[0:1] = True
+        counted[1:] |= ~matched[:-1]
+
+        cum_counted = np.zeros(len(ids) + 1, dtype=np.intp)
+        np.cumsum(counted, out=cum_counted[1:])
+
+        return cum_counted[offsets], columns[counted]
+
+    def log_scores_batch(self, indptr, indices):
+        """
+        Calculate the log probability of each class given each review of a
+        batch times the review probability.
+
+        This is the product of the sparse document-feature count matrix with
+        the transposed log-likelihood matrix (plus the log priors), computed
+        with one weighted bincount per class.
+
+        Args:
+            indptr, indices: sparse document-feature matrix as returned by
+                             encode_batch().
+
+        Returns:
+            An array of shape (number of documents, number of classes).
+        """
+        no_of_docs = len(indptr) - 1
+        doc_ids = np.repeat(np.arange(no_of_docs), np.diff(indptr))
+        scores = np.empty((no_of_docs, len(self.classes)))
+
+        if instrument.enabled():
+            instrument.count(tokens=len(indices), oov=int(np.count_nonzero(
+                indices == self.unknown_id)))
+
+        for i, row in enumerate(self.log_likelihoods):
+            scores[:, i] = np.bincount(doc_ids, weights=row[indices],
+                                       minlength=no_of_docs)
+
+        return scores + self.log_priors
+
+
+class LogOdds:
+    """
+    Log odds of a class against another class for every feature of a Model,
+    for scoring a review in a single pass over its words.
+
+        log(P(+ | d) / P(- | d)) = log(P(+) / P(-)) +
+                                   sum(log(P(t | +) / P(t | -)))
+
+    The features are looked up in the token index of the model itself
+    (shared, for a memory mapped model, with every other use of the model
+    in the process), not copied.
+
+    Attributes:
+        classes: 2-tuple of the positive and negative class.
+        prior: log(P(+) / P(-)).
+        token_index: the token index of the model.
+        unknown_id: column of the '<UNKNOWN>' token.
+        deltas: list with the log odds of each column of the model.
+        max_abs: the largest absolute log odds of any feature.
+    """
+
+    def __init__(self, model, positive='+', negative='-'):
+        self.classes = (positive, negative)
+
+        deltas = (model.log_likelihoods[model.class_index[positive]] -
+                  model.log_likelihoods[model.class_index[negative]])
+
+        self.prior = float(model.log_priors[model.class_index[positive]] -
+                           model.log_priors[model.class_index[negative]])
+        self.token_index = model.token_index
+        self.unknown_id = model.unknown_id
+        self.deltas = deltas.tolist()
+        self.max_abs = float(np.abs(deltas).max())
+
+    def score(self, words, early_exit=False):
+        """
+        Calculate the log odds of the positive class given a (cleaned)
+        review, with the same bigram/word matching as Model.encode().
+
+        Args:
+            words: list of words.
+            early_exit: stop as soon as the words left cannot change the sign
+                        of the log odds (each word adds at most one feature),
+                        in which case only the sign of the result is exact.
+
+        Returns:
+            log(P(positive | review) / P(negative | review)).
+        """
+        token_index = self.token_index
+        deltas = self.deltas
+        unknown_id = self.unknown_id
+        ans = self.prior
+        no_of_words = len(words)
+        bound = self.max_abs * no_of_words
+
+        # Was the current word included in the bigram
+        # (previous_word, curr_word)?
+        flag = False
+
+        for idx, curr_word in enumerate(words):
+            bigram_id = None
+            if idx < no_of_words - 1:
+                bigram_id = token_index.get(curr_word + ' ' + words[idx+1])
+
+            if bigram_id is not None:
+                ans = ans + deltas[bigram_id]
+                flag = True
+            else:
+                if not flag:
+                    ans = ans + deltas[token_index.get(curr_word,
+                                                       unknown_id)]
+                flag = False
+
+            if early_exit:
+                bound = bound - self.max_abs
+                if ans > bound or ans < -bound:
+                    break
+
+        return ans
+
+
+def as_model(trained_model):
+    """
+    Return the given trained model as a Model, converting it from the
+    2-tuple format if needed.
+
+    Args:
+        trained_model: a Model or a 2-tuple (see Model.from_tuple()).
+
+    Returns:
+        A Model.
+    """
+    if isinstance(trained_model, Model):
+        return trained_model
+
+    return Model.from_tuple(trained_model)
@@ -0,0 +1,372 @@
+import mmap
+import numpy as np
+import pickle
+import struct
+import zlib
+from .compress import dequantize, quantize
+from .model import Model, as_model
+
+# First bytes of every model file
+MAGIC = b'CS4041NB'
+VERSION = 2
+
+# Header: magic, version, size of a likelihood in bytes, number of classes,
+# number of tokens, number of token hash slots, followed by the byte offset
+# of each section:
+#   1. class offsets: uint64 array of length no_of_classes + 1
+#   2. class blob: UTF-8 encoded classes, one after the other
+#   3. token offsets: uint64 array of length no_of_tokens + 1
+#   4. token blob: UTF-8 encoded tokens (sorted), one after the other
+#   5. token hash slots: uint32 array of length no_of_slots (see
+#      build_slots())
+#   6. log priors: float64 array of length no_of_classes (followed, for
+#      int8 likelihoods, by the scale and the offset of each class, see
+#      compress.quantize())
+#   7. log likelihoods: float16/float32/float64/int8 array of shape
+#      (no_of_classes, no_of_tokens + 1), the last column being '<UNKNOWN>'
+# All numbers are little endian and every section is aligned to 8 bytes.
+HEADER = struct.Struct('<8sIIIQQQQQQQQQ')
+ALIGNMENT = 8
+
+# Version 1 files have no token hash slots (section 5)
+PREFIX = struct.Struct('<8sI')
+HEADER_V1 = struct.Struct('<8sIIIQQQQQQQ')
+
+# Token hash slot of no token
+EMPTY_SLOT = 0xFFFFFFFF
+
+FLOAT_DTYPES = {2: np.dtype('<f2'), 4: np.dtype('<f4'), 8: np.dtype('<f8')}
+QUANTIZED_DTYPE = np.dtype('i1')
+
+
+class TokenTable:
+    """
+    A sorted table of strings stored as a blob of UTF-8 encoded strings and
+    an array of offsets (string i is blob[offsets[i]:offsets[i+1]]), which
+    can be used in place of both the list of tokens and the token index of
+    a Model without decoding the strings up front.
+
+    Strings are looked up in an open addressing hash table of their indices
+    (see build_slots()) stored along with them, so that a memory mapped
+    table is used as it is, shared by all processes, with no index to build
+    in any of them. Without one, they are looked up with a binary search
+    (UTF-8 byte order is the same as code point order).
+
+    Attributes:
+        offsets: array of length len(self) + 1 of offsets in blob.
+        blob: bytes-like object.
+        slots: uint32 array of the hash slots (or None).
+    """
+
+    def __init__(self, offsets, blob, slots=None):
+        self.offsets = offsets
+        self.blob = memoryview(blob)
+        self.slots = slots
+        # Python ints are much faster to index with than numpy scalars
+        self.offset_view = memoryview(np.ascontiguousarray(offsets,
+                                                           dtype=np.uint64))
+        self.slot_view = (None if slots is None else
+                          memoryview(np.ascontiguousarray(slots,
+                                                          dtype=np.uint32)))
+
+    @classmethod
+    def from_strings(cls, strings, hashed=False):
+        """
+        Create a table from a list of strings (which must be sorted for
+        get() to work without hash slots).
+
+        Args:
+            strings: list of strings.
+            hashed: whether to build the hash slots of the strings.
+        """
+        encoded = [string.encode() for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+        np.cumsum([len(string) for string in encoded], out=offsets[1:])
+
+        return cls(offsets, b''.join(encoded),
+                   build_slots(encoded) if hashed else None)
+
+    def __len__(self):
+        return len(self.offset_view) - 1
+
+    def key(self, i):
+        """
+        Return the encoded string i.
+        """
+        return self.blob[self.offset_view[i]:self.offset_view[i+1]].tobytes()
+
+    def __getitem__(self, i):
+        if i < 0:
+            i = i + len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('token index out of range')
+
+        return self.key(i).decode()
+
+    def __iter__(self):
+        blob = self.blob.tobytes()
+        offsets = self.offset_view.tolist()
+
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            yield blob[start:end].decode()
+
+    def get(self, string, default=None):
+        """
+        Return the index of the given string, or default if it is not in the
+        table.
+        """
+        key = string.encode()
+
+        if self.slot_view is None:
+            return self.search(key, default)
+
+        slot_view = self.slot_view
+        offset_view = self.offset_view
+        blob = self.blob
+        mask = len(slot_view) - 1
+        slot = zlib.crc32(key) & mask
+
+        while True:
+            i = slot_view[slot]
+            if i == EMPTY_SLOT:
+                return default
+            if blob[offset_view[i]:offset_view[i+1]] == key:
+                return i
+            slot = (slot + 1) & mask
+
+    def search(self, key, default=None):
+        """
+        Return the index of the given encoded string found with a binary
+        search, or default if it is not in the table.
+        """
+        low = 0
+        high = len(self)
+
+        while low < high:
+            mid = (low + high) // 2
+            mid_key = self.key(mid)
+            if mid_key < key:
+                low = mid + 1
+            elif mid_key > key:
+                high = mid
+            else:
+                return mid
+
+        return default
+
+    def __contains__(self, string):
+        return self.get(string) is not None
+
+    def __reduce__(self):
+        # A memory map cannot be pickled, so pickle a copy
+        return (TokenTable, (np.array(self.offsets), self.blob.tobytes(),
+                             None if self.slots is None
+                             else np.array(self.slots)))
+
+
+def build_slots(encoded):
+    """
+    Build an open addressing hash table (with linear probing) of the indices
+    of encoded strings: string i is in the first slot holding i or
+    EMPTY_SLOT from slot crc32(string) & (number of slots - 1) on. The
+    number of slots is a power of two at least twice the number of strings,
+    so that few slots are probed.
+
+    Args:
+        encoded: list of encoded strings.
+
+    Returns:
+        A uint32 array of the slots.
+    """
+    no_of_slots = 1 << max(1, (2 * len(encoded) - 1).bit_length())
+    mask = no_of_slots - 1
+    slots = [EMPTY_SLOT] * no_of_slots
+
+    for i, key in enumerate(encoded):
+        slot = zlib.crc32(key) & mask
+        while slots[slot] != EMPTY_SLOT:
+            slot = (slot + 1) & mask
+        slots[slot] = i
+
+    return np.array(slots, dtype=np.uint32)
+
+
+def align(offset):
+    """
+    Return the smallest multiple of ALIGNMENT >= offset.
+    """
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_model(model, fname, dtype=np.float64):
+    """
+    Save the given model to a binary model file.
+
+    Args:
+        model: a Model (or a 2-tuple, see Model.from_tuple()).
+        fname: file name.
+        dtype: numpy type to store the likelihoods as: float64, float32,
+               float16 or int8 (quantized, see compress.quantize()).
+    """
+    model = as_model(model)
+    dtype = np.dtype(dtype).newbyteorder('<')
+
+    # The features of a subclass (e.g. n-grams or hashed features) are
+    # matched differently, which the file does not record
+    if type(model) is not Model:
+        raise TypeError('a {} cannot be stored in a binary model '
+                        'file'.format(type(model).__name__))
+
+    if dtype != QUANTIZED_DTYPE and (dtype.itemsize not in FLOAT_DTYPES or
+                                     dtype.kind != 'f'):
+        raise ValueError('{} is not float16, float32, float64 or '
+                         'int8.'.format(dtype))
+
+    tokens = list(model.tokens)
+    order = sorted(range(len(tokens)), key=tokens.__getitem__)
+    classes = TokenTable.from_strings(model.classes)
+    table = TokenTable.from_strings([tokens[i] for i in order], hashed=True)
+
+    # Reorder the columns as the sorted tokens, keeping '<UNKNOWN>' last
+    log_likelihoods = model.log_likelihoods[:, order + [model.unknown_id]]
+    log_priors = model.log_priors
+
+    if dtype == QUANTIZED_DTYPE:
+        log_likelihoods, scales, offsets = quantize(log_likelihoods)
+        log_priors = np.concatenate([log_priors, scales, offsets])
+
+    sections = [classes.offsets.astype('<u8').tobytes(),
+                classes.blob.tobytes(),
+                table.offsets.astype('<u8').tobytes(),
+                table.blob.tobytes(),
+                table.slots.astype('<u4').tobytes(),
+                log_priors.astype('<f8').tobytes(),
+                np.ascontiguousarray(log_likelihoods, dtype=dtype).tobytes()]
+
+    offsets = []
+    offset = align(HEADER.size)
+    for section in sections:
+        offsets.append(offset)
+        offset = align(offset + len(section))
+
+    with open(fname, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, dtype.itemsize,
+                            len(model.classes), len(tokens),
+                            len(table.slots), *offsets))
+
+        for offset, section in zip(offsets, sections):
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(section)
+
+
+def is_model_file(fname):
+    """
+    Return whether the file with given filename is a binary model file.
+    """
+    with open(fname, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def read_model(fname):
+    """
+    Open a binary model file with mmap, without copying the likelihoods,
+    the tokens or their hash slots, so that all processes reading the same
+    file share a single copy of it in the page cache (and tokens are looked
+    up right away, see TokenTable).
+
+    float16 and int8 likelihoods are converted to float32 (a copy in each
+    process), trading the shared copy for a smaller file.
+
+    Args:
+        fname: file name.
+
+    Returns:
+        A Model, whose tokens and token_index are a TokenTable.
+
+    Raises:
+        ValueError: if the file is not a model file of a supported version.
+    """
+    with open(fname, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(buf) < PREFIX.size or PREFIX.unpack_from(buf)[0] != MAGIC:
+        raise ValueError('{} is not a model file.'.format(fname))
+
+    version = PREFIX.unpack_from(buf)[1]
+
+    if version == VERSION and len(buf) >= HEADER.size:
+        (_, _, itemsize, no_of_classes, no_of_tokens, no_of_slots,
+         class_offsets_start, class_blob_start, token_offsets_start,
+         token_blob_start, slots_start, log_priors_start,
+         log_likelihoods_start) = HEADER.unpack_from(buf)
+    elif version == 1 and len(buf) >= HEADER_V1.size:
+        (_, _, itemsize, no_of_classes, no_of_tokens,
+         class_offsets_start, class_blob_start, token_offsets_start,
+         token_blob_start, log_priors_start,
+         log_likelihoods_start) = HEADER_V1.unpack_from(buf)
+        no_of_slots = 0
+    else:
+        itemsize = None
+
+    if itemsize not in FLOAT_DTYPES and itemsize != QUANTIZED_DTYPE.itemsize:
+        raise ValueError('{} is a model file of an unsupported version '
+                         '({}).'.format(fname, version))
+
+    def array(dtype, count, start):
+        # Converts to native byte order (with a copy) on big endian machines
+        return np.frombuffer(buf, dtype=dtype, count=count,
+                             offset=start).astype(dtype.newbyteorder('='),
+                                                  copy=False)
+
+    class_offsets = array(np.dtype('<u8'), no_of_classes + 1,
+                          class_offsets_start)
+    token_offsets = array(np.dtype('<u8'), no_of_tokens + 1,
+                          token_offsets_start)
+
+    classes = TokenTable(class_offsets,
+                         memoryview(buf)[class_blob_start:
+                                         class_blob_start +
+                                         int(class_offsets[-1])])
+    # Version 1 tokens are looked up with a binary search
+    slots = (array(np.dtype('<u4'), no_of_slots, slots_start)
+             if no_of_slots else None)
+    tokens = TokenTable(token_offsets,
+                        memoryview(buf)[token_blob_start:
+                                        token_blob_start +
+                                        int(token_offsets[-1])],
+                        slots)
+    shape = (no_of_classes, no_of_tokens + 1)
+
+    if itemsize == QUANTIZED_DTYPE.itemsize:
+        log_priors, scales, offsets = array(
+            np.dtype('<f8'), 3 * no_of_classes,
+            log_priors_start).reshape(3, no_of_classes)
+        log_likelihoods = dequantize(
+            array(QUANTIZED_DTYPE, shape[0] * shape[1],
+                  log_likelihoods_start).reshape(shape), scales, offsets)
+    else:
+        log_priors = array(np.dtype('<f8'), no_of_classes, log_priors_start)
+        log_likelihoods = array(FLOAT_DTYPES[itemsize], shape[0] * shape[1],
+                                log_likelihoods_start).reshape(shape)
+
+        if log_likelihoods.dtype == np.float16:
+            log_likelihoods = log_likelihoods.astype(np.float32)
+
+    return Model(tokens, list(classes), log_likelihoods, log_priors,
+                 token_index=tokens)
+
+
+def convert_model(in_fname, out_fname, dtype=np.float64):
+    """
+    Convert a model saved in a python pickle file (see
+    train.write_trained_model()) to a binary model file.
+
+    Args:
+        in_fname: name of the pickle file.
+        out_fname: name of the binary model file.
+        dtype: numpy float type to store the likelihoods as.
+    """
+    with open(in_fname, 'rb') as f:
+        model = pickle.load(f)
+
+    write_model(model, out_fname, dtype)
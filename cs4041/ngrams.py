@@ -0,0 +1,446 @@
+from collections import Counter
+import numpy as np
+from . import instrument
+from .model import Model
+from .stopwords import as_normalizer
+from .train import get_class_probabilities_from_counts, get_likelihood_table
+from .vocabulary import encode_strings
+
+DEFAULT_MAX_N = 3
+
+
+def build_trie(ngrams):
+    """
+    Build a trie of n-grams, as nested dictionaries keyed by the words (or
+    word ids) of the n-grams, the value of an n-gram being stored under the
+    key None of the node it ends at.
+
+    Args:
+        ngrams: iterable of 2-tuples (sequence of words, value).
+
+    Returns:
+        The root of the trie (a dictionary).
+    """
+    root = {}
+
+    for words, value in ngrams:
+        node = root
+        for word in words:
+            child = node.get(word)
+            if child is None:
+                child = node[word] = {}
+            node = child
+        node[None] = value
+
+    return root
+
+
+def segment(words, trie, max_n, unknown=None):
+    """
+    Split a list of words into the longest n-grams of a trie (see
+    build_trie()) in one left-to-right pass: the longest n-gram of at most
+    max_n words starting at the current word is matched, and the words it
+    covers are skipped. A word starting no n-gram (not even the word itself)
+    is matched as unknown.
+
+    No n-gram string is ever built, and every word is looked at no more than
+    max_n times, so that the time taken is linear in the number of words.
+
+    Args:
+        words: list of words (or word ids).
+        trie: root of a trie of n-grams.
+        max_n: number of words of the longest n-gram in the trie.
+        unknown: value of a word starting no n-gram.
+
+    Returns:
+        A list of the values of the n-grams matched.
+    """
+    values = []
+    no_of_words = len(words)
+    i = 0
+
+    while i < no_of_words:
+        value = unknown
+        length = 1
+        node = trie
+
+        for j in range(i, min(i + max_n, no_of_words)):
+            node = node.get(words[j])
+            if node is None:
+                break
+            curr_value = node.get(None)
+            if curr_value is not None:
+                value = curr_value
+                length = j - i + 1
+
+        values.append(value)
+        i = i + length
+
+    return values
+
+
+def count_ngram_ids(ids, offsets, n):
+    """
+    Count the n-grams (n consecutive words of a string) of integer encoded
+    strings (see vocabulary.encode_strings()).
+
+    Args:
+        ids: array of the ids of all words of all strings.
+        offsets: array of offsets of each string in ids.
+        n: number of words of the n-grams.
+
+    Returns:
+        A 2-tuple:
+        1. array of shape (number of distinct n-grams, n) with the word ids
+           of each n-gram.
+        2. array with the count of each n-gram.
+    """
+    ids = np.asarray(ids, dtype=np.intp)
+    offsets = np.asarray(offsets, dtype=np.intp)
+
+    if len(ids) < n:
+        return (np.zeros((0, n), dtype=np.intp),
+                np.zeros(0, dtype=np.intp))
+
+    # An n-gram starts at every word with n - 1 more words in its string
+    doc_ids = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    starts = doc_ids[:len(ids) - n + 1] == doc_ids[n - 1:]
+    windows = np.stack([ids[k:len(ids) - n + 1 + k][starts]
+                        for k in range(n)], axis=1)
+
+    if len(windows) == 0:
+        return windows, np.zeros(0, dtype=np.intp)
+
+    # Sort the n-grams (by their first word, then second...) and count the
+    # runs of equal ones
+    windows = windows[np.lexsort(windows.T[::-1])]
+    first = np.ones(len(windows), dtype=bool)
+    first[1:] = (windows[1:] != windows[:-1]).any(axis=1)
+    run_starts = np.flatnonzero(first)
+
+    return windows[run_starts], np.diff(np.append(run_starts, len(windows)))
+
+
+def get_ngram_frequencies_from_ids(ids, offsets, tokens,
+                                   max_n=DEFAULT_MAX_N, min_ngram_occur=3):
+    """
+    Return the frequency of the features of integer encoded strings (see
+    vocabulary.encode_strings()) with n-gram features: the n-grams of 2 to
+    max_n words occurring at least min_ngram_occur times, and the words.
+
+    Every string is split into the longest of these n-grams (see segment()),
+    as NgramModel.encode() does, so each word occurrence is counted in
+    exactly one feature.
+
+    Args:
+        ids: array of the ids of all words of all strings.
+        offsets: array of offsets of each string in ids.
+        tokens: list of words, such that tokens[id] is the word with that id.
+        max_n: number of words of the longest n-grams.
+        min_ngram_occur: minimum number of occurrences of an n-gram for it
+                         to be a feature.
+
+    Returns:
+        A Counter with
+            - key: word/n-gram (its words joined by spaces)
+            - value: frequency of the word/n-gram in the strings
+    """
+    ids = np.asarray(ids, dtype=np.intp)
+    offsets = np.asarray(offsets, dtype=np.intp)
+
+    # Trie of the word ids, the value of an n-gram being its word ids
+    ngrams = [((word_id,), (word_id,))
+              for word_id in np.unique(ids).tolist()]
+
+    for n in range(2, max_n + 1):
+        keys, counts = count_ngram_ids(ids, offsets, n)
+        ngrams.extend((key, tuple(key))
+                      for key in keys[counts >= min_ngram_occur].tolist())
+
+    trie = build_trie(ngrams)
+    id_list = ids.tolist()
+    offset_list = offsets.tolist()
+    features = Counter()
+
+    for start, end in zip(offset_list[:-1], offset_list[1:]):
+        features.update(segment(id_list[start:end], trie, max_n))
+
+    return Counter({' '.join(tokens[word_id] for word_id in key): count
+                    for key, count in features.items()})
+
+
+def get_ngram_frequencies(strings, max_n=DEFAULT_MAX_N, min_ngram_occur=3):
+    """
+    Return the frequency of the features of a list of (cleaned) strings with
+    n-gram features (see get_ngram_frequencies_from_ids()).
+    """
+    return get_ngram_frequencies_from_ids(*encode_strings(strings),
+                                          max_n, min_ngram_occur)
+
+
+class NgramModel(Model):
+    """
+    A multinomial naive Bayes model with n-gram features: its tokens are
+    words and n-grams of up to max_n words (joined by spaces), and a review
+    is split into the longest tokens matching it (see segment()) instead of
+    the bigram/word matching of a Model.
+
+    The tokens are looked up in a trie of their words, built once when
+    first needed.
+
+    Attributes:
+        tokens, token_index, classes, class_index, log_likelihoods,
+        log_priors: as in a Model.
+        max_n: number of words of the longest n-grams.
+    """
+
+    def __init__(self, tokens, classes, log_likelihoods, log_priors,
+                 token_index=None, max_n=None):
+        super().__init__(tokens, classes, log_likelihoods, log_priors,
+                         token_index)
+        if max_n is None:
+            max_n = max((token.count(' ') + 1 for token in self.tokens),
+                        default=1)
+
+        self.max_n = max_n
+        self._trie = None
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        # Built again from the tokens when needed
+        state['_trie'] = None
+        return state
+
+    @property
+    def trie(self):
+        """
+        Trie of the tokens (see build_trie()), with their columns as values.
+        """
+        if self._trie is None:
+            self._trie = build_trie((token.split(' '), i)
+                                    for i, token in enumerate(self.tokens))
+
+        return self._trie
+
+    def encode(self, words):
+        """
+        Map the words of a (cleaned) review to the columns of the longest
+        n-grams (or words) they match, '<UNKNOWN>' for a word matching none.
+        """
+        return segment(words, self.trie, self.max_n, self.unknown_id)
+
+    def encode_ids(self, ids, offsets, tokens):
+        """
+        Encode a batch of integer encoded (cleaned) reviews (see
+        vocabulary.encode_strings()) into a sparse document-feature matrix
+        (see Model.encode_batch()).
+        """
+        id_list = np.asarray(ids).tolist()
+        offset_list = np.asarray(offsets).tolist()
+        indptr = np.zeros(len(offset_list), dtype=np.intp)
+        indices = []
+
+        for i, (start, end) in enumerate(zip(offset_list[:-1],
+                                             offset_list[1:])):
+            indices.extend(self.encode([tokens[word_id]
+                                        for word_id in id_list[start:end]]))
+            indptr[i+1] = len(indices)
+
+        return indptr, np.array(indices, dtype=np.intp)
+
+    def log_odds(self, positive='+', negative='-'):
+        """
+        Return the log odds of the positive class against the negative class
+        for every feature (computed once and cached).
+
+        Returns:
+            An NgramLogOdds.
+        """
+        log_odds = getattr(self, '_log_odds', None)
+
+        if log_odds is None or log_odds.classes != (positive, negative):
+            log_odds = NgramLogOdds(self, positive, negative)
+            self._log_odds = log_odds
+
+        return log_odds
+
+
+class NgramLogOdds:
+    """
+    Log odds of a class against another class for every feature of an
+    NgramModel (see LogOdds).
+
+    Attributes:
+        classes: 2-tuple of the positive and negative class.
+        prior: log(P(+) / P(-)).
+        deltas: list with the log odds of each column of the model.
+        trie: trie of the tokens of the model (see NgramModel.trie).
+        max_n: number of words of the longest n-grams.
+        max_abs: the largest absolute log odds of any feature.
+    """
+
+    def __init__(self, model, positive='+', negative='-'):
+        self.classes = (positive, negative)
+
+        deltas = (model.log_likelihoods[model.class_index[positive]] -
+                  model.log_likelihoods[model.class_index[negative]])
+
+        self.prior = float(model.log_priors[model.class_index[positive]] -
+                           model.log_priors[model.class_index[negative]])
+        self.deltas = deltas.tolist()
+        self.trie = model.trie
+        self.max_n = model.max_n
+        self.unknown_id = model.unknown_id
+        self.max_abs = float(np.abs(deltas).max())
+
+    def score(self, words, early_exit=False):
+        """
+        Calculate the log odds of the positive class given a (cleaned)
+        review, with the same longest n-gram matching as NgramModel.encode().
+
+        Args:
+            words: list of words.
+            early_exit: stop as soon as the words left cannot change the sign
+                        of the log odds (each feature covers at least one
+                        word), in which case only the sign of the result is
+                        exact.
+
+        Returns:
+            log(P(positive | review) / P(negative | review)).
+        """
+        deltas = self.deltas
+        trie = self.trie
+        max_n = self.max_n
+        ans = self.prior
+        no_of_words = len(words)
+        i = 0
+
+        # The loop of segment(), adding up the log odds as it goes
+        while i < no_of_words:
+            column = self.unknown_id
+            length = 1
+            node = trie
+
+            for j in range(i, min(i + max_n, no_of_words)):
+                node = node.get(words[j])
+                if node is None:
+                    break
+                curr_column = node.get(None)
+                if curr_column is not None:
+                    column = curr_column
+                    length = j - i + 1
+
+            ans = ans + deltas[column]
+            i = i + length
+
+            if early_exit:
+                bound = self.max_abs * (no_of_words - i)
+                if ans > bound or ans < -bound:
+                    break
+
+        return ans
+
+
+def get_ngram_model(class_doc_count, frequency, max_n=DEFAULT_MAX_N,
+                    min_occur=3):
+    """
+    Create an NgramModel from the number of documents and the word/n-gram
+    frequencies of each class (see get_ngram_frequencies()).
+
+    Args:
+        class_doc_count: dictionary with
+                         - key: class
+                         - value: number of documents of this class.
+        frequency: dictionary with
+                   - key: class
+                   - value: Counter for all words/n-grams in that class
+        max_n: number of words of the longest n-grams.
+        min_occur: minimum number of occurrences of a word/n-gram for it to
+                   be included in the vocabulary.
+
+    Returns:
+        An NgramModel.
+    """
+    class_probability = get_class_probabilities_from_counts(class_doc_count)
+    vocabulary, log_likelihoods = get_likelihood_table(frequency, min_occur)
+
+    return NgramModel(vocabulary, frequency.keys(), log_likelihoods,
+                      [class_probability[class_]
+                       for class_ in frequency.keys()], max_n=max_n)
+
+
+def train_with_ngram_features(documents, stopwords, max_n=DEFAULT_MAX_N,
+                              min_occur=3, min_ngram_occur=3):
+    """
+    Train a multinomial naive Bayes classifier based on given list of
+    classified documents, with n-gram features (see NgramModel).
+
+    Args:
+        documents: dictionary with
+                   - key: class
+                   - value: list of documents belonging to this class.
+        stopwords: list of words (or a Normalizer) to remove from all
+                   documents.
+        max_n: number of words of the longest n-grams.
+        min_occur: minimum number of occurrences of a word/n-gram for it to
+                   be included in the vocabulary.
+        min_ngram_occur: minimum number of occurrences of an n-gram in a
+                         class for it to be counted as a feature of the
+                         class (instead of its words).
+
+    Returns:
+        An NgramModel.
+    """
+    normalizer = as_normalizer(stopwords)
+    class_doc_count = {}
+    frequency = {}
+
+    for class_, doclist in documents.items():
+        cleaned_docs = normalizer.rm_stopwords(doclist)
+        class_doc_count[class_] = len(cleaned_docs)
+
+        with instrument.phase('count', docs=len(cleaned_docs)):
+            frequency[class_] = get_ngram_frequencies(cleaned_docs, max_n,
+                                                      min_ngram_occur)
+
+    return get_ngram_model(class_doc_count, frequency, max_n, min_occur)
+
+
+def train_ngram_corpus(corpus, max_n=DEFAULT_MAX_N, min_occur=3,
+                       min_ngram_occur=3, docs=None):
+    """
+    Train a multinomial naive Bayes classifier with n-gram features (see
+    train_with_ngram_features()) on a Corpus of cleaned documents.
+
+    Args:
+        corpus: a Corpus.
+        max_n: number of words of the longest n-grams.
+        min_occur: minimum number of occurrences of a word/n-gram for it to
+                   be included in the vocabulary.
+        min_ngram_occur: minimum number of occurrences of an n-gram in a
+                         class for it to be counted as a feature of the
+                         class.
+        docs: dictionary with
+              - key: class
+              - value: list of indices of the documents of this class
+              to train with (all documents by default).
+
+    Returns:
+        An NgramModel.
+    """
+    if docs is None:
+        docs = corpus.class_docs()
+
+    class_doc_count = {}
+    frequency = {}
+
+    for class_, class_docs in docs.items():
+        ids, offsets = corpus.documents(class_docs)
+        class_doc_count[class_] = len(class_docs)
+
+        with instrument.phase('count', docs=len(class_docs),
+                              tokens=len(ids)):
+            frequency[class_] = get_ngram_frequencies_from_ids(
+                ids, offsets, corpus.tokens, max_n, min_ngram_occur)
+
+    return get_ngram_model(class_doc_count, frequency, max_n, min_occur)
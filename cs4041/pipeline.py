@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import time
+
+STATE_FNAME = "data/pipeline.json"
+
+
+class Step:
+    """
+    A step of a Pipeline: a function reading some files and writing others.
+
+    Attributes:
+        name: name of the step.
+        func: function of no arguments doing the step.
+        inputs: list of the names of the files the step reads.
+        outputs: list of the names of the files the step writes.
+        params: dictionary of the parameters of the step (anything that
+                changes its outputs, other than the contents of the inputs),
+                which must be JSON serializable.
+    """
+
+    def __init__(self, name, func, inputs, outputs, params=None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params or {}
+
+
+class Pipeline:
+    """
+    Run steps, skipping those that are up to date.
+
+    A step is keyed by a hash of its name, its parameters and the contents
+    of its inputs. It is up to date if it was last run with the same key and
+    its outputs are unchanged since, so that changing a parameter (or an
+    input) only runs the steps whose inputs end up changing too.
+
+    The keys, the hashes of the outputs and the timings of each step are
+    saved in a JSON state file. The hash of a file is recomputed only if its
+    size or modification time changed.
+
+    Attributes:
+        state_fname: name of the state file.
+        state: dictionary with
+               - 'files': file name => [size, mtime, hash]
+               - 'steps': step name => {'key', 'outputs', 'seconds'}
+    """
+
+    def __init__(self, state_fname=STATE_FNAME):
+        self.state_fname = state_fname
+        self.state = {'files': {}, 'steps': {}}
+
+        if os.path.exists(state_fname):
+            with open(state_fname) as f:
+                self.state = json.load(f)
+
+    def save(self):
+        """
+        Write the state file.
+        """
+        tmp_fname = self.state_fname + '.tmp'
+        with open(tmp_fname, 'w') as f:
+            json.dump(self.state, f, indent=1, sort_keys=True)
+        os.replace(tmp_fname, self.state_fname)
+
+    def hash_file(self, fname):
+        """
+        Return the SHA-256 of the contents of a file (or None if it does not
+        exist).
+        """
+        try:
+            stat = os.stat(fname)
+        except FileNotFoundError:
+            return None
+
+        size, mtime, digest = self.state['files'].get(fname, [None] * 3)
+        if size == stat.st_size and mtime == stat.st_mtime_ns:
+            return digest
+
+        sha = hashlib.sha256()
+        with open(fname, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+
+        digest = sha.hexdigest()
+        self.state['files'][fname] = [stat.st_size, stat.st_mtime_ns, digest]
+
+        return digest
+
+    def key(self, step):
+        """
+        Return the key of a step.
+        """
+        inputs = {}
+        for fname in step.inputs:
+            inputs[fname] = self.hash_file(fname)
+            if inputs[fname] is None:
+                raise FileNotFoundError(
+                    '{} (input of step {})'.format(fname, step.name))
+
+        return hashlib.sha256(json.dumps(
+            [step.name, step.params, inputs],
+            sort_keys=True).encode()).hexdigest()
+
+    def is_up_to_date(self, step, key):
+        """
+        Return whether the step was last run with the given key and its
+        outputs are unchanged since.
+        """
+        record = self.state['steps'].get(step.name)
+
+        return (record is not None and record['key'] == key and
+                all(self.hash_file(fname) == record['outputs'].get(fname)
+                    for fname in step.outputs))
+
+    def run(self, steps, force=False, log=print):
+        """
+        Run the given steps in order, skipping those that are up to date.
+
+        Args:
+            steps: list of Steps (each after the steps writing its inputs).
+            force: run every step, even if it is up to date.
+            log: function called with a line of progress.
+
+        Returns:
+            A list of (step name, whether it ran, seconds taken to run it).
+        """
+        timings = []
+
+        for step in steps:
+            key = self.key(step)
+
+            if not force and self.is_up_to_date(step, key):
+                timings.append((step.name, False, 0.0))
+                log('{:<20} up to date'.format(step.name))
+                continue
+
+            log('{:<20} running...'.format(step.name))
+            start = time.perf_counter()
+            step.func()
+            seconds = time.perf_counter() - start
+
+            self.state['steps'][step.name] = {
+                'key': key,
+                'outputs': {fname: self.hash_file(fname)
+                            for fname in step.outputs},
+                'seconds': seconds,
+            }
+            # Save after every step, so that an interrupted run resumes
+            self.save()
+
+            timings.append((step.name, True, seconds))
+            log('{:<20} done in {:.2f} s'.format(step.name, seconds))
+
+        self.save()
+
+        return timings
@@ -1,11 +1,13 @@
-from bs4 import BeautifulSoup
 from collections import defaultdict
+import math
+import os
 import random
-import requests
-import urllib.parse
+import tempfile
+from . import instrument
+from .crawl import Crawler
 
 
-def get_amazon_reviews(asin, tld, class_=None, limit=10):
+def get_amazon_reviews(asin, tld, class_=None, limit=10, crawler=None):
     """
     Fetch customer reviews for any Amazon product.
 
@@ -14,6 +16,8 @@ def get_amazon_reviews(asin, tld, class_=None, limit=10):
         tld: top level domain of the Amazon store for this ASIN.
         limit: maximum number of reviews to fetch.
         class_: class of reviews to fetch => +/-/None
+        crawler: the Crawler to fetch the review pages with (pass the same
+                 one for all products to reuse its connections and limits).
 
     Returns:
         A list of reviews.
@@ -22,49 +26,61 @@ def get_amazon_reviews(asin, tld, class_=None, limit=10):
         HTTPError
         ValueError
     """
-    review_base_url = "http://www.amazon.{TLD}/product-reviews/"
-    valid_tlds = ['com.au', 'com.br', 'ca', 'cn', 'fr', 'de', 'in',
-                  'it', 'co.jp', 'com.mx', 'nl', 'es', 'co.uk', 'com']
+    if crawler is None:
+        crawler = Crawler(workers=1)
 
-    if tld not in valid_tlds:
-        raise ValueError('{} is not a valid Amazon TLD.'.format(tld))
+    return crawler.get_reviews(asin, tld, class_=class_, limit=limit)
 
-    url = urllib.parse.urljoin(review_base_url.format(TLD=tld), asin)
-    params = {'pageNumber': 1}
-    reviews = []
 
-    if class_ == '+':
-        params['filterByStar'] = "positive"
-    elif class_ == '-':
-        params['filterByStar'] = "critical"
+def iter_reviews(fname):
+    """
+    Iterate over the reviews in a file with given filename in the following
+    format, one line at a time:
+
+        CLASS<TAB>REVIEW
 
-    while limit > 0:
-        resp = requests.get(url, params=params)
+    Args:
+        fname: name of the file to read from.
 
-        # Try again if get a 503
-        if resp.status_code == 503:
-            continue
+    Yields:
+        2-tuples of (class, review).
+    """
+    with open(fname) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                class_, review_text = line.split(maxsplit=1)
+                yield class_, review_text
 
-        # Raise an error if not a 503 and no reviews have been collected.
-        if len(reviews) == 0:
-            resp.raise_for_status()
 
-        soup = BeautifulSoup(resp.text, 'html.parser')
-        review_soup = soup.find_all(class_='review-text', limit=limit)
+def iter_review_chunks(fname, chunksize=10000):
+    """
+    Iterate over the reviews in a file with given filename (see
+    iter_reviews()), chunksize reviews at a time.
 
-        # Break if this page has no reviews
-        if len(review_soup) == 0:
-            break
+    Args:
+        fname: name of the file to read from.
+        chunksize: maximum number of reviews in a chunk.
 
-        curr_reviews = [' '.join(review.stripped_strings)
-                        for review in review_soup]
+    Yields:
+        Dictionaries with
+            - key: class
+            - value: list of reviews belonging to this class.
+    """
+    chunk = defaultdict(list)
+    no_of_reviews = 0
 
-        reviews.extend(curr_reviews)
+    for class_, review_text in iter_reviews(fname):
+        chunk[class_].append(review_text)
+        no_of_reviews = no_of_reviews + 1
 
-        limit = limit - len(curr_reviews)
-        params['pageNumber'] = params['pageNumber'] + 1
+        if no_of_reviews == chunksize:
+            yield chunk
+            chunk = defaultdict(list)
+            no_of_reviews = 0
 
-    return reviews
+    if no_of_reviews > 0:
+        yield chunk
 
 
 def read_reviews(fname):
@@ -83,33 +99,172 @@ def read_reviews(fname):
     """
     reviews = defaultdict(list)
 
-    with open(fname) as f:
-        for line in f:
-            line = line.strip()
-            if line:
-                class_, review_text = line.split(maxsplit=1)
-                reviews[class_].append(review_text)
+    with instrument.phase('read') as curr_phase:
+        for class_, review_text in iter_reviews(fname):
+            reviews[class_].append(review_text)
+
+        curr_phase.set(docs=sum(len(review_list)
+                                for review_list in reviews.values()))
 
     return reviews
 
 
-def write_reviews(reviews, fname):
+class ReviewWriter:
+    """
+    Write reviews to a file with given filename one at a time, in the
+    following format:
+
+        CLASS<TAB>REVIEW
+
+    Use as a context manager:
+
+        with ReviewWriter(fname) as writer:
+            writer.write(class_, review_text)
+    """
+
+    def __init__(self, fname):
+        self.f = open(fname, 'w')
+
+    def write(self, class_, review_text):
+        """
+        Write a review (skipping empty reviews).
+
+        Args:
+            class_: class of the review.
+            review_text: a string.
+        """
+        if len(review_text) > 0:
+            self.f.write(class_ + '\t' + review_text + '\n')
+
+    def close(self):
+        """
+        Close the file.
+        """
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_reviews(reviews, fname, seed=None):
     """
     Write the reviews to a file with given filename in the following format:
 
         CLASS<TAB>REVIEW
 
+    The reviews of each class are written in a random order (without
+    modifying the given lists).
+
     Args:
         reviews: dictionary with
                  - key: class
                  - value: list of reviews belonging to this class.
         fname: name of the file to write to.
+        seed: seed for shuffling the reviews (None to use system entropy).
     """
-    with open(fname, 'w') as f:
+    rng = random.Random(seed)
+
+    with ReviewWriter(fname) as writer:
         for class_, review_texts in reviews.items():
             # Randomize the review texts
-            random.shuffle(review_texts)
+            review_texts = list(review_texts)
+            rng.shuffle(review_texts)
 
             for review_text in review_texts:
-                if len(review_text) > 0:
-                    f.write(class_ + '\t' + review_text + '\n')
+                writer.write(class_, review_text)
+
+
+def shuffle_reviews(in_fname, out_fname, seed=None, max_in_memory=1000000,
+                    max_open_files=64):
+    """
+    Write the reviews in a file to another file in a uniformly random order,
+    holding at most max_in_memory reviews in memory and max_open_files
+    temporary files open at a time (see write_shuffled()).
+
+    The shuffled reviews are written to a temporary file next to out_fname,
+    which then replaces it.
+
+    Args:
+        in_fname: name of the file to read from.
+        out_fname: name of the file to write to (may be the same as
+                   in_fname).
+        seed: seed for shuffling the reviews (None to use system entropy).
+        max_in_memory: maximum number of reviews to shuffle in memory.
+        max_open_files: maximum number of temporary files to scatter the
+                        reviews into at a time (at least 2).
+    """
+    rng = random.Random(seed)
+    no_of_reviews = sum(1 for _ in iter_reviews(in_fname))
+
+    out_dir = os.path.dirname(os.path.abspath(out_fname))
+
+    with tempfile.TemporaryDirectory(dir=out_dir) as tmp_dir:
+        tmp_fname = os.path.join(tmp_dir, 'shuffled')
+
+        with ReviewWriter(tmp_fname) as writer:
+            write_shuffled(in_fname, no_of_reviews, writer, tmp_dir, rng,
+                           max_in_memory, max_open_files)
+
+        os.replace(tmp_fname, out_fname)
+
+
+def write_shuffled(fname, no_of_reviews, writer, tmp_dir, rng, max_in_memory,
+                   max_open_files):
+    """
+    Write the reviews in a file in a uniformly random order.
+
+    Up to max_in_memory reviews are shuffled in memory. More are scattered
+    into temporary bucket files, each review into one chosen uniformly at
+    random and independently of the others, with about max_in_memory / 2
+    reviews in each bucket but no more than max_open_files buckets; each
+    bucket is then shuffled the same way (scattered again if it is still
+    too large) and written in turn. Since the reviews in a bucket are in a
+    uniformly random order whichever reviews the bucket holds, every order
+    of all the reviews is equally likely.
+
+    Each pass over the reviews writes them all to disk once, and there are
+    about log(2 * no_of_reviews / max_in_memory) / log(max_open_files)
+    passes (a single one unless there are more than max_open_files *
+    max_in_memory / 2 reviews).
+
+    Args:
+        fname: name of the file to read from.
+        no_of_reviews: number of reviews in the file.
+        writer: the ReviewWriter to write to.
+        tmp_dir: directory for the bucket files.
+        rng: random.Random to shuffle with.
+        max_in_memory: maximum number of reviews to shuffle in memory.
+        max_open_files: maximum number of buckets (at least 2).
+    """
+    if no_of_reviews <= max_in_memory:
+        reviews = list(iter_reviews(fname))
+        rng.shuffle(reviews)
+
+        for class_, review_text in reviews:
+            writer.write(class_, review_text)
+        return
+
+    no_of_buckets = min(max_open_files,
+                        math.ceil(2 * no_of_reviews / max_in_memory))
+    bucket_dir = tempfile.mkdtemp(dir=tmp_dir)
+    bucket_fnames = [os.path.join(bucket_dir, str(i))
+                     for i in range(no_of_buckets)]
+    counts = [0] * no_of_buckets
+    buckets = [ReviewWriter(bucket_fname) for bucket_fname in bucket_fnames]
+
+    try:
+        for class_, review_text in iter_reviews(fname):
+            i = rng.randrange(no_of_buckets)
+            buckets[i].write(class_, review_text)
+            counts[i] = counts[i] + 1
+    finally:
+        for bucket in buckets:
+            bucket.close()
+
+    for bucket_fname, count in zip(bucket_fnames, counts):
+        write_shuffled(bucket_fname, count, writer, tmp_dir, rng,
+                       max_in_memory, max_open_files)
+        os.remove(bucket_fname)
@@ -0,0 +1,225 @@
+from multiprocessing import Pool
+import os
+import time
+import numpy as np
+from . import instrument
+from .classify import get_class_pair
+from .stopwords import as_normalizer
+from .train import read_trained_model
+
+
+def find_shards(fname, shard_size=1 << 20):
+    """
+    Split a file into shards of about shard_size bytes each, every shard
+    starting at the beginning of a line.
+
+    Args:
+        fname: name of the file.
+        shard_size: approximate size of a shard in bytes.
+
+    Returns:
+        A list of (start, end) byte offsets.
+    """
+    size = os.path.getsize(fname)
+    boundaries = [0]
+
+    with open(fname, 'rb') as f:
+        while boundaries[-1] < size:
+            f.seek(boundaries[-1] + shard_size)
+            # Move on to the beginning of the next line
+            f.readline()
+            boundaries.append(min(f.tell(), size))
+
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def read_shard(fname, start, end, labelled=False):
+    """
+    Read the non-empty lines of a shard of a file.
+
+    Args:
+        fname: name of the file.
+        start, end: byte offsets of the shard (see find_shards()).
+        labelled: whether the lines are CLASS<TAB>REVIEW (so that only the
+                  review is returned) instead of just the review. A line
+                  with a class only is an empty review, so that there is
+                  still one review for each non-empty line.
+
+    Returns:
+        A list of reviews.
+    """
+    with open(fname, 'rb') as f:
+        f.seek(start)
+        lines = f.read(end - start).decode().split('\n')
+
+    reviews = []
+
+    for line in lines:
+        line = line.strip()
+        if line:
+            if labelled:
+                parts = line.split(maxsplit=1)
+                reviews.append(parts[1] if len(parts) > 1 else '')
+            else:
+                reviews.append(line)
+
+    return reviews
+
+
+def score_reviews(reviews, normalizer, model):
+    """
+    Score a batch of reviews.
+
+    With two classes, the score is the log odds of the positive class
+    against the negative class (see classify.get_class_pair()) and the label
+    is chosen as classify.classify_review() does. With more classes (e.g.
+    star ratings), the label is the class with the highest score, as
+    classify.classify_reviews() chooses it, and the score is the log
+    probability of that class given the review.
+
+    Args:
+        reviews: list of strings.
+        normalizer: a Normalizer.
+        model: a Model.
+
+    Returns:
+        A list of (label, score).
+    """
+    with instrument.phase('score', docs=len(reviews)):
+        documents = normalizer.tokenize(reviews)
+        scores = model.log_scores_batch(*model.encode_batch(documents))
+
+    if len(model.classes) == 2:
+        positive, negative = get_class_pair(model)
+        log_odds = (scores[:, model.class_index[positive]] -
+                    scores[:, model.class_index[negative]])
+
+        labels = np.where(log_odds < 0, negative, positive)
+        labels[log_odds == 0] = model.classes[0]
+
+        return list(zip(labels.tolist(), log_odds.tolist()))
+
+    best = scores.argmax(axis=1)
+    log_posteriors = (scores[np.arange(len(best)), best] -
+                      np.logaddexp.reduce(scores, axis=1))
+
+    return [(model.classes[i], score)
+            for i, score in zip(best.tolist(), log_posteriors.tolist())]
+
+
+def score_shard(shard, state):
+    """
+    Score the reviews of a shard of the input file.
+
+    Args:
+        shard: (start, end) byte offsets of the shard.
+        state: dictionary with the model, normalizer and input file name.
+
+    Returns:
+        A 2-tuple:
+        1. output of the shard (LABEL<TAB>SCORE<TAB>REVIEW lines).
+        2. number of reviews in the shard.
+    """
+    reviews = read_shard(state['fname'], *shard, labelled=state['labelled'])
+    results = score_reviews(reviews, state['normalizer'], state['model'])
+
+    output = ''.join('{}\t{:.6f}\t{}\n'.format(label, score, review_text)
+                     for (label, score), review_text in zip(results, reviews))
+
+    return output, len(reviews)
+
+
+def load_state(model_fname, stopwords, fname, labelled):
+    """
+    Load the model and build the state needed to score shards.
+
+    Args:
+        model_fname: name of the model file.
+        stopwords: list of words (or a Normalizer) to remove from all
+                   reviews.
+        fname: name of the input file.
+        labelled: whether the lines of the input file are CLASS<TAB>REVIEW.
+
+    Returns:
+        A dictionary with the model, normalizer and input file name.
+    """
+    return {'model': read_trained_model(model_fname),
+            'normalizer': as_normalizer(stopwords),
+            'fname': fname,
+            'labelled': labelled}
+
+
+_worker_state = None
+
+
+def init_worker(*args):
+    """
+    Load the state (see load_state()) in a worker process once, instead of
+    with every shard. A binary model file is memory mapped, so that all the
+    workers share a single copy of it.
+    """
+    global _worker_state
+    _worker_state = load_state(*args)
+
+
+def score_shard_in_worker(shard):
+    """
+    Call score_shard() with the state of this worker process.
+    """
+    return score_shard(shard, _worker_state)
+
+
+def score_file(model_fname, fname, out, stopwords, workers=1,
+               shard_size=1 << 20, labelled=False, progress=None):
+    """
+    Score every review of a file (one review on a line) and write
+    LABEL<TAB>SCORE<TAB>REVIEW lines (see score_reviews()) in the order of
+    the input.
+
+    The file is split into byte range shards (see find_shards()) which are
+    scored in a pool of worker processes, each loading the model once, and
+    written out as soon as all the shards before them are written.
+
+    Args:
+        model_fname: name of the model file (see train.read_trained_model()).
+        fname: name of the input file.
+        out: file object to write to.
+        stopwords: list of words (or a Normalizer) to remove from all
+                   reviews.
+        workers: number of worker processes to use.
+        shard_size: approximate size of a shard in bytes.
+        labelled: whether the lines are CLASS<TAB>REVIEW instead of just the
+                  review.
+        progress: function called after each shard with (bytes done, total
+                  bytes, reviews done, elapsed seconds), or None.
+
+    Returns:
+        The number of reviews scored.
+    """
+    shards = find_shards(fname, shard_size)
+    total_bytes = shards[-1][1] if shards else 0
+    init_args = (model_fname, stopwords, fname, labelled)
+    start = time.monotonic()
+    no_of_reviews = 0
+
+    if workers > 1:
+        pool = Pool(workers, initializer=init_worker, initargs=init_args)
+        results = pool.imap(score_shard_in_worker, shards)
+    else:
+        pool = None
+        state = load_state(*init_args)
+        results = (score_shard(shard, state) for shard in shards)
+
+    try:
+        for (_, end), (output, count) in zip(shards, results):
+            out.write(output)
+            no_of_reviews = no_of_reviews + count
+
+            if progress is not None:
+                progress(end, total_bytes, no_of_reviews,
+                         time.monotonic() - start)
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    return no_of_reviews
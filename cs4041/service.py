@@ -0,0 +1,326 @@
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import numpy as np
+import queue
+import socket
+from socketserver import ThreadingMixIn
+import threading
+import time
+from .classify import classify_reviews
+from .model import as_model
+from .stopwords import as_normalizer
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    """
+    An HTTPServer handling each connection in its own thread (as
+    http.server.ThreadingHTTPServer, which is only in Python 3.7+).
+    """
+
+    daemon_threads = True
+
+
+class LatencyStats:
+    """
+    Thread safe counters of the requests served, with the latency of the
+    last window requests.
+
+    The latency of a request is measured on the server, from submitting its
+    reviews to having their results, and so leaves out reading the request
+    and sending the response (see benchmarks/load_test.py for the latency
+    seen by clients).
+
+    Attributes:
+        start: time.monotonic() when the counters were created.
+        requests: number of requests served.
+        reviews: number of reviews classified.
+        batches: number of micro-batches classified.
+        latencies: deque of the latencies (in seconds) of the last window
+                   requests.
+    """
+
+    def __init__(self, window=10000):
+        self.start = time.monotonic()
+        self.requests = 0
+        self.reviews = 0
+        self.batches = 0
+        self.latencies = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def add_request(self, latency):
+        """
+        Count a request served in latency seconds.
+        """
+        with self.lock:
+            self.requests = self.requests + 1
+            self.latencies.append(latency)
+
+    def add_batch(self, no_of_reviews):
+        """
+        Count a micro-batch of no_of_reviews reviews.
+        """
+        with self.lock:
+            self.batches = self.batches + 1
+            self.reviews = self.reviews + no_of_reviews
+
+    def snapshot(self):
+        """
+        Return the counters as a dictionary (latencies in milliseconds).
+        """
+        with self.lock:
+            uptime = time.monotonic() - self.start
+            latencies = np.array(self.latencies) * 1000
+            stats = {
+                'uptime': uptime,
+                'requests': self.requests,
+                'reviews': self.reviews,
+                'batches': self.batches,
+                'reviews_per_sec': self.reviews / uptime,
+                'mean_batch_size': self.reviews / max(self.batches, 1),
+            }
+
+        if len(latencies) > 0:
+            stats['p50_ms'], stats['p99_ms'] = np.percentile(latencies,
+                                                             [50, 99])
+        else:
+            stats['p50_ms'] = stats['p99_ms'] = None
+
+        return stats
+
+
+class MicroBatcher:
+    """
+    Coalesce the reviews of concurrent requests into micro-batches, so that
+    they are classified together (see classify.classify_reviews()).
+
+    A batch is classified once it has max_batch reviews or max_delay seconds
+    after its first request arrived, whichever comes first, in a single
+    background thread.
+
+    Attributes:
+        classify_batch: function mapping a list of reviews to a list of
+                        results, one for each review.
+        max_batch: maximum number of reviews in a batch (a request with more
+                   reviews makes up a batch of its own).
+        max_delay: maximum time (in seconds) a request waits for others.
+        stats: LatencyStats (or None).
+    """
+
+    def __init__(self, classify_batch, max_batch=256, max_delay=0.005,
+                 stats=None):
+        self.classify_batch = classify_batch
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.stats = stats
+        self.queue = queue.Queue()
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, reviews):
+        """
+        Submit a list of reviews to be classified.
+
+        Returns:
+            A concurrent.futures.Future of the list of results.
+        """
+        future = Future()
+        self.queue.put((reviews, future))
+
+        return future
+
+    def run(self):
+        """
+        Classify the submitted reviews in batches (forever).
+        """
+        pending = None
+
+        while True:
+            batch = [pending if pending is not None else self.queue.get()]
+            pending = None
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_delay
+
+            while size < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+
+                # Leave a request which does not fit for the next batch
+                if size + len(item[0]) > self.max_batch:
+                    pending = item
+                    break
+
+                batch.append(item)
+                size = size + len(item[0])
+
+            self.classify(batch)
+
+    def classify(self, batch):
+        """
+        Classify a batch of (reviews, future) and set the futures' results.
+        """
+        reviews = [review for item_reviews, _ in batch
+                   for review in item_reviews]
+
+        try:
+            results = self.classify_batch(reviews)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        if self.stats is not None:
+            self.stats.add_batch(len(reviews))
+
+        start = 0
+        for item_reviews, future in batch:
+            future.set_result(results[start:start + len(item_reviews)])
+            start = start + len(item_reviews)
+
+
+class ClassificationService:
+    """
+    Classify reviews with a trained model and stop words loaded once,
+    micro-batching concurrent requests.
+
+    Attributes:
+        model: the Model.
+        normalizer: the Normalizer.
+        stats: LatencyStats of the requests served.
+        batcher: the MicroBatcher.
+    """
+
+    def __init__(self, trained_model, stopwords, max_batch=256,
+                 max_delay=0.005):
+        self.model = as_model(trained_model)
+        self.normalizer = as_normalizer(stopwords)
+        self.stats = LatencyStats()
+        self.batcher = MicroBatcher(self.classify_batch, max_batch, max_delay,
+                                    self.stats)
+
+    def classify_batch(self, reviews):
+        """
+        Classify a list of reviews.
+
+        Returns:
+            A list of dictionaries with the predicted 'label' and the log
+            'scores' of each class (see classify.classify_reviews()).
+        """
+        labels, scores = classify_reviews(reviews, self.normalizer,
+                                          self.model)
+
+        return [{'label': label,
+                 'scores': dict(zip(self.model.classes, row))}
+                for label, row in zip(labels.tolist(), scores.tolist())]
+
+    def classify(self, reviews):
+        """
+        Classify a list of reviews, along with those of any concurrent
+        requests.
+        """
+        start = time.monotonic()
+        results = self.batcher.submit(reviews).result()
+        self.stats.add_request(time.monotonic() - start)
+
+        return results
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """
+    HTTP interface of a ClassificationService (self.server.service):
+
+        POST /classify  {"review": "..."}      => {"label": ..., "scores": ...}
+        POST /classify  {"reviews": ["...", ...]}
+                                               => {"results": [...]}
+        GET  /stats                            => LatencyStats.snapshot()
+    """
+
+    # Keep connections alive between requests
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # The headers and the body of a response are sent separately, so
+        # that Nagle's algorithm would hold back the body until the client
+        # acknowledges the headers, which it delays (by ~40 ms) waiting for
+        # more data on a keep-alive connection
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def send_json(self, status, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self.send_json(200, self.server.service.stats.snapshot())
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path != '/classify':
+            self.send_json(404, {'error': 'not found'})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length).decode())
+
+            if 'reviews' in request:
+                reviews, single = request['reviews'], False
+            else:
+                reviews, single = [request['review']], True
+
+            if not isinstance(reviews, list):
+                raise ValueError('reviews must be a list')
+            if not all(isinstance(review, str) for review in reviews):
+                raise ValueError('reviews must be strings')
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {'error': str(e)})
+            return
+
+        try:
+            results = self.server.service.classify(reviews)
+        except Exception as e:
+            # Answer instead of dropping the connection
+            self.send_json(500, {'error': str(e)})
+            return
+
+        if single:
+            self.send_json(200, results[0])
+        else:
+            self.send_json(200, {'results': results})
+
+    def log_message(self, format, *args):
+        # Do not log every request
+        pass
+
+
+def make_server(service, host='127.0.0.1', port=8041):
+    """
+    Create an HTTP server for the given ClassificationService (serving each
+    connection in its own thread); call serve_forever() to run it.
+
+    Args:
+        service: a ClassificationService.
+        host: address to listen on.
+        port: port to listen on (0 for any free port).
+
+    Returns:
+        A ThreadingHTTPServer.
+    """
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    server.service = service
+
+    return server
@@ -0,0 +1,348 @@
+from collections import Counter, defaultdict
+import hashlib
+import numpy as np
+from .vocabulary import (count_bigram_ids,
+                         decode_bigrams,
+                         encode_strings,
+                         get_bigram_contexts,
+                         get_vocabulary_from_frequencies,
+                         get_word_frequencies)
+
+# Default memory budget for the count-min sketch (in bytes)
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+
+
+def hash_tokens(tokens):
+    """
+    Return a 64 bit hash of each token, which (unlike hash()) is the same in
+    every process.
+
+    Args:
+        tokens: list of strings.
+
+    Returns:
+        An array of unsigned 64 bit integers.
+    """
+    return np.array([int.from_bytes(hashlib.blake2b(token.encode(),
+                                                    digest_size=8).digest(),
+                                    'little')
+                     for token in tokens], dtype=np.uint64)
+
+
+class CountMinSketch:
+    """
+    A count-min sketch: approximate counts of any number of tokens in a fixed
+    amount of memory.
+
+    The estimated count of a token is never less than its actual count, and
+    is more than that only when it collides with other tokens in every row.
+    Counts are added with conservative update (a cell is only increased as
+    far as needed for the new estimate), which reduces overestimation.
+
+    Attributes:
+        table: array of shape (depth, width) with the counts.
+        multipliers: array of one odd 64 bit multiplier per row, used to map
+                     token hashes to columns (multiply-shift hashing).
+    """
+
+    def __init__(self, width, depth=4, seed=0):
+        # Round width up to a power of two for multiply-shift hashing
+        self.bits = max(1, int(width - 1).bit_length())
+        self.table = np.zeros((depth, 1 << self.bits), dtype=np.int64)
+
+        # 64 random bits per row, made odd
+        rng = np.random.RandomState(seed)
+        self.multipliers = (np.frombuffer(rng.bytes(8 * depth),
+                                          dtype='<u8').astype(np.uint64) |
+                            np.uint64(1))
+
+    @classmethod
+    def for_memory(cls, memory_budget, depth=4, seed=0):
+        """
+        Create the widest sketch that fits in memory_budget bytes.
+
+        Args:
+            memory_budget: maximum size of the table in bytes.
+            depth: number of rows.
+            seed: seed for the hash functions.
+
+        Returns:
+            A CountMinSketch.
+        """
+        width = memory_budget // (depth * np.dtype(np.int64).itemsize)
+
+        # Round down to a power of two so as to stay within the budget
+        return cls(1 << max(0, int(width).bit_length() - 1), depth, seed)
+
+    def columns(self, hashes):
+        """
+        Return the column of each hash in each row.
+
+        Args:
+            hashes: array of token hashes (see hash_tokens()).
+
+        Returns:
+            An array of shape (depth, len(hashes)).
+        """
+        shift = np.uint64(64 - self.bits)
+        return ((hashes[np.newaxis, :] * self.multipliers[:, np.newaxis]) >>
+                shift).astype(np.intp)
+
+    def add(self, counter):
+        """
+        Add the counts of the given tokens.
+
+        Args:
+            counter: a Counter with
+                     - key: token
+                     - value: count of the token
+
+        Returns:
+            An array with the estimated count of each token (in the order of
+            counter.keys()) after adding.
+        """
+        if not counter:
+            return np.zeros(0, dtype=np.int64)
+
+        columns = self.columns(hash_tokens(list(counter.keys())))
+        rows = np.arange(len(self.table))[:, np.newaxis]
+
+        estimates = (self.table[rows, columns].min(axis=0) +
+                     np.fromiter(counter.values(), dtype=np.int64,
+                                 count=len(counter)))
+
+        for row, row_columns in zip(self.table, columns):
+            np.maximum.at(row, row_columns, estimates)
+
+        return estimates
+
+    def estimate(self, tokens):
+        """
+        Return the estimated count of each of the given tokens.
+
+        Args:
+            tokens: list of strings.
+
+        Returns:
+            An array of estimated counts.
+        """
+        columns = self.columns(hash_tokens(tokens))
+        rows = np.arange(len(self.table))[:, np.newaxis]
+
+        return self.table[rows, columns].min(axis=0)
+
+
+def find_candidates(get_chunks, count_strings, min_occur, memory_budget,
+                    depth=4):
+    """
+    Find all tokens that may occur at least min_occur times in all chunks,
+    in one pass using a count-min sketch.
+
+    Since the sketch never underestimates, every token that occurs at least
+    min_occur times is a candidate; most tokens that occur fewer times (e.g.
+    only once) are not.
+
+    Args:
+        get_chunks: function returning an iterable of chunks of reviews
+                    (dictionaries with
+                     - key: class
+                     - value: list of reviews belonging to this class).
+        count_strings: function mapping a list of strings to a Counter of
+                       tokens.
+        min_occur: minimum number of occurrences of a token.
+        memory_budget: maximum size of the sketch in bytes.
+        depth: number of rows of the sketch.
+
+    Returns:
+        A set of tokens.
+    """
+    sketch = CountMinSketch.for_memory(memory_budget, depth)
+    candidates = set()
+
+    for chunk in get_chunks():
+        for review_list in chunk.values():
+            counter = count_strings(review_list)
+            estimates = sketch.add(counter)
+
+            candidates.update(token for token, estimate
+                              in zip(counter.keys(), estimates.tolist())
+                              if estimate >= min_occur)
+
+    return candidates
+
+
+def restrict_frequencies(frequency, vocabulary):
+    """
+    Return the counts of the tokens in the vocabulary only.
+
+    Args:
+        frequency: dictionary with
+                   - key: class
+                   - value: Counter for all tokens in that class
+        vocabulary: set of tokens to keep.
+
+    Returns:
+        A dictionary of the same type as frequency.
+    """
+    return {class_: Counter({token: count for token, count in counter.items()
+                             if token in vocabulary})
+            for class_, counter in frequency.items()}
+
+
+def count_vocabulary(get_chunks, min_occur=2,
+                     memory_budget=DEFAULT_MEMORY_BUDGET, depth=4):
+    """
+    Count the words of the (cleaned) reviews of each class for a model with
+    word features, holding only a fixed size count-min sketch and the
+    candidate words (instead of a Counter of every word ever seen):
+
+        1. find the candidate words with a count-min sketch.
+        2. count the candidate words exactly.
+
+    Args:
+        get_chunks: function returning a (new) iterable of chunks of reviews
+                    every time it is called (e.g.
+                    lambda: iter_review_chunks(fname)).
+        min_occur: minimum number of occurrences of a word for it to be
+                   included in the vocabulary.
+        memory_budget: maximum size of the count-min sketch in bytes.
+        depth: number of rows of the count-min sketch.
+
+    Returns:
+        A 3-tuple:
+        1. dictionary with
+           - key: class
+           - value: number of documents of this class
+        2. dictionary with
+           - key: class
+           - value: Counter of the words in the vocabulary (i.e. that occur
+                    at least min_occur times) in that class
+        3. dictionary with
+           - key: class
+           - value: total count of all words in that class
+    """
+    candidates = find_candidates(get_chunks, get_word_frequencies, min_occur,
+                                 memory_budget, depth)
+
+    class_doc_count = defaultdict(int)
+    frequency = defaultdict(Counter)
+    class_counts = defaultdict(int)
+
+    for chunk in get_chunks():
+        for class_, review_list in chunk.items():
+            counter = get_word_frequencies(review_list)
+
+            class_doc_count[class_] += len(review_list)
+            class_counts[class_] += sum(counter.values())
+            frequency[class_].update({word: count
+                                      for word, count in counter.items()
+                                      if word in candidates})
+
+    vocabulary = get_vocabulary_from_frequencies(
+        list(frequency.values()), min_occur)
+
+    return (dict(class_doc_count), restrict_frequencies(frequency, vocabulary),
+            dict(class_counts))
+
+
+def count_words_and_bigrams(strings):
+    """
+    Return the count of all words and all bigrams in the list of strings.
+
+    Args:
+        strings: list of strings.
+
+    Returns:
+        A Counter with
+            - key: word/bigram
+            - value: frequency of the word/bigram in the given list of strings
+    """
+    ids, offsets, tokens = encode_strings(strings)
+    _, keys, counts = count_bigram_ids(ids, offsets, len(tokens))
+
+    counter = Counter(dict(zip(decode_bigrams(keys, tokens),
+                               counts.tolist())))
+    counter.update(dict(zip(tokens,
+                            np.bincount(ids, minlength=len(tokens)).tolist())))
+
+    return counter
+
+
+def count_combined_vocabulary(get_chunks, min_occur=3, min_bigram_occur=3,
+                              memory_budget=DEFAULT_MEMORY_BUDGET, depth=4):
+    """
+    Count the words/bigrams of the (cleaned) reviews of each class for a
+    model with word/bigram features (see get_combined_frequencies()),
+    holding only a fixed size count-min sketch and the candidate
+    words/bigrams:
+
+        1. find the candidate words/bigrams with a count-min sketch (a word
+           is counted at most as many times as it occurs).
+        2. count the candidate bigrams of each class exactly, so as to find
+           the bigrams whose constituent words are not counted.
+        3. count the candidate words/bigrams of each class exactly.
+
+    Args:
+        get_chunks: function returning a (new) iterable of chunks of reviews
+                    every time it is called (e.g.
+                    lambda: iter_review_chunks(fname)).
+        min_occur: minimum number of occurrences of a word/bigram for it to be
+                   included in the vocabulary.
+        min_bigram_occur: minimum number of occurrences of a bigram (in a
+                          class) so as to skip its constituent words' count.
+        memory_budget: maximum size of the count-min sketch in bytes.
+        depth: number of rows of the count-min sketch.
+
+    Returns:
+        A 3-tuple as returned by count_vocabulary(), for words/bigrams.
+    """
+    candidates = find_candidates(get_chunks, count_words_and_bigrams,
+                                 min(min_occur, min_bigram_occur),
+                                 memory_budget, depth)
+
+    # key: class
+    # value: Counter of the candidate bigrams in that class
+    bigram_frequency = defaultdict(Counter)
+
+    for chunk in get_chunks():
+        for class_, review_list in chunk.items():
+            bigram_counter, _ = get_bigram_contexts(review_list)
+            bigram_frequency[class_].update(
+                {bigram: count for bigram, count in bigram_counter.items()
+                 if bigram in candidates})
+
+    # key: class
+    # value: set of bigrams whose constituent words are not counted
+    frequent_bigrams = {
+        class_: {bigram for bigram, count in counter.items()
+                 if count >= min_bigram_occur}
+        for class_, counter in bigram_frequency.items()
+    }
+    del bigram_frequency
+
+    class_doc_count = defaultdict(int)
+    frequency = defaultdict(Counter)
+    class_counts = defaultdict(int)
+
+    for chunk in get_chunks():
+        for class_, review_list in chunk.items():
+            bigram_counter, context_counter = get_bigram_contexts(review_list)
+            counter = Counter(bigram_counter)
+
+            for (word, prev_bigram, next_bigram), count in \
+                    context_counter.items():
+                if (prev_bigram not in frequent_bigrams[class_] and
+                        next_bigram not in frequent_bigrams[class_]):
+                    counter[word] += count
+
+            class_doc_count[class_] += len(review_list)
+            class_counts[class_] += sum(counter.values())
+            frequency[class_].update({token: count
+                                      for token, count in counter.items()
+                                      if token in candidates})
+
+    vocabulary = get_vocabulary_from_frequencies(
+        list(frequency.values()), min_occur)
+
+    return (dict(class_doc_count), restrict_frequencies(frequency, vocabulary),
+            dict(class_counts))
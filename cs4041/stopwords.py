@@ -1,6 +1,19 @@
+from multiprocessing import Pool
 import re
+import string as string_module
+from . import instrument
 from .vocabulary import read_vocabulary
 
+# Non-alphabetic characters except whitespace
+NON_ALPHA_RE = re.compile(r'[^a-zA-Z\s]+')
+
+# Translation table/deleted characters doing the same as NON_ALPHA_RE
+# followed by lower() for ASCII strings, in a single pass
+ASCII_LOWER_TABLE = bytes.maketrans(string_module.ascii_uppercase.encode(),
+                                    string_module.ascii_lowercase.encode())
+ASCII_NON_ALPHA = bytes(c for c in range(128)
+                        if not (chr(c).isalpha() or chr(c).isspace()))
+
 
 def read_stopwords(fname):
     """
@@ -16,6 +29,166 @@ def read_stopwords(fname):
     return read_vocabulary(fname)
 
 
+class Normalizer:
+    """
+    Process strings as follows:
+        1. Remove all non alphabetic characters (except whitespace).
+        2. Convert to lower case.
+        3. Split into words, removing stop words.
+
+    Build it once and reuse it for all strings, e.g.
+
+        normalizer = Normalizer(read_stopwords(STOPWORDS_FNAME))
+
+    Attributes:
+        stopwords: set of words to remove from all strings.
+    """
+
+    def __init__(self, stopwords):
+        self.stopwords = frozenset(stopwords)
+
+    def tokens(self, string):
+        """
+        Return the list of words in a string after processing.
+
+        Args:
+            string: string to be processed.
+
+        Returns:
+            A (possibly empty) list of words.
+        """
+        try:
+            string = string.encode('ascii').translate(
+                ASCII_LOWER_TABLE, ASCII_NON_ALPHA).decode('ascii')
+        except UnicodeEncodeError:
+            string = NON_ALPHA_RE.sub('', string).lower()
+
+        stopwords = self.stopwords
+
+        return [word for word in string.split() if word not in stopwords]
+
+    def tokenize(self, strings):
+        """
+        Return the list of words of each string after processing.
+
+        Args:
+            strings: list of strings to be processed.
+
+        Returns:
+            A list of (possibly empty) lists of words, one for each string.
+        """
+        return [self.tokens(string) for string in strings]
+
+    def clean(self, string):
+        """
+        Return a string after processing (with a single space between
+        words).
+
+        Args:
+            string: string to be processed.
+
+        Returns:
+            A (possibly empty) string.
+        """
+        return ' '.join(self.tokens(string))
+
+    def rm_stopwords(self, strings, workers=1, chunksize=10000):
+        """
+        Return a list of non-empty strings after processing.
+
+        With workers > 1, the strings are processed in chunks of chunksize
+        strings in a pool of worker processes.
+
+        Args:
+            strings: list of strings to be processed.
+            workers: number of worker processes to use.
+            chunksize: number of strings sent to a worker at a time.
+
+        Returns:
+            A list of strings.
+        """
+        if workers > 1:
+            chunks = [strings[i:i+chunksize]
+                      for i in range(0, len(strings), chunksize)]
+
+            with Pool(workers) as pool:
+                return [newstring
+                        for newlist in pool.imap(self.rm_stopwords, chunks)
+                        for newstring in newlist]
+
+        newlist = []
+
+        with instrument.phase('normalize', docs=len(strings)) as curr_phase:
+            for string in strings:
+                newstring = self.clean(string)
+
+                if len(newstring) > 0:
+                    newlist.append(newstring)
+
+            if instrument.enabled():
+                curr_phase.set(tokens=sum(newstring.count(' ') + 1
+                                          for newstring in newlist))
+
+        return newlist
+
+    def clean_reviews(self, reviews):
+        """
+        Process the reviews of each class as rm_stopwords() does.
+
+        Args:
+            reviews: dictionary with
+                     - key: class
+                     - value: list of reviews belonging to this class.
+
+        Returns:
+            A dictionary with
+                - key: class
+                - value: list of non-empty processed reviews of this class.
+        """
+        return {class_: self.rm_stopwords(review_list)
+                for class_, review_list in reviews.items()}
+
+    def clean_review_chunks(self, chunks, workers=1):
+        """
+        Process an iterable of chunks of reviews (see clean_reviews()),
+        optionally in a pool of worker processes, keeping the chunks in
+        order.
+
+        Args:
+            chunks: iterable of dictionaries with
+                    - key: class
+                    - value: list of reviews belonging to this class.
+            workers: number of worker processes to use.
+
+        Yields:
+            Dictionaries with
+                - key: class
+                - value: list of non-empty processed reviews of this class.
+        """
+        if workers > 1:
+            with Pool(workers) as pool:
+                yield from pool.imap(self.clean_reviews, chunks)
+        else:
+            for chunk in chunks:
+                yield self.clean_reviews(chunk)
+
+
+def as_normalizer(stopwords):
+    """
+    Return a Normalizer removing the given stop words.
+
+    Args:
+        stopwords: a Normalizer or a list of stop words.
+
+    Returns:
+        A Normalizer.
+    """
+    if isinstance(stopwords, Normalizer):
+        return stopwords
+
+    return Normalizer(stopwords)
+
+
 def rm_stopwords(strings, stopwords):
     """
     Return a list of strings after processing as follows:
@@ -26,24 +199,26 @@ def rm_stopwords(strings, stopwords):
 
     Args:
         strings: list of strings to be processed.
-        stopwords: list of words to remove from given strings.
+        stopwords: list of words (or a Normalizer) to remove from given
+                   strings.
 
     Returns:
         A list of strings.
     """
-    newlist = []
-
-    for string in strings:
-        # Remove non-alphabetic characters except whitespace
-        newstring = re.sub(r'[^a-zA-Z\s]+', '', string)
+    return as_normalizer(stopwords).rm_stopwords(strings)
 
-        newstring = newstring.lower()
 
-        # Remove stop words
-        newstring = ' '.join([word for word in newstring.split()
-                              if word not in stopwords])
+def clean_string(string, stopwords):
+    """
+    Process a string as rm_stopwords() does, returning the (possibly empty)
+    processed string.
 
-        if len(newstring) > 0:
-            newlist.append(newstring)
+    Args:
+        string: string to be processed.
+        stopwords: list of words (or a Normalizer) to remove from given
+                   string.
 
-    return newlist
+    Returns:
+        A string.
+    """
+    return as_normalizer(stopwords).clean(string)
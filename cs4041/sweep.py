@@ -0,0 +1,346 @@
+from collections import Counter, defaultdict
+from multiprocessing import Pool
+import numpy as np
+from . import instrument
+from .corpus import Corpus
+from .evaluate import (count_corpus_part,
+                       count_part,
+                       count_word_ids,
+                       count_words,
+                       split_reviews)
+from .model import Model
+from .stopwords import as_normalizer
+from .train import get_class_probabilities_from_counts
+from .vocabulary import (add_counts,
+                         encode_strings,
+                         get_bigram_contexts,
+                         get_bigram_contexts_from_ids,
+                         subtract_counts)
+
+DEFAULT_MIN_OCCURS = [1, 2, 3, 4, 5]
+DEFAULT_MIN_BIGRAM_OCCURS = [2, 3, 4, 5]
+DEFAULT_ALPHAS = [0.1, 0.25, 0.5, 1, 2]
+
+
+def get_count_tables(counts, bigram_features, min_bigram_occurs):
+    """
+    Return the counts of every token in each class as dense tables, one for
+    each min_bigram_occur (see vocabulary.combine_frequencies()).
+
+    With bigram features, the contexts of the words are gathered once into
+    arrays, with the larger count of their two bigrams, so that the word
+    counts for every min_bigram_occur are each one weighted bincount.
+
+    Args:
+        counts: dictionary with
+                - key: class
+                - value: counts of the documents of this class (a 1-tuple
+                         as returned by evaluate.count_words(), or with
+                         bigram features a 2-tuple as returned by
+                         vocabulary.get_bigram_contexts()).
+        bigram_features: whether the counts are of words/bigrams.
+        min_bigram_occurs: list of minimum numbers of occurrences of a
+                           bigram so as to skip its constituent words'
+                           count (only used with bigram features).
+
+    Returns:
+        A generator of 3-tuples:
+        1. min_bigram_occur (None without bigram features).
+        2. sorted list of all tokens.
+        3. array of shape (number of classes, number of tokens) with the
+           count of each token in each class.
+    """
+    if not bigram_features:
+        tokens = sorted({token for (counter,) in counts.values()
+                         for token in counter})
+        table = np.array([[counter[token] for token in tokens]
+                          for (counter,) in counts.values()],
+                         dtype=np.float64)
+        yield None, tokens, table.reshape(len(counts), len(tokens))
+        return
+
+    tokens = set()
+    for bigram_counter, context_counter in counts.values():
+        tokens.update(bigram_counter)
+        tokens.update(word for word, _, _ in context_counter)
+
+    tokens = sorted(tokens)
+    token_index = {token: i for i, token in enumerate(tokens)}
+    bigram_table = np.zeros((len(counts), len(tokens)))
+    contexts = []
+
+    for i, (bigram_counter, context_counter) in enumerate(counts.values()):
+        for bigram, count in bigram_counter.items():
+            bigram_table[i, token_index[bigram]] = count
+
+        # A word is counted if both its bigrams occur < min_bigram_occur
+        # times, i.e. if the larger count of the two does
+        columns = []
+        bigram_counts = []
+        word_counts = []
+
+        for (word, prev_bigram, next_bigram), count in context_counter.items():
+            columns.append(token_index[word])
+            bigram_counts.append(max(
+                0 if prev_bigram is None else bigram_counter[prev_bigram],
+                0 if next_bigram is None else bigram_counter[next_bigram]))
+            word_counts.append(count)
+
+        contexts.append((np.array(columns, dtype=np.intp),
+                         np.array(bigram_counts, dtype=np.int64),
+                         np.array(word_counts, dtype=np.float64)))
+
+    for min_bigram_occur in min_bigram_occurs:
+        table = bigram_table.copy()
+
+        for i, (columns, bigram_counts, word_counts) in enumerate(contexts):
+            rare = bigram_counts < min_bigram_occur
+            table[i] += np.bincount(columns[rare], weights=word_counts[rare],
+                                    minlength=len(tokens))
+
+        yield min_bigram_occur, tokens, table
+
+
+def smooth(counts, class_totals, alpha):
+    """
+    Return the log likelihoods of the tokens of a count table with add-alpha
+    smoothing, as train.get_likelihood_table() calculates them.
+
+    Args:
+        counts: array of shape (number of classes, number of tokens) with
+                the count of each token of the vocabulary in each class.
+        class_totals: array of shape (number of classes, 1) with the total
+                      count of all tokens (in the vocabulary or not) in each
+                      class.
+        alpha: count added to every token (and '<UNKNOWN>') in each class.
+
+    Returns:
+        An array of shape (number of classes, number of tokens + 1), the
+        last column being the likelihood of the '<UNKNOWN>' token.
+    """
+    num = np.empty((counts.shape[0], counts.shape[1] + 1))
+    num[:, :-1] = counts + alpha
+    num[:, -1] = alpha
+
+    den = class_totals + alpha * (counts.shape[1] + 1)
+
+    return np.log(num) - np.log(den)
+
+
+def get_part_documents(part, normalizer, corpus):
+    """
+    Return the documents of a part, integer encoded once for the whole
+    grid, and the index of the class of each.
+
+    Returns:
+        A 3-tuple:
+        1. list of classes.
+        2. array with the index (in the list of classes) of the class of
+           each document.
+        3. 3-tuple (ids, offsets, tokens) of the integer encoded (cleaned)
+           documents (see vocabulary.encode_strings()).
+    """
+    classes = list(part.keys())
+    labels = np.repeat(np.arange(len(classes)),
+                       [len(review_list) for review_list in part.values()])
+
+    if corpus is not None:
+        docs = [doc for review_list in part.values() for doc in review_list]
+        return classes, labels, (*corpus.documents(docs), corpus.tokens)
+
+    documents = normalizer.tokenize([review for review_list in part.values()
+                                     for review in review_list])
+
+    return classes, labels, encode_strings(' '.join(words)
+                                           for words in documents)
+
+
+def evaluate_grid_part(i, state):
+    """
+    Calculate the accuracy of the models trained with the counts of all
+    parts except i at every point of the grid in classifying the reviews of
+    part i.
+
+    The count table is built once for each min_bigram_occur (see
+    get_count_tables()), the reviews of part i encoded once for each
+    vocabulary (min_occur), and only the likelihoods calculated again for
+    each alpha.
+
+    Args:
+        i: index of the part to evaluate.
+        state: dictionary with the (read-only) sweep state built by
+               sweep().
+
+    Returns:
+        A dictionary with
+            - key: (min_occur, min_bigram_occur, alpha)
+            - value: accuracy of the model trained with these parameters.
+    """
+    part = state['parts'][i]
+    corpus = state['corpus']
+    classes, labels, documents = get_part_documents(
+        part, as_normalizer(state['stopwords']), corpus)
+
+    class_doc_count = {class_: (state['total_doc_count'][class_] -
+                                state['doc_counts'][i][class_])
+                       for class_ in classes}
+    class_probability = get_class_probabilities_from_counts(class_doc_count)
+    log_priors = [class_probability[class_] for class_ in classes]
+
+    counts = {class_: subtract_counts(state['total_counts'][class_],
+                                      state['counts'][i][class_])
+              for class_ in classes}
+    accuracies = {}
+
+    for min_bigram_occur, tokens, count_table in get_count_tables(
+            counts, state['bigram_features'], state['min_bigram_occurs']):
+        class_totals = count_table.sum(axis=1, keepdims=True)
+        token_totals = count_table.sum(axis=0)
+
+        for min_occur in state['min_occurs']:
+            columns = np.flatnonzero((token_totals >= min_occur) &
+                                     (token_totals > 0))
+            vocabulary = [tokens[col] for col in columns.tolist()]
+            token_index = {token: col for col, token in enumerate(vocabulary)}
+            vocabulary_counts = count_table[:, columns]
+
+            # Only the vocabulary matters to the encoding
+            model = Model(vocabulary, classes,
+                          np.zeros((len(classes), len(vocabulary) + 1)),
+                          log_priors, token_index)
+            with instrument.phase('score', docs=len(labels)):
+                indptr, indices = model.encode_ids(*documents)
+
+                for alpha in state['alphas']:
+                    model = Model(vocabulary, classes,
+                                  smooth(vocabulary_counts, class_totals,
+                                         alpha),
+                                  log_priors, token_index)
+                    scores = model.log_scores_batch(indptr, indices)
+                    accuracies[(min_occur, min_bigram_occur, alpha)] = float(
+                        np.mean(scores.argmax(axis=1) == labels))
+
+    return accuracies
+
+
+# Sweep state of a worker process (see init_worker())
+_worker_state = None
+
+
+def init_worker(state):
+    """
+    Store the sweep state in a worker process, so that it is sent to each
+    worker only once instead of with every part.
+    """
+    global _worker_state
+    _worker_state = state
+
+
+def evaluate_grid_part_in_worker(i):
+    """
+    Call evaluate_grid_part() with the state of this worker process.
+    """
+    return evaluate_grid_part(i, _worker_state)
+
+
+def sweep(reviews, stopwords, min_occurs=DEFAULT_MIN_OCCURS,
+          alphas=DEFAULT_ALPHAS, min_bigram_occurs=DEFAULT_MIN_BIGRAM_OCCURS,
+          bigram_features=False, no_of_parts=10, workers=1, seed=None):
+    """
+    Do a no_of_parts-fold cross evaluation (see evaluate.evaluate()) for
+    every combination of min_occur, min_bigram_occur (with bigram features)
+    and smoothing alpha, counting each part only once.
+
+    The counts are additive (see evaluate.cross_validate()), and every
+    point of the grid is derived from the same counts by thresholding and
+    smoothing them again, so the whole grid takes little more time than a
+    single cross evaluation.
+
+    Args:
+        reviews: dictionary with
+                 - key: class
+                 - value: list of reviews belonging to this class.
+                 (or a Corpus of cleaned reviews).
+        stopwords: list of words to remove from all documents.
+        min_occurs: list of minimum numbers of occurrences of a token for it
+                    to be included in the vocabulary.
+        alphas: list of smoothing counts (see
+                train.get_likelihood_table()).
+        min_bigram_occurs: list of minimum numbers of occurrences of a
+                           bigram so as to skip its constituent words' count
+                           (see vocabulary.combine_frequencies()), only used
+                           with bigram features.
+        bigram_features: whether to use word/bigram features.
+        no_of_parts: number of parts to divide into.
+        workers: number of worker processes to use.
+        seed: seed for splitting the reviews into parts.
+
+    Returns:
+        A dictionary with
+            - key: (min_occur, min_bigram_occur, alpha), min_bigram_occur
+                   being None without bigram features
+            - value: list of accuracies of all models trained with these
+                     parameters (in the order of parts).
+    """
+    if isinstance(reviews, Corpus):
+        corpus = reviews
+        parts = split_reviews(reviews.class_docs(), no_of_parts, seed)
+        count = count_corpus_part
+        count_ids = (get_bigram_contexts_from_ids if bigram_features
+                     else count_word_ids)
+        count_args = [(part, corpus, count_ids) for part in parts]
+    else:
+        corpus = None
+        parts = split_reviews(reviews, no_of_parts, seed)
+        count = count_part
+        count_strings = get_bigram_contexts if bigram_features else count_words
+        count_args = [(part, stopwords, count_strings) for part in parts]
+
+    with instrument.phase('count', folds=len(parts)) as curr_phase:
+        if workers > 1:
+            with Pool(min(workers, len(parts))) as pool:
+                part_counts = pool.starmap(count, count_args)
+        else:
+            part_counts = [count(*args) for args in count_args]
+
+        curr_phase.set(docs=sum(sum(doc_count.values())
+                                for doc_count, _ in part_counts))
+
+    total_doc_count = defaultdict(int)
+    total_counts = {}
+
+    for curr_doc_count, curr_counts in part_counts:
+        for class_, doc_count in curr_doc_count.items():
+            total_doc_count[class_] = total_doc_count[class_] + doc_count
+
+            if class_ not in total_counts:
+                total_counts[class_] = tuple(Counter()
+                                             for _ in curr_counts[class_])
+            add_counts(total_counts[class_], curr_counts[class_])
+
+    state = {
+        'parts': parts,
+        'stopwords': stopwords,
+        'corpus': corpus,
+        'bigram_features': bigram_features,
+        'min_occurs': list(min_occurs),
+        'min_bigram_occurs': (list(min_bigram_occurs) if bigram_features
+                              else [None]),
+        'alphas': list(alphas),
+        'doc_counts': [doc_count for doc_count, _ in part_counts],
+        'counts': [curr_counts for _, curr_counts in part_counts],
+        'total_doc_count': total_doc_count,
+        'total_counts': total_counts,
+    }
+
+    if workers > 1:
+        with Pool(min(workers, len(parts)), initializer=init_worker,
+                  initargs=(state,)) as pool:
+            part_accuracies = pool.map(evaluate_grid_part_in_worker,
+                                       range(len(parts)))
+    else:
+        part_accuracies = [evaluate_grid_part(i, state)
+                           for i in range(len(parts))]
+
+    return {key: [accuracies[key] for accuracies in part_accuracies]
+            for key in part_accuracies[0]}
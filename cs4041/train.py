@@ -1,9 +1,18 @@
-from collections import Counter, defaultdict
 import math
 import pickle
-from .stopwords import rm_stopwords
+import numpy as np
+from . import instrument
+from .hashing import train_hashed, train_hashed_corpus
+from .model import Model, as_model
+from .modelfile import is_model_file, read_model
+from .sketch import (DEFAULT_MEMORY_BUDGET,
+                     count_combined_vocabulary,
+                     count_vocabulary)
+from .stopwords import as_normalizer, rm_stopwords
 from .vocabulary import (get_combined_frequencies,
+                         get_combined_frequencies_from_ids,
                          get_word_frequencies,
+                         get_word_frequencies_from_ids,
                          get_vocabulary_from_frequencies)
 
 
@@ -30,21 +39,172 @@ def get_class_probabilities(documents):
     # value: number of documents of this class
     class_doc_count = {}
 
-    class_probability = {}
-    total_doc_count = 0
-
     for class_, doclist in documents.items():
-        curr_class_doc_count = len(doclist)
-        class_doc_count[class_] = curr_class_doc_count
-        total_doc_count = total_doc_count + curr_class_doc_count
+        class_doc_count[class_] = len(doclist)
+
+    return get_class_probabilities_from_counts(class_doc_count)
 
-    for class_ in documents.keys():
-        class_probability[class_] = (math.log(class_doc_count[class_]) -
+
+def get_class_probabilities_from_counts(class_doc_count):
+    """
+    Calculate log probabilities of all classes from the number of
+    documents belonging to each class.
+
+    Args:
+        class_doc_count: dictionary with
+                         - key: class
+                         - value: number of documents of this class.
+
+    Returns:
+        A dictionary with
+            - key: class
+            - value: log probability of this class
+    """
+    class_probability = {}
+    total_doc_count = sum(class_doc_count.values())
+
+    for class_, curr_class_doc_count in class_doc_count.items():
+        class_probability[class_] = (math.log(curr_class_doc_count) -
                                      math.log(total_doc_count))
 
     return class_probability
 
 
+def get_likelihood_table(frequency, min_occur=2, class_counts=None,
+                         vocabulary=None, alpha=1):
+    """
+    Calculate the likelihood of a token given a class for all tokens that
+    occur at least min_occur times and all classes (with add-alpha
+    smoothing, add-one by default), from the token frequencies of each
+    class.
+
+                             count(t_k, c_j) + alpha
+    P(t_k | c_j) = ---------------------------------------------
+                     ___
+                     \\                              |   |
+                     /    (count(t, c_j)) + alpha * (| V | + 1)
+                     ---                            |   |
+                      t
+
+    Note: +1 in the denominator for the '<UNKNOWN>' token.
+
+    Args:
+        frequency: dictionary with
+                   - key: class
+                   - value: Counter for all tokens in that class
+        min_occur: minimum number of occurrences of a token for it to be
+                   included in the vocabulary.
+        class_counts: dictionary with
+                      - key: class
+                      - value: total count of all tokens in that class
+                      (only needed if the Counters in frequency do not
+                      include the tokens outside the vocabulary).
+        vocabulary: sorted list of the tokens occurring at least min_occur
+                    times, if already known (e.g. kept up to date as new
+                    documents are counted), to save finding it again.
+        alpha: count added to every token (and '<UNKNOWN>') in each class.
+
+    Returns:
+        A 2-tuple:
+        1. sorted list of the tokens in the vocabulary.
+        2. array of shape (number of classes, number of tokens + 1) with
+           log(likelihood of token given class), the last column being the
+           likelihood of the '<UNKNOWN>' token.
+    """
+    # Create vocabulary from the token frequencies of all classes
+    if vocabulary is None:
+        vocabulary = sorted(get_vocabulary_from_frequencies(
+            list(frequency.values()), min_occur))
+
+    vocabulary_size = len(vocabulary)
+
+    with instrument.phase('likelihoods', vocab_size=vocabulary_size,
+                          classes=len(frequency)):
+        # count(token, class), with a 0 count for the '<UNKNOWN>' token
+        counts = np.zeros((len(frequency), vocabulary_size + 1))
+
+        # summation count(token, class)
+        class_totals = np.zeros((len(frequency), 1))
+
+        for i, (class_, counter) in enumerate(frequency.items()):
+            counts[i, :vocabulary_size] = [counter[token]
+                                           for token in vocabulary]
+            if class_counts is None:
+                class_totals[i] = sum(counter.values())
+            else:
+                class_totals[i] = class_counts[class_]
+
+        # count(token, class) + alpha
+        num = counts + alpha
+
+        # (summation count(token, class)) + alpha * (|V| + 1)
+        den = class_totals + alpha * (vocabulary_size + 1)
+
+        log_likelihoods = np.log(num) - np.log(den)
+
+    return vocabulary, log_likelihoods
+
+
+def get_likelihoods_from_frequencies(frequency, min_occur=2):
+    """
+    Calculate the likelihood of a token given a class for all tokens that
+    occur at least min_occur times and all classes (with add-one smoothing),
+    from the token frequencies of each class (see get_likelihood_table()).
+
+    Args:
+        frequency: dictionary with
+                   - key: class
+                   - value: Counter for all tokens in that class
+        min_occur: minimum number of occurrences of a token for it to be
+                   included in the vocabulary.
+
+    Returns:
+        A dictionary with
+            - key: (token, class)
+            - value: log likelihood of token given class
+    """
+    vocabulary, log_likelihoods = get_likelihood_table(frequency, min_occur)
+    model = Model(vocabulary, frequency.keys(), log_likelihoods,
+                  np.zeros(len(frequency)))
+
+    return model.to_tuple()[1]
+
+
+def get_model_from_frequencies(class_doc_count, frequency, min_occur=2,
+                               class_counts=None, vocabulary=None, alpha=1):
+    """
+    Create a trained model from the number of documents and the token
+    frequencies of each class.
+
+    Args:
+        class_doc_count: dictionary with
+                         - key: class
+                         - value: number of documents of this class.
+        frequency: dictionary with
+                   - key: class
+                   - value: Counter for all tokens in that class
+        min_occur: minimum number of occurrences of a token for it to be
+                   included in the vocabulary.
+        class_counts: dictionary with
+                      - key: class
+                      - value: total count of all tokens in that class
+                      (see get_likelihood_table()).
+        vocabulary: sorted list of the tokens in the vocabulary, if already
+                    known (see get_likelihood_table()).
+        alpha: smoothing count (see get_likelihood_table()).
+
+    Returns:
+        A Model.
+    """
+    class_probability = get_class_probabilities_from_counts(class_doc_count)
+    vocabulary, log_likelihoods = get_likelihood_table(frequency, min_occur,
+                                                       class_counts,
+                                                       vocabulary, alpha)
+
+    return Model(vocabulary, frequency.keys(), log_likelihoods,
+                 [class_probability[class_] for class_ in frequency.keys()])
+
+
 def get_word_likelihoods(documents, min_occur=2):
     """
     Calculate the likelihood of a word given a class for all words that
@@ -53,7 +213,7 @@ def get_word_likelihoods(documents, min_occur=2):
                            count(w_k, c_j) + 1
     P(w_k | c_j) = ------------------------------------
                      ___
-                     \                      |   |
+                     \\                      |   |
                      /    (count(w, c_j)) + | V | + 1
                      ---                    |   |
                       w
@@ -74,42 +234,12 @@ def get_word_likelihoods(documents, min_occur=2):
     """
     # key: class
     # value: Counter for all words in that class
-    word_frequency = defaultdict(Counter)
-
-    # key: (word, class)
-    # value: log likelihood of word given class
-    word_likelihood = {}
+    word_frequency = {}
 
     for class_, doclist in documents.items():
         word_frequency[class_] = get_word_frequencies(doclist)
 
-    # Create vocabulary from the word frequencies of all classes
-    vocabulary = get_vocabulary_from_frequencies(
-        [word_frequency[class_] for class_ in documents.keys()],
-        min_occur
-    )
-
-    vocabulary_size = len(vocabulary)
-
-    for class_ in documents.keys():
-        # Sum of word frequencies in a class (summation count(w, c))
-        class_count = sum(word_frequency[class_].values())
-
-        word_likelihood[('<UNKNOWN>', class_)] = (math.log(1) -
-                                                  math.log(class_count +
-                                                           vocabulary_size +
-                                                           1))
-
-        for word in vocabulary:
-            # count(word, class) + 1
-            num = word_frequency[class_][word] + 1
-
-            # (summation count(word, class)) + |V| + 1
-            den = class_count + vocabulary_size + 1
-
-            word_likelihood[(word, class_)] = math.log(num) - math.log(den)
-
-    return word_likelihood
+    return get_likelihoods_from_frequencies(word_frequency, min_occur)
 
 
 def get_likelihoods_with_bigram_features(documents, min_occur=3):
@@ -121,7 +251,7 @@ def get_likelihoods_with_bigram_features(documents, min_occur=3):
                            count(t_k, c_j) + 1
     P(t_k | c_j) = ------------------------------------
                      ___
-                     \                      |   |
+                     \\                      |   |
                      /    (count(t, c_j)) + | V | + 1
                      ---                    |   |
                       t
@@ -142,44 +272,15 @@ def get_likelihoods_with_bigram_features(documents, min_occur=3):
     """
     # key: class
     # value: Counter for all words/bigrams in that class
-    frequency = defaultdict(Counter)
-
-    # key: (word, class)
-    # value: log likelihood of word/bigram given class
-    likelihood = {}
+    frequency = {}
 
     for class_, doclist in documents.items():
         frequency[class_] = get_combined_frequencies(doclist)
 
-    # Create vocabulary from the word frequencies of all classes
-    vocabulary = get_vocabulary_from_frequencies(
-        [frequency[class_] for class_ in documents.keys()],
-        min_occur
-    )
-
-    vocabulary_size = len(vocabulary)
-
-    for class_ in documents.keys():
-        # Sum of word frequencies in a class (summation count(w, c))
-        class_count = sum(frequency[class_].values())
+    return get_likelihoods_from_frequencies(frequency, min_occur)
 
-        likelihood[('<UNKNOWN>', class_)] = (math.log(1) -
-                                             math.log(class_count +
-                                                      vocabulary_size + 1))
 
-        for token in vocabulary:
-            # count(word, class) + 1
-            num = frequency[class_][token] + 1
-
-            # (summation count(word, class)) + |V| + 1
-            den = class_count + vocabulary_size + 1
-
-            likelihood[(token, class_)] = math.log(num) - math.log(den)
-
-    return likelihood
-
-
-def train(documents, stopwords, min_occur=2):
+def train(documents, stopwords, min_occur=2, buckets=None):
     """
     Train a multinomial naive Bayes classifier based on given
     list of classified documents.
@@ -191,26 +292,33 @@ def train(documents, stopwords, min_occur=2):
         stopwords: list of words to remove from all documents.
         min_occur: minimum number of occurrences of a word for it to be
                    included in the vocabulary.
+        buckets: hash the words into this many buckets instead of keeping a
+                 vocabulary (see hashing.HashedModel), in which case
+                 min_occur is not used.
 
 
     Returns:
-        A 2-tuple:
-        1. class probabilities: a dictionary with
-                                - key: class
-                                - value: log probability of that class
-        2. word likelihoods: a dictionary with
-                             - key: tuple (word, class)
-                             - value: log(likelihood of word given class)
+        A Model with word features.
     """
-    newdocs = defaultdict(list)
+    if buckets is not None:
+        return train_hashed(documents, stopwords, buckets)
+
+    class_doc_count = {}
+    word_frequency = {}
+
     for class_, doclist in documents.items():
-        newdocs[class_] = rm_stopwords(doclist, stopwords)
+        cleaned_docs = rm_stopwords(doclist, stopwords)
+        class_doc_count[class_] = len(cleaned_docs)
+
+        with instrument.phase('count', docs=len(cleaned_docs)):
+            word_frequency[class_] = get_word_frequencies(cleaned_docs)
 
-    return (get_class_probabilities(newdocs),
-            get_word_likelihoods(newdocs, min_occur))
+    return get_model_from_frequencies(class_doc_count, word_frequency,
+                                      min_occur)
 
 
-def train_with_bigram_features(documents, stopwords, min_occur=3):
+def train_with_bigram_features(documents, stopwords, min_occur=3,
+                               buckets=None):
     """
     Train a multinomial naive Bayes classifier based on given
     list of classified documents, with bigram features considered.
@@ -222,39 +330,161 @@ def train_with_bigram_features(documents, stopwords, min_occur=3):
         stopwords: list of words to remove from all documents.
         min_occur: minimum number of occurrences of a word/bigram for it to be
                    included in the vocabulary.
+        buckets: hash the words and bigrams into this many buckets instead
+                 of keeping a vocabulary (see hashing.HashedModel), in which
+                 case min_occur is not used.
 
 
     Returns:
-        A 2-tuple:
-        1. class probabilities: a dictionary with
-                                - key: class
-                                - value: log probability of that class
-        2. likelihoods: a dictionary with
-                        - key: tuple (word/bigram, class)
-                        - value: log(likelihood of word/bigram given class)
+        A Model with word/bigram features.
     """
-    newdocs = defaultdict(list)
+    if buckets is not None:
+        return train_hashed(documents, stopwords, buckets,
+                            bigram_features=True)
+
+    class_doc_count = {}
+    frequency = {}
+
     for class_, doclist in documents.items():
-        newdocs[class_] = rm_stopwords(doclist, stopwords)
+        cleaned_docs = rm_stopwords(doclist, stopwords)
+        class_doc_count[class_] = len(cleaned_docs)
+
+        with instrument.phase('count', docs=len(cleaned_docs)):
+            frequency[class_] = get_combined_frequencies(cleaned_docs)
+
+    return get_model_from_frequencies(class_doc_count, frequency, min_occur)
 
-    return (get_class_probabilities(newdocs),
-            get_likelihoods_with_bigram_features(newdocs, min_occur))
+
+def train_with_memory_budget(get_chunks, stopwords, min_occur=2,
+                             bigram_features=False,
+                             memory_budget=DEFAULT_MEMORY_BUDGET):
+    """
+    Train a multinomial naive Bayes classifier (with word or word/bigram
+    features) on documents too many to count every word/bigram of in
+    memory.
+
+    The vocabulary is found with a count-min sketch of fixed size (see
+    cs4041.sketch) and only the words/bigrams in it are counted exactly,
+    which results in the same model as train()/train_with_bigram_features().
+
+    Args:
+        get_chunks: function returning a (new) iterable of chunks of
+                    documents every time it is called (e.g.
+                    lambda: iter_review_chunks(fname)), each a dictionary
+                    with
+                    - key: class
+                    - value: list of documents belonging to this class.
+        stopwords: list of words (or a Normalizer) to remove from all
+                   documents.
+        min_occur: minimum number of occurrences of a word/bigram for it to be
+                   included in the vocabulary.
+        bigram_features: whether to use word/bigram features.
+        memory_budget: maximum size of the count-min sketch in bytes.
+
+    Returns:
+        A Model.
+    """
+    normalizer = as_normalizer(stopwords)
+
+    def get_cleaned_chunks():
+        return (normalizer.clean_reviews(chunk) for chunk in get_chunks())
+
+    if bigram_features:
+        counts = count_combined_vocabulary(get_cleaned_chunks, min_occur,
+                                           memory_budget=memory_budget)
+    else:
+        counts = count_vocabulary(get_cleaned_chunks, min_occur,
+                                  memory_budget=memory_budget)
+
+    class_doc_count, frequency, class_counts = counts
+
+    return get_model_from_frequencies(class_doc_count, frequency, min_occur,
+                                      class_counts)
+
+
+def get_corpus_frequencies(corpus, bigram_features=False):
+    """
+    Count the (cleaned) documents of a Corpus of each class, working on
+    their token ids.
+
+    Args:
+        corpus: a Corpus.
+        bigram_features: whether to count words/bigrams (see
+                         get_combined_frequencies()) instead of words.
+
+    Returns:
+        A 2-tuple:
+        1. dictionary with
+           - key: class
+           - value: number of documents of this class
+        2. dictionary with
+           - key: class
+           - value: Counter for all words (or words/bigrams) in that class
+    """
+    class_doc_count = {}
+    frequency = {}
+
+    for class_, docs in corpus.class_docs().items():
+        ids, offsets = corpus.documents(docs)
+        class_doc_count[class_] = len(docs)
+
+        with instrument.phase('count', docs=len(docs), tokens=len(ids)):
+            if bigram_features:
+                frequency[class_] = get_combined_frequencies_from_ids(
+                    ids, offsets, corpus.tokens)
+            else:
+                frequency[class_] = get_word_frequencies_from_ids(
+                    ids, corpus.tokens)
+
+    return class_doc_count, frequency
+
+
+def train_corpus(corpus, min_occur=2, bigram_features=False, buckets=None):
+    """
+    Train a multinomial naive Bayes classifier (with word or word/bigram
+    features) on a Corpus of cleaned documents, which results in the same
+    model as train()/train_with_bigram_features() on the same documents.
+
+    Args:
+        corpus: a Corpus.
+        min_occur: minimum number of occurrences of a word/bigram for it to be
+                   included in the vocabulary.
+        bigram_features: whether to use word/bigram features.
+        buckets: hash the features into this many buckets instead of keeping
+                 a vocabulary (see hashing.HashedModel), in which case
+                 min_occur is not used.
+
+    Returns:
+        A Model.
+    """
+    if buckets is not None:
+        return train_hashed_corpus(corpus, buckets, bigram_features)
+
+    class_doc_count, frequency = get_corpus_frequencies(corpus,
+                                                        bigram_features)
+
+    return get_model_from_frequencies(class_doc_count, frequency, min_occur)
 
 
 def read_trained_model(fname):
     """
-    Read the trained model from a python pickle file.
+    Read the trained model from a binary model file (see
+    modelfile.write_model()) or a python pickle file.
 
     Args:
         fname: file name.
 
     Returns:
-        The trained model saved.
+        The trained model saved (as a Model, even if it was saved in the
+        older 2-tuple format).
     """
+    if is_model_file(fname):
+        return read_model(fname)
+
     with open(fname, 'rb') as f:
         model = pickle.load(f)
 
-    return model
+    return as_model(model)
 
 
 def write_trained_model(model, fname):
@@ -1,4 +1,6 @@
 from collections import Counter
+import numpy as np
+from . import instrument
 
 
 def get_bigram_frequencies(strings):
@@ -28,16 +30,266 @@ def get_word_frequencies(strings):
     Return the count of all words that occur in the list of strings.
 
     Args:
-        strings: list of strings.
+        strings: list (or any iterable) of strings.
 
     Returns:
         A Counter with
             - key: word
             - value: frequency of the word in the given list of strings
     """
-    joined_string = ' '.join(string for string in strings)
+    counter = Counter()
+
+    for string in strings:
+        counter.update(string.split())
+
+    return counter
+
+
+def get_word_frequencies_from_ids(ids, tokens):
+    """
+    Return the count of all words of integer encoded strings (see
+    encode_strings()).
+
+    Args:
+        ids: array of the ids of all words of all strings.
+        tokens: list of words, such that tokens[id] is the word with that id.
+
+    Returns:
+        A Counter with
+            - key: word
+            - value: frequency of the word in the strings
+    """
+    word_counts = np.bincount(ids, minlength=len(tokens))
+
+    return Counter({tokens[word_id]: int(word_counts[word_id])
+                    for word_id in np.flatnonzero(word_counts).tolist()})
+
+
+def encode_strings(strings):
+    """
+    Split the strings into words and map each distinct word to an integer
+    id.
+
+    Args:
+        strings: list (or any iterable) of strings.
+
+    Returns:
+        A 3-tuple:
+        1. ids: array of the ids of all words of all strings.
+        2. offsets: array of length len(strings) + 1, such that the ids of
+                    the words of string i are ids[offsets[i]:offsets[i+1]].
+        3. tokens: list of words, such that tokens[id] is the word with
+                   that id.
+    """
+    token_index = {}
+    ids = []
+    offsets = [0]
+
+    for string in strings:
+        ids.extend([token_index.setdefault(word, len(token_index))
+                    for word in string.split()])
+        offsets.append(len(ids))
+
+    return (np.array(ids, dtype=np.int64), np.array(offsets, dtype=np.int64),
+            list(token_index))
+
+
+def count_bigram_ids(ids, offsets, no_of_tokens):
+    """
+    Count the bigrams of integer encoded strings (see encode_strings()).
+
+    A bigram (id1, id2) is represented by the key id1 * no_of_tokens + id2.
+
+    Args:
+        ids: array of the ids of all words of all strings.
+        offsets: array of offsets of each string in ids.
+        no_of_tokens: number of distinct ids.
+
+    Returns:
+        A 3-tuple:
+        1. pair_keys: array of length len(ids) - 1 with the key of the bigram
+                      (ids[i], ids[i+1]), or -1 if the two words belong to
+                      different strings.
+        2. keys: sorted array of the distinct bigram keys.
+        3. counts: array with the count of each bigram in keys.
+    """
+    if len(ids) < 2:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+
+    pair_keys = ids[:-1] * no_of_tokens + ids[1:]
+
+    # The last word of a string and the first word of the next string do not
+    # make up a bigram
+    starts = offsets[(offsets > 0) & (offsets < len(ids))]
+    pair_keys[starts - 1] = -1
+
+    keys, counts = np.unique(pair_keys[pair_keys >= 0], return_counts=True)
+
+    return pair_keys, keys, counts
+
+
+def decode_bigrams(keys, tokens):
+    """
+    Return the bigrams with the given keys (see count_bigram_ids()).
+
+    Args:
+        keys: array of bigram keys.
+        tokens: list of words, such that tokens[id] is the word with that id.
+
+    Returns:
+        A list of "word1 word2" strings.
+    """
+    no_of_tokens = max(len(tokens), 1)
+    first_ids, second_ids = keys // no_of_tokens, keys % no_of_tokens
+
+    return [tokens[id1] + ' ' + tokens[id2]
+            for id1, id2 in zip(first_ids.tolist(), second_ids.tolist())]
+
+
+def get_combined_id_frequencies(ids, offsets, no_of_tokens,
+                                min_bigram_occur=3):
+    """
+    Count the words/bigrams of integer encoded strings (see encode_strings())
+    as get_combined_frequencies() does, in two passes over the ids:
+
+        1. count all bigrams.
+        2. count each word that does not occur in a bigram with
+           count >= min_bigram_occur.
+
+    Args:
+        ids: array of the ids of all words of all strings.
+        offsets: array of offsets of each string in ids.
+        no_of_tokens: number of distinct ids.
+        min_bigram_occur: minimum number of occurrences of a bigram so as to
+                          skip its constituent words' count.
+
+    Returns:
+        A 3-tuple:
+        1. keys: sorted array of the distinct bigram keys (see
+                 count_bigram_ids()).
+        2. counts: array with the count of each bigram in keys.
+        3. word_counts: array of length no_of_tokens with the count of
+                        each word.
+    """
+    pair_keys, keys, counts = count_bigram_ids(ids, offsets, no_of_tokens)
+
+    # Is the bigram at each position missing or rare?
+    pair_counts = np.zeros(len(pair_keys), dtype=np.int64)
+    valid = pair_keys >= 0
+    pair_counts[valid] = counts[np.searchsorted(keys, pair_keys[valid])]
+    rare = ~valid | (pair_counts < min_bigram_occur)
+
+    # Count a word only if the bigrams before and after it are rare
+    counted = np.ones(len(ids), dtype=bool)
+    counted[1:] &= rare
+    counted[:-1] &= rare
+
+    word_counts = np.bincount(ids[counted], minlength=no_of_tokens)
+
+    return keys, counts, word_counts
+
+
+def get_bigram_contexts(strings):
+    """
+    Return the count of all bigrams and the count of all words along with
+    the bigrams they occur in, in the list of strings.
 
-    return Counter(joined_string.split())
+    Both counts are additive, i.e. the counts for a list of strings is the
+    sum of the counts for any partition of it, so that counts of several
+    parts can be added/subtracted before being combined with
+    combine_frequencies().
+
+    Args:
+        strings: list of strings.
+
+    Returns:
+        A 2-tuple:
+        1. A Counter with
+            - key: "word1 word2"
+            - value: frequency of the bigram in the given list of strings
+        2. A Counter with
+            - key: (word, previous bigram, next bigram), where a missing
+                   bigram (at either end of a string) is None
+            - value: frequency of the word occurring with these bigrams
+    """
+    return get_bigram_contexts_from_ids(*encode_strings(strings))
+
+
+def get_bigram_contexts_from_ids(ids, offsets, tokens):
+    """
+    Return the counts of get_bigram_contexts() for integer encoded strings
+    (see encode_strings()).
+
+    Args:
+        ids: array of the ids of all words of all strings.
+        offsets: array of offsets of each string in ids.
+        tokens: list of words, such that tokens[id] is the word with that id.
+
+    Returns:
+        A 2-tuple of Counters as returned by get_bigram_contexts().
+    """
+    pair_keys, keys, counts = count_bigram_ids(ids, offsets, len(tokens))
+
+    bigrams = decode_bigrams(keys, tokens)
+    bigram_counter = Counter(dict(zip(bigrams, counts.tolist())))
+
+    # Index (in keys) of the bigrams before and after each word, or -1
+    prev_idx = np.full(len(ids), -1, dtype=np.int64)
+    next_idx = np.full(len(ids), -1, dtype=np.int64)
+    valid = pair_keys >= 0
+    pair_idx = np.searchsorted(keys, pair_keys[valid])
+    prev_idx[1:][valid] = pair_idx
+    next_idx[:-1][valid] = pair_idx
+
+    # Sort the (word, previous bigram, next bigram) rows and count the runs
+    # of equal ones
+    contexts = np.stack([ids, prev_idx, next_idx], axis=1)
+    contexts = contexts[np.lexsort(contexts.T[::-1])]
+    first = np.ones(len(contexts), dtype=bool)
+    first[1:] = (contexts[1:] != contexts[:-1]).any(axis=1)
+    run_starts = np.flatnonzero(first)
+    context_counts = np.diff(np.append(run_starts, len(contexts)))
+    contexts = contexts[run_starts]
+
+    # bigrams[-1] is None
+    bigrams.append(None)
+    context_counter = Counter()
+
+    for (word_id, prev_id, next_id), count in zip(contexts.tolist(),
+                                                  context_counts.tolist()):
+        context_counter[(tokens[word_id], bigrams[prev_id],
+                         bigrams[next_id])] = count
+
+    return bigram_counter, context_counter
+
+
+def combine_frequencies(bigram_counter, context_counter, min_bigram_occur=3):
+    """
+    Return the count of all words/bigrams such a word is counted only if
+    the count of the bigrams in which that word occurs < min_bigram_occur.
+
+    Args:
+        bigram_counter: bigram counts as returned by get_bigram_contexts().
+        context_counter: word counts as returned by get_bigram_contexts().
+        min_bigram_occur: minimum number of occurrences of a bigram so as to
+                          skip its constituent words' count.
+
+    Returns:
+        A Counter with
+            - key: word/bigram
+            - value: frequency of the word/bigram
+    """
+    def is_rare(bigram):
+        return bigram is None or bigram_counter[bigram] < min_bigram_occur
+
+    counter = Counter(bigram_counter)
+
+    for (word, prev_bigram, next_bigram), count in context_counter.items():
+        if is_rare(prev_bigram) and is_rare(next_bigram):
+            counter[word] += count
+
+    return counter
 
 
 def get_combined_frequencies(strings, min_bigram_occur=3):
@@ -59,32 +311,69 @@ def get_combined_frequencies(strings, min_bigram_occur=3):
             - key: word/bigram
             - value: frequency of the word/bigram in the given list of strings
     """
-    def make_bigram(word1, word2):
-        return ' '.join([word1, word2])
+    ids, offsets, tokens = encode_strings(strings)
 
-    counter = Counter()
-    bigram_counter = get_bigram_frequencies(strings)
+    return get_combined_frequencies_from_ids(ids, offsets, tokens,
+                                             min_bigram_occur)
 
-    # Add the bigram counts
-    counter.update(bigram_counter)
 
-    for string in strings:
-        words = string.split()
-        no_of_words = len(words)
-        for i, word in enumerate(words):
-            curr_bigrams = []
-            if i >= 1:
-                curr_bigrams.append(make_bigram(words[i-1], words[i]))
-            if i < no_of_words - 1:
-                curr_bigrams.append(make_bigram(words[i], words[i+1]))
-
-            if all([bigram_counter[bigram] < min_bigram_occur
-                    for bigram in curr_bigrams]):
-                counter.update([word])
+def get_combined_frequencies_from_ids(ids, offsets, tokens,
+                                      min_bigram_occur=3):
+    """
+    Return the counts of get_combined_frequencies() for integer encoded
+    strings (see encode_strings()).
+
+    Args:
+        ids: array of the ids of all words of all strings.
+        offsets: array of offsets of each string in ids.
+        tokens: list of words, such that tokens[id] is the word with that id.
+        min_bigram_occur: minimum number of occurrences of a bigram so as to
+                          skip its constituent words' count.
+
+    Returns:
+        A Counter with
+            - key: word/bigram
+            - value: frequency of the word/bigram in the strings
+    """
+    keys, counts, word_counts = get_combined_id_frequencies(
+        ids, offsets, len(tokens), min_bigram_occur)
+
+    counter = Counter(dict(zip(decode_bigrams(keys, tokens),
+                               counts.tolist())))
+
+    for word_id in np.flatnonzero(word_counts).tolist():
+        counter[tokens[word_id]] = int(word_counts[word_id])
 
     return counter
 
 
+def add_counts(total, counts):
+    """
+    Add the given counts to total (in place).
+
+    Args:
+        total: a tuple of Counters.
+        counts: a tuple of Counters of the same length as total.
+    """
+    for total_counter, counter in zip(total, counts):
+        total_counter.update(counter)
+
+
+def subtract_counts(total, counts):
+    """
+    Subtract the given counts from total.
+
+    Args:
+        total: a tuple of Counters.
+        counts: a tuple of Counters of the same length as total.
+
+    Returns:
+        A new tuple of Counters (without any non-positive counts).
+    """
+    return tuple(total_counter - counter
+                 for total_counter, counter in zip(total, counts))
+
+
 def get_vocabulary_from_frequencies(counters, min_occur=1):
     """
     Return a set of words/bigrams which occur at least min_occur times,
@@ -104,12 +393,18 @@ def get_vocabulary_from_frequencies(counters, min_occur=1):
     master_counter = Counter()
     vocabulary = set()
 
-    for counter in counters:
-        master_counter = master_counter + counter
+    with instrument.phase('vocab') as curr_phase:
+        # Add up the counters in place (master_counter + counter would copy
+        # master_counter every time)
+        for counter in counters:
+            master_counter.update(counter)
+
+        for string, count in master_counter.items():
+            if count >= min_occur:
+                vocabulary.add(string)
 
-    for string, count in master_counter.items():
-        if count >= min_occur:
-            vocabulary.add(string)
+        curr_phase.set(tokens_seen=len(master_counter),
+                       vocab_size=len(vocabulary))
 
     return vocabulary
 
@@ -129,7 +424,7 @@ def get_vocabulary(strings, min_occur=1):
     """
     counter = get_word_frequencies(strings)
 
-    return get_vocabulary_from_word_frequencies([counter], min_occur)
+    return get_vocabulary_from_frequencies([counter], min_occur)
 
 
 def read_vocabulary(fname):
@@ -0,0 +1,130 @@
+"""
+Tests of cs4041.classify: classifying one review at a time against
+classifying a batch, with two classes and with more (star ratings).
+
+    python3 -m unittest discover tests
+"""
+import random
+import unittest
+import numpy as np
+from benchmarks.synthetic import make_reviews, make_words
+from cs4041.classify import (calculate_accuracy, calculate_cond_probability,
+                             classify_review, classify_reviews,
+                             confusion_matrix, get_class_pair)
+from cs4041.model import Model
+from cs4041.stopwords import Normalizer
+from cs4041.train import train, train_with_bigram_features
+
+STOPWORDS = ['the', 'a', 'and', 'is']
+RATINGS = ['1', '2', '3', '4', '5']
+
+
+def make_rated_reviews(no_of_reviews, seed=0):
+    """
+    Generate reviews of five star ratings, from words common to all ratings
+    and words specific to each rating.
+    """
+    rng = random.Random(seed)
+    vocabulary = [word for word in make_words(420, np.random.RandomState(seed))
+                  if word not in STOPWORDS][:400]
+    common = vocabulary[:300]
+    specific = {rating: vocabulary[300 + 20*i:320 + 20*i]
+                for i, rating in enumerate(RATINGS)}
+    reviews = {rating: [] for rating in RATINGS}
+
+    for _ in range(no_of_reviews):
+        rating = rng.choice(RATINGS)
+        words = [rng.choice(specific[rating]) if rng.random() < 0.1
+                 else rng.choice(common + STOPWORDS)
+                 for _ in range(rng.randint(5, 40))]
+        reviews[rating].append(' '.join(words))
+
+    return reviews
+
+
+class ClassifyTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.reviews = make_reviews(400, vocabulary_size=800,
+                                   stopwords=STOPWORDS, seed=15)
+        cls.rated_reviews = make_rated_reviews(1000)
+        cls.texts = cls.reviews['+'][:100] + cls.reviews['-'][:100]
+        cls.rated_texts = [text for review_list in cls.rated_reviews.values()
+                           for text in review_list[:40]]
+
+    def assertSameLabels(self, texts, model):
+        labels, scores = classify_reviews(texts, STOPWORDS, model)
+
+        self.assertEqual([classify_review(text, STOPWORDS, model)
+                          for text in texts], labels.tolist())
+        for text, row in zip(texts, scores):
+            np.testing.assert_allclose(row, model.log_scores(model.encode(
+                Normalizer(STOPWORDS).tokens(text))))
+
+    def test_two_classes(self):
+        for train_model in [train, train_with_bigram_features]:
+            self.assertSameLabels(self.texts,
+                                  train_model(self.reviews, STOPWORDS))
+
+    def test_ratings(self):
+        for train_model in [train, train_with_bigram_features]:
+            model = train_model(self.rated_reviews, STOPWORDS)
+
+            self.assertEqual(model.classes, RATINGS)
+            self.assertSameLabels(self.rated_texts, model)
+            self.assertGreater(calculate_accuracy(self.rated_reviews,
+                                                  STOPWORDS, model), 0.5)
+
+    def test_cond_probability(self):
+        model = train(self.rated_reviews, STOPWORDS)
+        words = [model.tokens[1], model.tokens[-1], 'unknownword']
+        scores = model.log_scores(model.encode(words))
+
+        for class_, score in zip(model.classes, scores):
+            self.assertAlmostEqual(
+                calculate_cond_probability(' '.join(words), class_, model),
+                score)
+            self.assertAlmostEqual(
+                calculate_cond_probability(' '.join(words), class_,
+                                           model.to_tuple()),
+                score)
+
+    def test_class_pair(self):
+        model = Model(['good'], ['neg', 'pos'], np.zeros((2, 2)),
+                      np.log([0.5, 0.5]))
+        self.assertEqual(get_class_pair(model), ('neg', 'pos'))
+
+        model = Model(['good'], ['-', '+'], np.zeros((2, 2)),
+                      np.log([0.5, 0.5]))
+        self.assertEqual(get_class_pair(model), ('+', '-'))
+
+    def test_ties_go_to_first_class(self):
+        for classes in [['-', '+'], ['+', '-'], ['b', 'a', 'c']]:
+            model = Model(['good'], classes,
+                          np.zeros((len(classes), 2)),
+                          np.full(len(classes), -np.log(len(classes))))
+            labels, _ = classify_reviews(['good film', ''], STOPWORDS, model)
+
+            self.assertEqual(labels.tolist(), [classes[0]] * 2)
+            self.assertEqual(classify_review('good film', STOPWORDS, model),
+                             classes[0])
+
+    def test_confusion_matrix(self):
+        model = train(self.rated_reviews, STOPWORDS)
+        reviews = dict(self.rated_reviews)
+        reviews['0'] = self.rated_reviews['1'][:10]
+        classes, matrix = confusion_matrix(reviews, STOPWORDS, model)
+
+        self.assertEqual(classes, RATINGS + ['0'])
+        self.assertEqual(matrix.shape, (6, 6))
+        # No review is classified as a class the model does not know
+        self.assertEqual(matrix[:, 5].sum(), 0)
+        for i, class_ in enumerate(classes):
+            self.assertEqual(matrix[i].sum(), len(reviews[class_]))
+            labels, _ = classify_reviews(reviews[class_], STOPWORDS, model)
+            self.assertEqual(matrix[i, i], np.count_nonzero(labels == class_))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+Tests of cs4041.compress on synthetic reviews.
+
+    python3 -m unittest discover tests
+"""
+import os
+import tempfile
+import unittest
+from collections import Counter
+import numpy as np
+from benchmarks.synthetic import make_reviews
+from cs4041.classify import calculate_accuracy
+from cs4041.compress import (compress_model, get_feature_counts,
+                             prune_model, select_features)
+from cs4041.modelfile import read_model, write_model
+from cs4041.train import get_model_from_frequencies, train
+
+STOPWORDS = ['the', 'a', 'and', 'is']
+
+
+def split(reviews, fraction=0.75):
+    """
+    Split the reviews of each class into a training and a test set.
+    """
+    training = {}
+    test = {}
+
+    for class_, review_list in reviews.items():
+        cut = int(len(review_list) * fraction)
+        training[class_] = review_list[:cut]
+        test[class_] = review_list[cut:]
+
+    return training, test
+
+
+class FeatureCountsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.frequency = {'+': Counter({'good': 5, 'film': 2, 'plot': 3}),
+                          '-': Counter({'bad': 4, 'film': 3, 'plot': 1})}
+        self.expected = np.array([[0, 2, 5, 3], [4, 3, 0, 1]])
+
+    def test_add_one(self):
+        model = get_model_from_frequencies({'+': 1, '-': 1}, self.frequency,
+                                           min_occur=1)
+        np.testing.assert_array_equal(get_feature_counts(model),
+                                      self.expected)
+
+    def test_add_alpha(self):
+        for alpha in [0.1, 0.5, 2]:
+            model = get_model_from_frequencies({'+': 1, '-': 1},
+                                               self.frequency, min_occur=1,
+                                               alpha=alpha)
+            np.testing.assert_array_equal(get_feature_counts(model, alpha),
+                                          self.expected)
+
+
+class PruneModelTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        reviews = make_reviews(3000, vocabulary_size=3000,
+                               stopwords=STOPWORDS, seed=0)
+        cls.training, cls.test = split(reviews)
+        cls.model = train(cls.training, STOPWORDS, min_occur=2)
+        cls.accuracy = calculate_accuracy(cls.test, STOPWORDS, cls.model)
+
+    def test_keeps_only_selected_tokens(self):
+        columns = select_features(self.model, k=100, score='chi2')
+        pruned = prune_model(self.model, columns)
+
+        self.assertEqual(len(pruned.tokens), 100)
+        self.assertEqual(pruned.log_likelihoods.shape,
+                         (len(self.model.classes), 101))
+        self.assertEqual(pruned.tokens,
+                         [self.model.tokens[col] for col in columns])
+        np.testing.assert_array_equal(pruned.log_likelihoods[:, :-1],
+                                      self.model.log_likelihoods[:, columns])
+
+    def test_unknown_is_neutral(self):
+        pruned = compress_model(self.model, k=100, score='chi2')
+        unknown = pruned.log_likelihoods[:, pruned.unknown_id]
+
+        self.assertTrue(np.all(unknown == unknown[0]))
+
+        # A review of dropped (or unknown) words only is decided by the priors
+        dropped = [token for token in self.model.tokens
+                   if pruned.token_index.get(token) is None][:20]
+        scores = pruned.log_scores(pruned.encode(dropped))
+        np.testing.assert_allclose(scores - scores[0],
+                                   pruned.log_priors - pruned.log_priors[0])
+
+    def test_smaller_with_same_accuracy(self):
+        compressed = compress_model(self.model, k=200, score='chi2')
+
+        with tempfile.TemporaryDirectory() as dirname:
+            original_fname = os.path.join(dirname, 'original.bin')
+            compressed_fname = os.path.join(dirname, 'compressed.bin')
+            write_model(self.model, original_fname, np.int8)
+            write_model(compressed, compressed_fname, np.int8)
+
+            self.assertLess(os.path.getsize(compressed_fname),
+                            os.path.getsize(original_fname) / 5)
+            accuracy = calculate_accuracy(self.test, STOPWORDS,
+                                          read_model(compressed_fname))
+
+        self.assertGreaterEqual(accuracy, self.accuracy - 0.02)
+
+
+if __name__ == '__main__':
+    unittest.main()
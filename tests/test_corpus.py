@@ -0,0 +1,106 @@
+"""
+Tests of cs4041.corpus: writing cleaned reviews to a corpus file and
+reading them back as token ids.
+
+    python3 -m unittest discover tests
+"""
+import os
+import pickle
+import tempfile
+import unittest
+from benchmarks.synthetic import make_reviews
+from cs4041.corpus import Corpus, is_corpus_file, write_corpus
+from cs4041.stopwords import Normalizer
+
+STOPWORDS = ['the', 'a', 'and', 'is']
+
+
+class CorpusTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        reviews = make_reviews(300, vocabulary_size=1000,
+                               stopwords=STOPWORDS, seed=7)
+        normalizer = Normalizer(STOPWORDS)
+
+        # Interleave the classes, with empty reviews which are skipped
+        cls.reviews = []
+        for positive, negative in zip(reviews['+'], reviews['-']):
+            cls.reviews.append(('+', normalizer.clean(positive)))
+            cls.reviews.append(('-', normalizer.clean(negative)))
+            cls.reviews.append(('-', ''))
+
+        cls.dirname = tempfile.mkdtemp()
+        cls.fname = os.path.join(cls.dirname, 'corpus.bin')
+        write_corpus(cls.reviews, cls.fname)
+        cls.reviews = [(class_, review_text)
+                       for class_, review_text in cls.reviews if review_text]
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(cls.fname)
+        os.rmdir(cls.dirname)
+
+    def decode(self, corpus, docs=None):
+        """
+        Return the words of the given documents of a corpus.
+        """
+        ids, offsets = corpus.documents(docs)
+        words = [corpus.tokens[i] for i in ids.tolist()]
+
+        return [' '.join(words[start:end])
+                for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def test_round_trip(self):
+        corpus = Corpus(self.fname)
+
+        self.assertEqual(len(corpus), len(self.reviews))
+        self.assertEqual(corpus.classes, ['+', '-'])
+        self.assertEqual(self.decode(corpus),
+                         [review_text for _, review_text in self.reviews])
+        self.assertEqual([corpus.classes[label]
+                          for label in corpus.labels.tolist()],
+                         [class_ for class_, _ in self.reviews])
+
+    def test_documents(self):
+        corpus = Corpus(self.fname)
+        docs = [5, 0, 17, 5, len(corpus) - 1]
+
+        self.assertEqual(self.decode(corpus, docs),
+                         [self.reviews[doc][1] for doc in docs])
+        self.assertEqual(self.decode(corpus, []), [])
+
+    def test_class_docs(self):
+        corpus = Corpus(self.fname)
+
+        for class_, docs in corpus.class_docs().items():
+            self.assertEqual(docs, [doc for doc, (curr_class, _)
+                                    in enumerate(self.reviews)
+                                    if curr_class == class_])
+
+        for class_, (_, offsets) in corpus.class_documents().items():
+            self.assertEqual(len(offsets) - 1,
+                             len(corpus.class_docs()[class_]))
+
+    def test_pickle(self):
+        corpus = pickle.loads(pickle.dumps(Corpus(self.fname)))
+
+        self.assertEqual(self.decode(corpus),
+                         [review_text for _, review_text in self.reviews])
+
+    def test_not_a_corpus(self):
+        fname = os.path.join(self.dirname, 'reviews.txt')
+        with open(fname, 'w') as f:
+            f.write('+\tgood film\n')
+
+        try:
+            self.assertTrue(is_corpus_file(self.fname))
+            self.assertFalse(is_corpus_file(fname))
+            with self.assertRaises(ValueError):
+                Corpus(fname)
+        finally:
+            os.remove(fname)
+
+
+if __name__ == '__main__':
+    unittest.main()
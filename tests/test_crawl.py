@@ -0,0 +1,314 @@
+"""
+Tests of cs4041.crawl against a local stand-in HTTP server serving canned
+review pages.
+
+    python3 -m unittest discover tests
+"""
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import tempfile
+import threading
+import time
+import unittest
+import urllib.parse
+from cs4041.crawl import CrawlState, Crawler, PageCache, TokenBucket
+from cs4041.extract import extract_reviews, extract_reviews_bs4
+from cs4041.review import get_amazon_reviews
+
+ASIN = 'B000TEST01'
+REVIEWS_PER_PAGE = 3
+NO_OF_PAGES = 2
+
+
+def make_review(asin, star_filter, page, i):
+    """
+    Return the text of review i of a canned review page.
+    """
+    return '{} {} page {} review {}'.format(asin, star_filter, page, i)
+
+
+def make_page(reviews):
+    """
+    Return a canned review page (with some markup that is not a review).
+    """
+    items = ''.join('<div class="a-row review">'
+                    '<span class="a-size-base review-text">{}'
+                    '<br><b>!</b></span></div>'.format(review)
+                    for review in reviews)
+
+    return ('<html><head><title>Reviews</title>'
+            '<script>var x = "<span class=review-text>no</span>";</script>'
+            '</head><body><h1>Customer reviews</h1>{}'
+            '<div class="footer">Not a review</div></body></html>'
+            ).format(items)
+
+
+class ReviewServer(ThreadingMixIn, HTTPServer):
+    """
+    A stand-in for the review pages of the store:
+
+        /product-reviews/ASIN?pageNumber=N&filterByStar=F
+            NO_OF_PAGES pages of REVIEWS_PER_PAGE reviews, then empty pages.
+        /flaky/NAME?fail=K
+            a 503 for the first K requests of NAME, then a 200.
+        /slow/NAME
+            a 200 after a short delay.
+
+    It records the requests and the largest number of requests in
+    progress at once for each host.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), ReviewHandler)
+        self.lock = threading.Lock()
+        self.requests = []
+        self.counts = Counter()
+        self.in_progress = Counter()
+        self.max_in_progress = defaultdict(int)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class ReviewHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_text(self, status, text):
+        body = text.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        host = self.headers['Host']
+
+        with server.lock:
+            server.requests.append((host, self.path, time.monotonic()))
+            server.counts[url.path] += 1
+            count = server.counts[url.path]
+            server.in_progress[host] += 1
+            server.max_in_progress[host] = max(server.max_in_progress[host],
+                                               server.in_progress[host])
+        try:
+            if url.path.startswith('/product-reviews/'):
+                asin = url.path.rsplit('/', 1)[1]
+                page = int(query.get('pageNumber', 1))
+                star_filter = query.get('filterByStar', 'all')
+                reviews = []
+                if page <= NO_OF_PAGES:
+                    reviews = [make_review(asin, star_filter, page, i)
+                               for i in range(REVIEWS_PER_PAGE)]
+                self.send_text(200, make_page(reviews))
+            elif url.path.startswith('/flaky/'):
+                if count <= int(query.get('fail', 0)):
+                    self.send_text(503, 'Service Unavailable')
+                else:
+                    self.send_text(200, 'ok')
+            elif url.path.startswith('/slow/'):
+                time.sleep(0.1)
+                self.send_text(200, 'ok')
+            else:
+                self.send_text(404, 'Not Found')
+        finally:
+            with server.lock:
+                server.in_progress[host] -= 1
+
+
+class CrawlerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ReviewServer()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.base = 'http://127.0.0.1:{}'.format(self.server.port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def make_crawler(self, **kwargs):
+        kwargs.setdefault('base_url', self.base + '/product-reviews/')
+        crawler = Crawler(**kwargs)
+        # Never go through a proxy of the environment to reach localhost
+        crawler.session.trust_env = False
+        return crawler
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_rate(self):
+        bucket = TokenBucket(rate=50)
+        start = time.monotonic()
+        for _ in range(11):
+            bucket.acquire()
+
+        # The first token is there from the start, the others come every
+        # 1/50 s
+        self.assertGreaterEqual(time.monotonic() - start, 10 / 50 * 0.9)
+
+    def test_burst(self):
+        bucket = TokenBucket(rate=1, capacity=5)
+        start = time.monotonic()
+        for _ in range(5):
+            bucket.acquire()
+
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_crawler_rate(self):
+        server = ReviewServer()
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        try:
+            crawler = Crawler(workers=4, rate=20)
+            crawler.session.trust_env = False
+            url = 'http://127.0.0.1:{}/flaky/rate'.format(server.port)
+
+            crawler.map(crawler.get, [url] * 6)
+            times = sorted(request_time
+                           for _, _, request_time in server.requests)
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+        self.assertEqual(len(times), 6)
+        self.assertGreaterEqual(times[-1] - times[0], 5 / 20 * 0.9)
+
+
+class TestPerHostLimit(CrawlerTestCase):
+
+    def test_per_host_limit(self):
+        crawler = self.make_crawler(workers=8, per_host=2)
+        urls = ['{}/slow/{}'.format(self.base, i) for i in range(8)]
+
+        responses = crawler.map(crawler.get, urls)
+
+        self.assertEqual([resp.status_code for resp in responses], [200] * 8)
+        host = '127.0.0.1:{}'.format(self.server.port)
+        self.assertEqual(self.server.max_in_progress[host], 2)
+
+    def test_hosts_are_limited_separately(self):
+        crawler = self.make_crawler(workers=8, per_host=2)
+        other_base = 'http://localhost:{}'.format(self.server.port)
+        urls = ['{}/slow/{}'.format(base, i)
+                for i in range(4) for base in (self.base, other_base)]
+
+        crawler.map(crawler.get, urls)
+
+        self.assertEqual(sorted(self.server.max_in_progress.values()),
+                         [2, 2])
+
+
+class TestBackoff(CrawlerTestCase):
+
+    def test_retries_503_with_backoff(self):
+        crawler = self.make_crawler(backoff=0.05, max_backoff=0.1)
+
+        start = time.monotonic()
+        resp = crawler.get(self.base + '/flaky/a', params={'fail': 3})
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.server.counts['/flaky/a'], 4)
+        # Waits of at least half of 0.05, 0.1 and 0.1 (capped) seconds
+        self.assertGreaterEqual(elapsed, 0.025 + 0.05 + 0.05)
+
+    def test_gives_up_after_max_retries(self):
+        crawler = self.make_crawler(max_retries=2, backoff=0.01)
+
+        resp = crawler.get(self.base + '/flaky/b', params={'fail': 10})
+
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(self.server.counts['/flaky/b'], 3)
+
+    def test_backoff_is_capped(self):
+        crawler = self.make_crawler(max_retries=4, backoff=10,
+                                    max_backoff=0.05)
+
+        start = time.monotonic()
+        resp = crawler.get(self.base + '/flaky/c', params={'fail': 4})
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertLess(time.monotonic() - start, 4 * 0.05 + 1)
+
+
+class TestReviewPages(CrawlerTestCase):
+
+    def test_get_reviews(self):
+        crawler = self.make_crawler()
+
+        reviews = crawler.get_reviews(ASIN, 'com', '+', limit=100)
+
+        self.assertEqual(reviews,
+                         [make_review(ASIN, 'positive', page, i) + ' !'
+                          for page in range(1, NO_OF_PAGES + 1)
+                          for i in range(REVIEWS_PER_PAGE)])
+        # Stops at the first page without reviews
+        self.assertEqual(self.server.counts['/product-reviews/' + ASIN],
+                         NO_OF_PAGES + 1)
+
+    def test_limit(self):
+        crawler = self.make_crawler()
+
+        reviews = crawler.get_reviews(ASIN, 'com', '-', limit=4)
+
+        self.assertEqual(reviews,
+                         [make_review(ASIN, 'critical', 1, i) + ' !'
+                          for i in range(REVIEWS_PER_PAGE)] +
+                         [make_review(ASIN, 'critical', 2, 0) + ' !'])
+
+    def test_get_amazon_reviews(self):
+        crawler = self.make_crawler()
+
+        reviews = get_amazon_reviews(ASIN, 'com', limit=2, crawler=crawler)
+
+        self.assertEqual(reviews, [make_review(ASIN, 'all', 1, i) + ' !'
+                                   for i in range(2)])
+
+    def test_invalid_tld(self):
+        with self.assertRaises(ValueError):
+            self.make_crawler().get_reviews(ASIN, 'invalid')
+
+    def test_extractors_agree(self):
+        text = make_page(['first review', 'second <i>review</i>'])
+
+        self.assertEqual(extract_reviews(text), ['first review !',
+                                                 'second review !'])
+        self.assertEqual(extract_reviews(text), extract_reviews_bs4(text))
+
+    def test_offline_replay(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = PageCache(directory)
+            state_fname = directory + '/state.jsonl'
+
+            crawler = self.make_crawler(cache=cache,
+                                        state=CrawlState(state_fname))
+            reviews = crawler.get_reviews(ASIN, 'com', '+', limit=100)
+            no_of_requests = len(self.server.requests)
+
+            offline = self.make_crawler(cache=cache,
+                                        state=CrawlState(state_fname),
+                                        offline=True)
+
+            self.assertEqual(offline.get_reviews(ASIN, 'com', '+',
+                                                 limit=100), reviews)
+            self.assertEqual(len(self.server.requests), no_of_requests)
+
+
+if __name__ == '__main__':
+    unittest.main()
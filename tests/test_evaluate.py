@@ -0,0 +1,121 @@
+"""
+Tests of cs4041.evaluate: cross evaluation by count subtraction against
+training a model for every fold from scratch.
+
+    python3 -m unittest discover tests
+"""
+import os
+import tempfile
+import unittest
+from benchmarks.synthetic import make_reviews
+from cs4041.classify import classify_review
+from cs4041.corpus import Corpus, write_corpus
+from cs4041.evaluate import (evaluate, evaluate_with_bigram_features,
+                             join_reviews, split_reviews)
+from cs4041.review import iter_reviews, read_reviews, write_reviews
+from cs4041.stopwords import Normalizer
+from cs4041.train import train, train_with_bigram_features
+
+STOPWORDS = ['the', 'a', 'and', 'is']
+SEED = 3
+
+
+def baseline_accuracies(reviews, train_model, no_of_parts=10, seed=None):
+    """
+    Cross evaluate by training a model on the remaining parts for every part
+    and classifying its reviews one at a time.
+    """
+    parts = split_reviews(reviews, no_of_parts, seed)
+    accuracies = []
+
+    for i, part in enumerate(parts):
+        model = train_model(join_reviews(parts[:i] + parts[i+1:]))
+        correct = 0
+        total = 0
+
+        for class_, review_list in part.items():
+            for review in review_list:
+                correct += classify_review(review, STOPWORDS, model) == class_
+                total += 1
+
+        accuracies.append(correct / total)
+
+    return accuracies
+
+
+class EvaluateTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.reviews = make_reviews(800, vocabulary_size=1000,
+                                   stopwords=STOPWORDS, seed=2)
+
+    def test_split_reviews(self):
+        parts = split_reviews(self.reviews, 10, SEED)
+
+        self.assertEqual(parts, split_reviews(self.reviews, 10, SEED))
+        for class_, review_list in self.reviews.items():
+            self.assertEqual(sorted(join_reviews(parts)[class_]),
+                             sorted(review_list))
+            self.assertLessEqual(max(len(part[class_]) for part in parts) -
+                                 min(len(part[class_]) for part in parts), 1)
+
+    def test_same_as_baseline(self):
+        expected = baseline_accuracies(
+            self.reviews, lambda reviews: train(reviews, STOPWORDS), seed=SEED)
+
+        self.assertEqual(evaluate(self.reviews, STOPWORDS, seed=SEED),
+                         expected)
+
+    def test_bigram_same_as_baseline(self):
+        expected = baseline_accuracies(
+            self.reviews,
+            lambda reviews: train_with_bigram_features(reviews, STOPWORDS,
+                                                       min_occur=3),
+            seed=SEED)
+
+        self.assertEqual(evaluate_with_bigram_features(
+            self.reviews, STOPWORDS, min_occur=3, seed=SEED), expected)
+
+    def test_hashed_same_as_baseline(self):
+        expected = baseline_accuracies(
+            self.reviews,
+            lambda reviews: train(reviews, STOPWORDS, buckets=1024),
+            seed=SEED)
+
+        self.assertEqual(evaluate(self.reviews, STOPWORDS, seed=SEED,
+                                  buckets=1024), expected)
+
+    def test_workers(self):
+        self.assertEqual(evaluate(self.reviews, STOPWORDS, workers=2,
+                                  seed=SEED),
+                         evaluate(self.reviews, STOPWORDS, seed=SEED))
+        self.assertEqual(
+            evaluate_with_bigram_features(self.reviews, STOPWORDS, workers=2,
+                                          seed=SEED),
+            evaluate_with_bigram_features(self.reviews, STOPWORDS,
+                                          seed=SEED))
+
+    def test_corpus(self):
+        normalizer = Normalizer(STOPWORDS)
+
+        with tempfile.TemporaryDirectory() as dirname:
+            reviews_fname = os.path.join(dirname, 'reviews.txt')
+            corpus_fname = os.path.join(dirname, 'corpus.bin')
+            write_reviews(normalizer.clean_reviews(self.reviews),
+                          reviews_fname)
+            write_corpus(iter_reviews(reviews_fname), corpus_fname)
+            corpus = Corpus(corpus_fname)
+
+            # The same documents in the same order, so the same parts
+            cleaned = read_reviews(reviews_fname)
+            self.assertEqual(evaluate(corpus, STOPWORDS, seed=SEED),
+                             evaluate(cleaned, STOPWORDS, seed=SEED))
+            self.assertEqual(
+                evaluate_with_bigram_features(corpus, STOPWORDS, seed=SEED),
+                evaluate_with_bigram_features(cleaned, STOPWORDS,
+                                              seed=SEED))
+
+
+if __name__ == '__main__':
+    unittest.main()
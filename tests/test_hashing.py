@@ -0,0 +1,121 @@
+"""
+Tests of cs4041.hashing: hashed features of strings and of integer encoded
+strings against hashing every word and bigram one at a time.
+
+    python3 -m unittest discover tests
+"""
+import os
+import tempfile
+import unittest
+import zlib
+import numpy as np
+from benchmarks.synthetic import make_reviews
+from cs4041.corpus import Corpus, write_corpus
+from cs4041.hashing import (BIGRAM_MULTIPLIER, MASK32, count_hashed_ids,
+                            count_hashed_strings, hash_features,
+                            hash_strings, hash_words, mix, train_hashed,
+                            train_hashed_corpus)
+from cs4041.stopwords import Normalizer
+from cs4041.vocabulary import encode_strings
+
+STOPWORDS = ['the', 'a', 'and', 'is']
+BUCKETS = 997
+
+
+def reference_buckets(string, buckets, bigram_features):
+    """
+    Return the buckets of the words (and bigrams) of a string, one feature
+    at a time.
+    """
+    hashes = [zlib.crc32(word.encode()) for word in string.split()]
+    columns = [h % buckets for h in hashes]
+
+    if bigram_features:
+        for first, second in zip(hashes, hashes[1:]):
+            combined = (first * BIGRAM_MULTIPLIER + second) & MASK32
+            bigram_hash = int(mix(np.array([combined], dtype=np.uint64))[0])
+            columns.append(bigram_hash % buckets)
+
+    return columns
+
+
+class HashingTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        reviews = make_reviews(300, vocabulary_size=1000,
+                               stopwords=STOPWORDS, seed=12)
+        cls.reviews = Normalizer(STOPWORDS).clean_reviews(reviews)
+        cls.strings = cls.reviews['+'][:50] + cls.reviews['-'][:50]
+
+    def test_hash_strings(self):
+        hashes, offsets = hash_strings(self.strings)
+        chunked_hashes, chunked_offsets = hash_strings(self.strings,
+                                                       chunk_size=7)
+
+        np.testing.assert_array_equal(chunked_hashes, hashes)
+        np.testing.assert_array_equal(chunked_offsets, offsets)
+        for i, string in enumerate(self.strings):
+            np.testing.assert_array_equal(
+                hashes[offsets[i]:offsets[i+1]], hash_words(string.split()))
+
+        hashes, offsets = hash_strings([])
+        self.assertEqual(len(hashes), 0)
+        self.assertEqual(offsets.tolist(), [0])
+
+    def test_hash_features(self):
+        for bigram_features in [False, True]:
+            indptr, indices = hash_features(*hash_strings(self.strings),
+                                            BUCKETS, bigram_features)
+
+            for i, string in enumerate(self.strings):
+                self.assertEqual(
+                    sorted(indices[indptr[i]:indptr[i+1]].tolist()),
+                    sorted(reference_buckets(string, BUCKETS,
+                                             bigram_features)))
+
+    def test_count_ids_same_as_strings(self):
+        ids, offsets, tokens = encode_strings(self.strings)
+
+        for bigram_features in [False, True]:
+            np.testing.assert_array_equal(
+                count_hashed_ids(ids, offsets, hash_words(tokens), BUCKETS,
+                                 bigram_features),
+                count_hashed_strings(self.strings, BUCKETS, bigram_features))
+
+    def test_corpus_same_as_strings(self):
+        with tempfile.TemporaryDirectory() as dirname:
+            fname = os.path.join(dirname, 'corpus.bin')
+            write_corpus(((class_, review) for class_, review_list
+                          in self.reviews.items()
+                          for review in review_list), fname)
+            corpus = Corpus(fname)
+
+            for bigram_features in [False, True]:
+                model = train_hashed(self.reviews, STOPWORDS, BUCKETS,
+                                     bigram_features)
+                corpus_model = train_hashed_corpus(corpus, BUCKETS,
+                                                   bigram_features)
+
+                self.assertEqual(corpus_model.classes, model.classes)
+                np.testing.assert_allclose(corpus_model.log_likelihoods,
+                                           model.log_likelihoods)
+                np.testing.assert_allclose(corpus_model.log_priors,
+                                           model.log_priors)
+
+    def test_scores(self):
+        model = train_hashed(self.reviews, STOPWORDS, BUCKETS,
+                             bigram_features=True)
+        documents = [string.split() for string in self.strings]
+        scores = model.log_scores_batch(*model.encode_batch(documents))
+        log_odds = model.log_odds()
+
+        self.assertEqual(model.log_likelihoods.shape, (2, BUCKETS))
+        for words, row in zip(documents, scores):
+            np.testing.assert_allclose(row,
+                                       model.log_scores(model.encode(words)))
+            self.assertAlmostEqual(log_odds.score(words), row[0] - row[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+"""
+Tests of cs4041.incremental: a model trained with fit() and partial_fit()
+against one trained on all the reviews at once.
+
+    python3 -m unittest discover tests
+"""
+import os
+import tempfile
+import unittest
+import numpy as np
+from benchmarks.synthetic import make_reviews
+from cs4041.incremental import (fit, partial_fit, read_incremental_model,
+                                write_incremental_model)
+from cs4041.train import train, train_with_bigram_features
+
+STOPWORDS = ['the', 'a', 'and', 'is']
+
+
+def make_batches(reviews, no_of_batches):
+    """
+    Split the reviews of each class into no_of_batches batches.
+    """
+    return [{class_: review_list[i::no_of_batches]
+             for class_, review_list in reviews.items()}
+            for i in range(no_of_batches)]
+
+
+class IncrementalTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.reviews = make_reviews(800, vocabulary_size=2000,
+                                   stopwords=STOPWORDS, seed=11)
+        cls.batches = make_batches(cls.reviews, 5)
+        # The first batch has no '-' reviews, the second no '+' reviews
+        cls.batches[0]['-'], cls.batches[1]['+'] = [], []
+        cls.seen = {class_: [review for batch in cls.batches
+                             for review in batch[class_]]
+                    for class_ in cls.reviews}
+
+    def assertSameModel(self, model, expected):
+        self.assertEqual(list(model.tokens), list(expected.tokens))
+        self.assertEqual(sorted(model.classes), sorted(expected.classes))
+
+        for class_ in expected.classes:
+            i = model.class_index[class_]
+            j = expected.class_index[class_]
+            np.testing.assert_allclose(model.log_likelihoods[i],
+                                       expected.log_likelihoods[j])
+            self.assertAlmostEqual(model.log_priors[i],
+                                   expected.log_priors[j])
+
+    def test_same_as_retraining(self):
+        model = fit(self.batches[0], STOPWORDS)
+
+        for i, batch in enumerate(self.batches[1:], 2):
+            partial_fit(model, batch)
+            seen = {class_: [review for curr_batch in self.batches[:i]
+                             for review in curr_batch[class_]]
+                    for class_ in self.reviews}
+            self.assertSameModel(model.model, train(seen, STOPWORDS))
+
+    def test_bigrams_same_as_retraining(self):
+        model = fit(self.batches[0], STOPWORDS, min_occur=3,
+                    bigram_features=True)
+
+        for i, batch in enumerate(self.batches[1:], 2):
+            partial_fit(model, batch)
+            seen = {class_: [review for curr_batch in self.batches[:i]
+                             for review in curr_batch[class_]]
+                    for class_ in self.reviews}
+            self.assertSameModel(model.model, train_with_bigram_features(
+                seen, STOPWORDS, min_occur=3))
+
+    def test_saved_and_updated(self):
+        for bigram_features in [False, True]:
+            model = fit(self.batches[0], STOPWORDS, min_occur=3,
+                        bigram_features=bigram_features)
+            partial_fit(model, self.batches[1])
+
+            with tempfile.TemporaryDirectory() as dirname:
+                fname = os.path.join(dirname, 'model.p')
+                write_incremental_model(model, fname)
+                model = read_incremental_model(fname)
+
+            for batch in self.batches[2:]:
+                partial_fit(model, batch)
+
+            if bigram_features:
+                expected = train_with_bigram_features(self.seen, STOPWORDS,
+                                                      min_occur=3)
+            else:
+                expected = train(self.seen, STOPWORDS, min_occur=3)
+            self.assertSameModel(model.model, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+"""
+Tests of cs4041.model: the dense Model against the dictionary (2-tuple)
+models of older versions, and the scoring with precomputed log odds.
+
+    python3 -m unittest discover tests
+"""
+import math
+import pickle
+import unittest
+import numpy as np
+from benchmarks.synthetic import make_reviews
+from cs4041.model import UNKNOWN_TOKEN, Model, as_model
+from cs4041.stopwords import Normalizer
+from cs4041.train import train, train_with_bigram_features
+
+STOPWORDS = ['the', 'a', 'and', 'is']
+
+
+def tuple_log_scores(trained_model, words):
+    """
+    Score a review with a 2-tuple model, as older versions of
+    classify.calculate_cond_probability() did (greedy bigram matching).
+    """
+    class_probability, likelihood = trained_model
+    scores = {}
+
+    for class_, log_prior in class_probability.items():
+        score = log_prior
+        flag = False
+
+        for idx, word in enumerate(words):
+            bigram = None
+            if idx < len(words) - 1:
+                bigram = word + ' ' + words[idx+1]
+
+            if bigram is not None and (bigram, class_) in likelihood:
+                score = score + likelihood[(bigram, class_)]
+                flag = True
+            else:
+                if not flag:
+                    score = score + likelihood.get(
+                        (word, class_), likelihood[(UNKNOWN_TOKEN, class_)])
+                flag = False
+
+        scores[class_] = score
+
+    return scores
+
+
+class ModelTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.reviews = make_reviews(600, vocabulary_size=800,
+                                   stopwords=STOPWORDS, seed=1)
+        cls.normalizer = Normalizer(STOPWORDS)
+        cls.documents = cls.normalizer.tokenize(cls.reviews['+'][:100] +
+                                                cls.reviews['-'][:100])
+        cls.model = train(cls.reviews, STOPWORDS)
+        cls.bigram_model = train_with_bigram_features(cls.reviews, STOPWORDS)
+
+    def test_tuple_round_trip(self):
+        for model in [self.model, self.bigram_model]:
+            restored = Model.from_tuple(model.to_tuple())
+
+            self.assertEqual(restored.tokens, model.tokens)
+            self.assertEqual(restored.classes, model.classes)
+            np.testing.assert_array_equal(restored.log_likelihoods,
+                                          model.log_likelihoods)
+            np.testing.assert_array_equal(restored.log_priors,
+                                          model.log_priors)
+
+    def test_as_model(self):
+        self.assertIs(as_model(self.model), self.model)
+        self.assertIsInstance(as_model(self.model.to_tuple()), Model)
+
+    def test_scores_match_tuple_model(self):
+        for model in [self.model, self.bigram_model]:
+            trained_model = model.to_tuple()
+
+            for words in self.documents:
+                expected = tuple_log_scores(trained_model, words)
+                scores = model.log_scores(model.encode(words))
+
+                for class_, score in zip(model.classes, scores):
+                    self.assertAlmostEqual(score, expected[class_])
+
+    def test_encode_prefers_bigrams(self):
+        model = Model(['a', 'a b', 'b', 'c'], ['+', '-'],
+                      np.zeros((2, 5)), np.zeros(2))
+
+        self.assertEqual(model.encode(['a', 'b', 'c']), [1, 3])
+        self.assertEqual(model.encode(['b', 'a', 'b']), [2, 1])
+        self.assertEqual(model.encode(['d', 'a']), [4, 0])
+        self.assertEqual(model.encode([]), [])
+
+    def test_batch_matches_single(self):
+        for model in [self.model, self.bigram_model]:
+            indptr, indices = model.encode_batch(self.documents)
+            scores = model.log_scores_batch(indptr, indices)
+
+            for words, row in zip(self.documents, scores):
+                np.testing.assert_allclose(
+                    row, model.log_scores(model.encode(words)))
+
+    def test_log_odds(self):
+        for model in [self.model, self.bigram_model]:
+            log_odds = model.log_odds('+', '-')
+            positive = model.class_index['+']
+            negative = model.class_index['-']
+
+            for words in self.documents:
+                scores = model.log_scores(model.encode(words))
+                self.assertTrue(math.isclose(
+                    log_odds.score(words),
+                    scores[positive] - scores[negative], abs_tol=1e-9))
+
+    def test_early_exit_keeps_sign(self):
+        log_odds = self.bigram_model.log_odds()
+
+        for words in self.documents:
+            self.assertEqual(log_odds.score(words) > 0,
+                             log_odds.score(words, early_exit=True) > 0)
+
+    def test_log_odds_cached(self):
+        model = train(self.reviews, STOPWORDS)
+
+        self.assertIs(model.log_odds(), model.log_odds())
+        self.assertEqual(model.log_odds('-', '+').classes, ('-', '+'))
+
+        # The cached log odds are not pickled
+        restored = pickle.loads(pickle.dumps(model))
+        self.assertFalse(hasattr(restored, '_log_odds'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+"""
+Tests of cs4041.modelfile: writing models to binary model files and
+reading them back memory mapped.
+
+    python3 -m unittest discover tests
+"""
+import os
+import pickle
+import tempfile
+import unittest
+import numpy as np
+from benchmarks.synthetic import make_reviews
+from cs4041.classify import classify_review, classify_reviews
+from cs4041.hashing import train_hashed
+from cs4041.model import Model
+from cs4041.modelfile import (ALIGNMENT, HEADER, HEADER_V1, TokenTable,
+                              is_model_file, read_model, write_model)
+from cs4041.train import train, train_with_bigram_features
+
+STOPWORDS = ['the', 'a', 'and', 'is']
+
+
+def write_v1_model(fname, v1_fname):
+    """
+    Rewrite a model file without the token hash slots, as version 1 wrote
+    it.
+    """
+    with open(fname, 'rb') as f:
+        buf = f.read()
+
+    (magic, _, itemsize, no_of_classes, no_of_tokens, _,
+     *starts) = HEADER.unpack_from(buf)
+    ends = starts[1:] + [len(buf)]
+    sections = [buf[start:end] for start, end in zip(starts, ends)]
+    del sections[4]
+
+    offsets = []
+    offset = -(-HEADER_V1.size // ALIGNMENT) * ALIGNMENT
+    for section in sections:
+        offsets.append(offset)
+        offset = offset + len(section)
+
+    with open(v1_fname, 'wb') as f:
+        f.write(HEADER_V1.pack(magic, 1, itemsize, no_of_classes,
+                               no_of_tokens, *offsets))
+        for offset, section in zip(offsets, sections):
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(section)
+
+
+class TokenTableTest(unittest.TestCase):
+
+    def test_lookup(self):
+        strings = sorted(['good', 'bad', 'good film', 'café', 'z', 'a b c'])
+
+        for hashed in [True, False]:
+            table = TokenTable.from_strings(strings, hashed)
+
+            self.assertEqual(len(table), len(strings))
+            self.assertEqual(list(table), strings)
+            self.assertEqual(table[-1], strings[-1])
+            for i, string in enumerate(strings):
+                self.assertEqual(table[i], string)
+                self.assertEqual(table.get(string), i)
+            self.assertIsNone(table.get('missing'))
+            self.assertEqual(table.get('goo', -1), -1)
+            self.assertIn('café', table)
+            self.assertNotIn('', table)
+
+            with self.assertRaises(IndexError):
+                table[len(strings)]
+
+    def test_pickle(self):
+        table = TokenTable.from_strings(['a', 'b', 'c'], hashed=True)
+        restored = pickle.loads(pickle.dumps(table))
+
+        self.assertEqual(list(restored), ['a', 'b', 'c'])
+        self.assertEqual(restored.get('c'), 2)
+
+
+class ModelFileTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.reviews = make_reviews(600, vocabulary_size=1500,
+                                   stopwords=STOPWORDS, seed=8)
+        cls.texts = cls.reviews['+'][:150] + cls.reviews['-'][:150]
+        cls.model = train(cls.reviews, STOPWORDS)
+        cls.bigram_model = train_with_bigram_features(cls.reviews, STOPWORDS)
+        cls.dirname = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        for fname in os.listdir(cls.dirname):
+            os.remove(os.path.join(cls.dirname, fname))
+        os.rmdir(cls.dirname)
+
+    def round_trip(self, model, dtype=np.float64, name='model.bin'):
+        fname = os.path.join(self.dirname, name)
+        write_model(model, fname, dtype)
+
+        return read_model(fname)
+
+    def assertSameScores(self, model, expected, rtol=1e-12):
+        labels, scores = classify_reviews(self.texts, STOPWORDS, model)
+        expected_labels, expected_scores = classify_reviews(
+            self.texts, STOPWORDS, expected)
+
+        np.testing.assert_allclose(scores, expected_scores, rtol=rtol)
+        if rtol <= 1e-12:
+            self.assertEqual(labels.tolist(), expected_labels.tolist())
+            self.assertEqual(
+                [classify_review(text, STOPWORDS, model)
+                 for text in self.texts],
+                [classify_review(text, STOPWORDS, expected)
+                 for text in self.texts])
+
+    def test_round_trip(self):
+        for model in [self.model, self.bigram_model]:
+            restored = self.round_trip(model)
+
+            self.assertEqual(sorted(restored.tokens), sorted(model.tokens))
+            self.assertEqual(restored.classes, model.classes)
+            np.testing.assert_array_equal(restored.log_priors,
+                                          model.log_priors)
+            for token in model.tokens[:100]:
+                np.testing.assert_array_equal(
+                    restored.log_likelihoods[
+                        :, restored.token_index.get(token)],
+                    model.log_likelihoods[:, model.token_index[token]])
+            self.assertSameScores(restored, model)
+
+    def test_dtypes(self):
+        self.assertSameScores(self.round_trip(self.model, np.float32),
+                              self.model, rtol=1e-6)
+        self.assertSameScores(self.round_trip(self.model, np.float16),
+                              self.model, rtol=1e-3)
+        self.assertSameScores(self.round_trip(self.model, np.int8),
+                              self.model, rtol=0.05)
+
+    def test_version_1(self):
+        fname = os.path.join(self.dirname, 'model.bin')
+        v1_fname = os.path.join(self.dirname, 'model_v1.bin')
+        write_model(self.bigram_model, fname)
+        write_v1_model(fname, v1_fname)
+        restored = read_model(v1_fname)
+
+        self.assertIsNone(restored.tokens.slots)
+        self.assertSameScores(restored, self.bigram_model)
+
+    def test_pickle(self):
+        restored = pickle.loads(pickle.dumps(self.round_trip(self.model)))
+
+        self.assertSameScores(restored, self.model)
+
+    def test_errors(self):
+        fname = os.path.join(self.dirname, 'not_a_model.bin')
+        with open(fname, 'wb') as f:
+            f.write(b'not a model file')
+
+        self.assertFalse(is_model_file(fname))
+        with self.assertRaises(ValueError):
+            read_model(fname)
+
+        with self.assertRaises(ValueError):
+            self.round_trip(self.model, np.int16)
+        with self.assertRaises(TypeError):
+            self.round_trip(train_hashed(self.reviews, STOPWORDS, 64))
+
+    def test_classes_unsorted(self):
+        model = Model(['b', 'a'], ['pos', 'neg', 'mid'],
+                      np.log(np.full((3, 3), 1 / 3)), np.log([0.5, 0.3, 0.2]))
+        restored = self.round_trip(model)
+
+        self.assertEqual(restored.classes, ['pos', 'neg', 'mid'])
+        self.assertEqual(list(restored.tokens), ['a', 'b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+"""
+Tests of cs4041.ngrams: n-gram features against counting and matching the
+n-grams one string at a time, and their cross evaluation.
+
+    python3 -m unittest discover tests
+"""
+from collections import Counter
+import os
+import tempfile
+import unittest
+import numpy as np
+from benchmarks.synthetic import make_reviews
+from cs4041.classify import calculate_accuracy
+from cs4041.corpus import Corpus, write_corpus
+from cs4041.evaluate import (evaluate_with_ngram_features, join_reviews,
+                             split_reviews)
+from cs4041.ngrams import (build_trie, count_ngram_ids,
+                           get_ngram_frequencies, segment,
+                           train_ngram_corpus, train_with_ngram_features)
+from cs4041.stopwords import Normalizer
+from cs4041.train import train
+from cs4041.vocabulary import encode_strings
+
+STOPWORDS = ['the', 'a', 'and', 'is']
+
+
+class SegmentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.trie = build_trie([(['a'], 0), (['b'], 1), (['c'], 2),
+                                (['a', 'b'], 3), (['a', 'b', 'c'], 4),
+                                (['b', 'c'], 5)])
+
+    def test_longest_match(self):
+        self.assertEqual(segment('a b c'.split(), self.trie, 3), [4])
+        self.assertEqual(segment('a b a b c'.split(), self.trie, 3), [3, 4])
+        self.assertEqual(segment('b c a'.split(), self.trie, 3), [5, 0])
+        self.assertEqual(segment('a b c'.split(), self.trie, 2), [3, 2])
+
+    def test_unknown(self):
+        self.assertEqual(segment('x a x'.split(), self.trie, 3, -1),
+                         [-1, 0, -1])
+        # A prefix of an n-gram which is not a token itself
+        trie = build_trie([(['x', 'y'], 0)])
+        self.assertEqual(segment('x z'.split(), trie, 2, -1), [-1, -1])
+        self.assertEqual(segment([], self.trie, 3), [])
+
+
+class NgramTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.reviews = make_reviews(600, vocabulary_size=800,
+                                   stopwords=STOPWORDS, seed=13)
+        cls.cleaned = Normalizer(STOPWORDS).clean_reviews(cls.reviews)
+        cls.strings = cls.cleaned['+'][:100] + cls.cleaned['-'][:100]
+
+    def test_count_ngram_ids(self):
+        ids, offsets, tokens = encode_strings(self.strings)
+
+        for n in [1, 2, 3]:
+            expected = Counter()
+            for string in self.strings:
+                words = string.split()
+                expected.update(tuple(words[i:i+n])
+                                for i in range(len(words) - n + 1))
+
+            keys, counts = count_ngram_ids(ids, offsets, n)
+            self.assertEqual(
+                {tuple(tokens[word_id] for word_id in key): count
+                 for key, count in zip(keys.tolist(), counts.tolist())},
+                dict(expected))
+
+    def test_every_word_counted_once(self):
+        frequency = get_ngram_frequencies(self.strings, max_n=3,
+                                          min_ngram_occur=2)
+
+        self.assertTrue(any(token.count(' ') == 2 for token in frequency))
+        self.assertEqual(sum((token.count(' ') + 1) * count
+                             for token, count in frequency.items()),
+                         sum(len(string.split()) for string in self.strings))
+
+    def test_unigrams_same_as_words(self):
+        model = train_with_ngram_features(self.reviews, STOPWORDS, max_n=1)
+        word_model = train(self.reviews, STOPWORDS, min_occur=3)
+
+        self.assertEqual(list(model.tokens), list(word_model.tokens))
+        np.testing.assert_allclose(model.log_likelihoods,
+                                   word_model.log_likelihoods)
+
+    def test_log_odds(self):
+        model = train_with_ngram_features(self.reviews, STOPWORDS,
+                                          min_occur=2, min_ngram_occur=2)
+        log_odds = model.log_odds()
+
+        for string in self.strings:
+            words = string.split()
+            scores = model.log_scores(model.encode(words))
+            self.assertAlmostEqual(log_odds.score(words),
+                                   scores[0] - scores[1])
+            self.assertEqual(log_odds.score(words) > 0,
+                             log_odds.score(words, early_exit=True) > 0)
+
+    def test_corpus(self):
+        with tempfile.TemporaryDirectory() as dirname:
+            fname = os.path.join(dirname, 'corpus.bin')
+            write_corpus(((class_, review) for class_, review_list
+                          in self.cleaned.items()
+                          for review in review_list), fname)
+            corpus = Corpus(fname)
+
+            model = train_ngram_corpus(corpus)
+            expected = train_with_ngram_features(self.reviews, STOPWORDS)
+
+            self.assertEqual(list(model.tokens), list(expected.tokens))
+            np.testing.assert_allclose(model.log_likelihoods,
+                                       expected.log_likelihoods)
+
+            self.assertEqual(
+                evaluate_with_ngram_features(corpus, STOPWORDS, seed=0),
+                evaluate_with_ngram_features(self.cleaned, STOPWORDS,
+                                             seed=0))
+
+    def test_cross_validation(self):
+        parts = split_reviews(self.reviews, 5, seed=1)
+        expected = []
+        for i, part in enumerate(parts):
+            model = train_with_ngram_features(
+                join_reviews(parts[:i] + parts[i+1:]), STOPWORDS)
+            expected.append(calculate_accuracy(part, STOPWORDS, model))
+
+        self.assertEqual(evaluate_with_ngram_features(
+            self.reviews, STOPWORDS, no_of_parts=5, seed=1), expected)
+        self.assertEqual(evaluate_with_ngram_features(
+            self.reviews, STOPWORDS, no_of_parts=5, workers=2, seed=1),
+            expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
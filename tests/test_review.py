@@ -0,0 +1,78 @@
+"""
+Tests of cs4041.review: shuffling a file of reviews in memory and through
+temporary bucket files.
+
+    python3 -m unittest discover tests
+"""
+from collections import Counter
+import itertools
+import os
+import tempfile
+import unittest
+from benchmarks.synthetic import make_reviews
+from cs4041.review import (iter_reviews, read_reviews, shuffle_reviews,
+                           write_reviews)
+
+STOPWORDS = ['the', 'a', 'and', 'is']
+
+
+class ShuffleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.fname = os.path.join(self.tmp_dir.name, 'reviews.txt')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_same_reviews(self):
+        reviews = make_reviews(500, vocabulary_size=500, stopwords=STOPWORDS,
+                               seed=16)
+        write_reviews(reviews, self.fname, seed=0)
+        expected = sorted(iter_reviews(self.fname))
+
+        for max_in_memory, max_open_files in [(1000, 64), (40, 3), (7, 2)]:
+            out_fname = os.path.join(self.tmp_dir.name, 'shuffled.txt')
+            shuffle_reviews(self.fname, out_fname, seed=1,
+                            max_in_memory=max_in_memory,
+                            max_open_files=max_open_files)
+
+            shuffled = list(iter_reviews(out_fname))
+            self.assertEqual(sorted(shuffled), expected)
+            self.assertNotEqual(shuffled, list(iter_reviews(self.fname)))
+            # Only the output file is left
+            self.assertEqual(sorted(os.listdir(self.tmp_dir.name)),
+                             ['reviews.txt', 'shuffled.txt'])
+
+    def test_in_place(self):
+        reviews = make_reviews(100, vocabulary_size=200, stopwords=STOPWORDS,
+                               seed=17)
+        write_reviews(reviews, self.fname, seed=0)
+        shuffle_reviews(self.fname, self.fname, seed=2, max_in_memory=10,
+                        max_open_files=4)
+
+        shuffled = read_reviews(self.fname)
+        for class_, review_list in reviews.items():
+            self.assertEqual(sorted(shuffled[class_]), sorted(review_list))
+
+    def test_uniform(self):
+        out_fname = os.path.join(self.tmp_dir.name, 'shuffled.txt')
+        counts = Counter()
+
+        for seed in range(2400):
+            with open(self.fname, 'w') as f:
+                f.write('+\tone\n+\ttwo\n-\tthree\n-\tfour\n')
+            shuffle_reviews(self.fname, out_fname, seed=seed,
+                            max_in_memory=1, max_open_files=2)
+            counts[tuple(text for _, text in iter_reviews(out_fname))] += 1
+
+        self.assertEqual(
+            set(counts),
+            set(itertools.permutations(['one', 'two', 'three', 'four'])))
+        # Each of the 24 orders is expected 100 times
+        self.assertGreater(min(counts.values()), 60)
+        self.assertLess(max(counts.values()), 140)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+"""
+Tests of cs4041.score: scoring a file of reviews in shards, against
+classifying the reviews one at a time.
+
+    python3 -m unittest discover tests
+"""
+import io
+import os
+import tempfile
+import unittest
+import numpy as np
+from benchmarks.synthetic import make_reviews
+from cs4041.classify import classify_review, classify_reviews
+from cs4041.model import Model
+from cs4041.modelfile import write_model
+from cs4041.score import find_shards, read_shard, score_file, score_reviews
+from cs4041.stopwords import Normalizer
+from cs4041.train import train
+
+STOPWORDS = ['the', 'a', 'and', 'is']
+
+
+class ScoreTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        reviews = make_reviews(600, vocabulary_size=1000,
+                               stopwords=STOPWORDS, seed=10)
+        cls.model = train(reviews, STOPWORDS)
+        cls.texts = reviews['+'][:100] + reviews['-'][:100]
+
+        cls.dirname = tempfile.mkdtemp()
+        cls.model_fname = os.path.join(cls.dirname, 'model.bin')
+        cls.fname = os.path.join(cls.dirname, 'reviews.txt')
+        write_model(cls.model, cls.model_fname)
+        with open(cls.fname, 'w') as f:
+            for text in cls.texts:
+                f.write(text + '\n')
+
+    @classmethod
+    def tearDownClass(cls):
+        for fname in os.listdir(cls.dirname):
+            os.remove(os.path.join(cls.dirname, fname))
+        os.rmdir(cls.dirname)
+
+    def test_find_shards(self):
+        shards = find_shards(self.fname, shard_size=1000)
+
+        self.assertGreater(len(shards), 1)
+        self.assertEqual(shards[0][0], 0)
+        self.assertEqual(shards[-1][1], os.path.getsize(self.fname))
+
+        for (_, end), (start, _) in zip(shards[:-1], shards[1:]):
+            self.assertEqual(end, start)
+
+        reviews = []
+        for shard in shards:
+            reviews.extend(read_shard(self.fname, *shard))
+        self.assertEqual(reviews, [text.strip() for text in self.texts])
+
+    def test_same_as_classify_review(self):
+        out = io.StringIO()
+        count = score_file(self.model_fname, self.fname, out, STOPWORDS,
+                           shard_size=1000)
+        lines = out.getvalue().splitlines()
+
+        self.assertEqual(count, len(self.texts))
+        self.assertEqual(len(lines), len(self.texts))
+
+        for line, text in zip(lines, self.texts):
+            label, score, review_text = line.split('\t')
+            self.assertEqual(review_text, text.strip())
+            self.assertEqual(label,
+                             classify_review(text, STOPWORDS, self.model))
+            self.assertAlmostEqual(
+                float(score),
+                self.model.log_odds().score(
+                    Normalizer(STOPWORDS).tokens(text)), places=5)
+
+    def test_workers(self):
+        single = io.StringIO()
+        pooled = io.StringIO()
+        score_file(self.model_fname, self.fname, single, STOPWORDS,
+                   shard_size=1000)
+        score_file(self.model_fname, self.fname, pooled, STOPWORDS,
+                   workers=2, shard_size=1000)
+
+        self.assertEqual(pooled.getvalue(), single.getvalue())
+
+    def test_labelled(self):
+        fname = os.path.join(self.dirname, 'labelled.txt')
+        with open(fname, 'w') as f:
+            f.write('+\tgood film\n-\n\n-\tbad plot\n')
+
+        out = io.StringIO()
+        count = score_file(self.model_fname, fname, out, STOPWORDS,
+                           labelled=True)
+        review_texts = [line.split('\t')[2]
+                        for line in out.getvalue().splitlines()]
+
+        # A line with a class only is scored as an empty review
+        self.assertEqual(count, 3)
+        self.assertEqual(review_texts, ['good film', '', 'bad plot'])
+
+    def test_multiclass(self):
+        rng = np.random.RandomState(0)
+        model = Model(['good', 'bad', 'plot'], ['5', '3', '1'],
+                      np.log(rng.dirichlet(np.ones(4), size=3)),
+                      np.log([0.5, 0.2, 0.3]))
+        texts = ['good good plot', 'bad', 'plot bad bad', '', 'unknown']
+        labels, scores = classify_reviews(texts, STOPWORDS, model)
+        results = score_reviews(texts, Normalizer(STOPWORDS), model)
+
+        self.assertEqual([label for label, _ in results], labels.tolist())
+        for (_, score), row in zip(results, scores):
+            posteriors = np.exp(row - np.logaddexp.reduce(row))
+            self.assertAlmostEqual(score, np.log(posteriors.max()))
+
+
+if __name__ == '__main__':
+    unittest.main()
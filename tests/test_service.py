@@ -0,0 +1,136 @@
+"""
+Tests of cs4041.service: the micro-batching classification service over
+HTTP, against classifying the reviews directly.
+
+    python3 -m unittest discover tests
+"""
+import http.client
+import json
+import threading
+import unittest
+from benchmarks.synthetic import make_reviews
+from cs4041.classify import classify_reviews
+from cs4041.service import ClassificationService, MicroBatcher, make_server
+from cs4041.train import train
+
+STOPWORDS = ['the', 'a', 'and', 'is']
+
+
+class MicroBatcherTest(unittest.TestCase):
+
+    def test_results_in_order(self):
+        batch_sizes = []
+
+        def classify_batch(reviews):
+            batch_sizes.append(len(reviews))
+            return [review.upper() for review in reviews]
+
+        batcher = MicroBatcher(classify_batch, max_batch=8, max_delay=0.05)
+        requests = [['r{}.{}'.format(i, j) for j in range(i % 4 + 1)]
+                    for i in range(20)] + [['big'] * 10]
+        futures = [batcher.submit(reviews) for reviews in requests]
+
+        for reviews, future in zip(requests, futures):
+            self.assertEqual(future.result(timeout=10),
+                             [review.upper() for review in reviews])
+
+        self.assertEqual(sum(batch_sizes),
+                         sum(len(reviews) for reviews in requests))
+        # Requests are coalesced, and a request never split
+        self.assertLess(len(batch_sizes), len(requests))
+        self.assertIn(10, batch_sizes)
+        self.assertTrue(all(size <= 8 for size in batch_sizes
+                            if size != 10))
+
+    def test_errors(self):
+        def classify_batch(reviews):
+            raise RuntimeError('failed')
+
+        future = MicroBatcher(classify_batch).submit(['review'])
+
+        with self.assertRaises(RuntimeError):
+            future.result(timeout=10)
+
+
+class ServiceTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        reviews = make_reviews(400, vocabulary_size=1000,
+                               stopwords=STOPWORDS, seed=9)
+        cls.texts = reviews['+'][:20] + reviews['-'][:20]
+        cls.model = train(reviews, STOPWORDS)
+
+        cls.service = ClassificationService(cls.model, STOPWORDS)
+        cls.server = make_server(cls.service, port=0)
+        cls.thread = threading.Thread(target=cls.server.serve_forever,
+                                      daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def request(self, method, path, body=None):
+        conn = http.client.HTTPConnection(*self.server.server_address)
+        try:
+            conn.request(method, path, body,
+                         {'Content-Type': 'application/json'})
+            resp = conn.getresponse()
+            return resp.status, json.loads(resp.read().decode())
+        finally:
+            conn.close()
+
+    def test_classify(self):
+        labels, scores = classify_reviews(self.texts, STOPWORDS, self.model)
+        status, response = self.request('POST', '/classify',
+                                        json.dumps({'reviews': self.texts}))
+
+        self.assertEqual(status, 200)
+        self.assertEqual([result['label'] for result in response['results']],
+                         labels.tolist())
+        for result, row in zip(response['results'], scores.tolist()):
+            self.assertEqual(result['scores'],
+                             dict(zip(self.model.classes, row)))
+
+        status, response = self.request('POST', '/classify',
+                                        json.dumps({'review': self.texts[0]}))
+        self.assertEqual(status, 200)
+        self.assertEqual(response['label'], labels[0])
+
+    def test_keep_alive(self):
+        conn = http.client.HTTPConnection(*self.server.server_address)
+        try:
+            for text in self.texts[:5]:
+                conn.request('POST', '/classify',
+                             json.dumps({'review': text}),
+                             {'Content-Type': 'application/json'})
+                resp = conn.getresponse()
+                self.assertEqual(resp.status, 200)
+                resp.read()
+        finally:
+            conn.close()
+
+    def test_bad_requests(self):
+        for body in ['not json', '{}', '{"reviews": "a review"}',
+                     '{"reviews": [1, 2]}', '[]']:
+            status, response = self.request('POST', '/classify', body)
+            self.assertEqual(status, 400, body)
+            self.assertIn('error', response)
+
+        self.assertEqual(self.request('GET', '/missing')[0], 404)
+        self.assertEqual(self.request('POST', '/missing', '{}')[0], 404)
+
+    def test_stats(self):
+        self.request('POST', '/classify', json.dumps({'review': 'good'}))
+        status, stats = self.request('GET', '/stats')
+
+        self.assertEqual(status, 200)
+        self.assertGreaterEqual(stats['requests'], 1)
+        self.assertGreaterEqual(stats['reviews'], 1)
+        self.assertIsNotNone(stats['p50_ms'])
+
+
+if __name__ == '__main__':
+    unittest.main()
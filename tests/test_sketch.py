@@ -0,0 +1,117 @@
+"""
+Tests of cs4041.sketch: the count-min sketch and the counting of the
+vocabulary within a memory budget.
+
+    python3 -m unittest discover tests
+"""
+from collections import Counter
+import unittest
+import numpy as np
+from benchmarks.synthetic import make_reviews
+from cs4041.sketch import (CountMinSketch, count_combined_vocabulary,
+                           count_vocabulary, count_words_and_bigrams)
+from cs4041.stopwords import Normalizer
+from cs4041.vocabulary import (get_combined_frequencies,
+                               get_vocabulary_from_frequencies,
+                               get_word_frequencies)
+
+STOPWORDS = ['the', 'a', 'and', 'is']
+
+
+def make_chunks(reviews, chunk_size):
+    """
+    Split the reviews of each class into chunks of chunk_size reviews.
+    """
+    length = max(len(review_list) for review_list in reviews.values())
+
+    return [{class_: review_list[start:start + chunk_size]
+             for class_, review_list in reviews.items()}
+            for start in range(0, length, chunk_size)]
+
+
+class CountMinSketchTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.counter = Counter({'w{}'.format(i): int(count) for i, count in
+                                enumerate(rng.zipf(1.5, 2000) % 1000)})
+
+    def test_never_underestimates(self):
+        sketch = CountMinSketch(256, depth=3)
+        tokens = list(self.counter.keys())
+        estimates = sketch.add(self.counter)
+        actual = np.array([self.counter[token] for token in tokens])
+
+        self.assertTrue(np.all(estimates >= actual))
+        # Tokens added later only ever raise the estimates
+        self.assertTrue(np.all(sketch.estimate(tokens) >= estimates))
+        self.assertLess(np.count_nonzero(estimates > actual), len(tokens))
+
+    def test_exact_without_collisions(self):
+        sketch = CountMinSketch(1 << 20)
+        half = Counter(dict(list(self.counter.items())[:1000]))
+        sketch.add(half)
+        sketch.add(self.counter)
+        tokens = list(self.counter.keys())
+
+        np.testing.assert_array_equal(
+            sketch.estimate(tokens),
+            [self.counter[token] + half[token] for token in tokens])
+
+    def test_for_memory(self):
+        sketch = CountMinSketch.for_memory(100000, depth=4)
+
+        self.assertLessEqual(sketch.table.nbytes, 100000)
+        self.assertGreater(sketch.table.nbytes, 50000)
+
+
+class CountVocabularyTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        reviews = make_reviews(600, vocabulary_size=2000,
+                               stopwords=STOPWORDS, seed=5)
+        cls.reviews = Normalizer(STOPWORDS).clean_reviews(reviews)
+        cls.chunks = make_chunks(cls.reviews, 50)
+
+    def test_count_words_and_bigrams(self):
+        strings = self.reviews['+'][:50]
+        expected = Counter()
+
+        for string in strings:
+            words = string.split()
+            expected.update(words)
+            expected.update(' '.join(pair) for pair in zip(words, words[1:]))
+
+        self.assertEqual(count_words_and_bigrams(strings), expected)
+
+    def check_counts(self, counts, get_frequencies, min_occur):
+        class_doc_count, frequency, class_counts = counts
+        exact = {class_: get_frequencies(review_list)
+                 for class_, review_list in self.reviews.items()}
+        vocabulary = get_vocabulary_from_frequencies(list(exact.values()),
+                                                     min_occur)
+
+        for class_, review_list in self.reviews.items():
+            self.assertEqual(class_doc_count[class_], len(review_list))
+            self.assertEqual(class_counts[class_],
+                             sum(exact[class_].values()))
+            self.assertEqual(frequency[class_],
+                             Counter({token: count for token, count
+                                      in exact[class_].items()
+                                      if token in vocabulary}))
+
+    def test_count_vocabulary(self):
+        # A small sketch, so that many tokens collide
+        counts = count_vocabulary(lambda: iter(self.chunks), min_occur=2,
+                                  memory_budget=4096)
+        self.check_counts(counts, get_word_frequencies, 2)
+
+    def test_count_combined_vocabulary(self):
+        counts = count_combined_vocabulary(lambda: iter(self.chunks),
+                                           min_occur=3, memory_budget=4096)
+        self.check_counts(counts, get_combined_frequencies, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+Tests of cs4041.stopwords: the Normalizer against the regular expression
+processing of older versions.
+
+    python3 -m unittest discover tests
+"""
+import re
+import unittest
+from benchmarks.synthetic import make_reviews
+from cs4041.stopwords import (Normalizer, as_normalizer, clean_string,
+                              rm_stopwords)
+
+STOPWORDS = ['the', 'a', 'and', 'is']
+
+
+def reference_clean(string, stopwords):
+    """
+    Process a string as older versions of stopwords.clean_string() did.
+    """
+    string = re.sub(r'[^a-zA-Z\s]+', '', string).lower()
+
+    return ' '.join(word for word in string.split() if word not in stopwords)
+
+
+class NormalizerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        reviews = make_reviews(200, vocabulary_size=500, stopwords=STOPWORDS,
+                               seed=4)
+        cls.strings = reviews['+'] + reviews['-'] + [
+            '', '   ', 'The END!!', '5/5 :)', 'a\tb\nC  d',
+            'Café naïve Über résumé',
+            'ALL the THINGS and MORE', '☃ snow man ☃',
+        ]
+        cls.normalizer = Normalizer(STOPWORDS)
+
+    def test_same_as_reference(self):
+        for string in self.strings:
+            self.assertEqual(self.normalizer.clean(string),
+                             reference_clean(string, STOPWORDS))
+            self.assertEqual(clean_string(string, STOPWORDS),
+                             reference_clean(string, STOPWORDS))
+
+    def test_tokens(self):
+        self.assertEqual(self.normalizer.tokens('The Plot is GOOD, and fun!'),
+                         ['plot', 'good', 'fun'])
+        self.assertEqual(self.normalizer.tokens('the a and is'), [])
+        self.assertEqual(self.normalizer.tokenize(['A b', '', 'c']),
+                         [['b'], [], ['c']])
+
+    def test_rm_stopwords_drops_empty(self):
+        expected = [cleaned for cleaned in (reference_clean(string, STOPWORDS)
+                                            for string in self.strings)
+                    if cleaned]
+
+        self.assertEqual(rm_stopwords(self.strings, STOPWORDS), expected)
+        self.assertEqual(self.normalizer.rm_stopwords(self.strings,
+                                                      workers=2,
+                                                      chunksize=50),
+                         expected)
+
+    def test_clean_reviews(self):
+        reviews = {'+': ['Good film!', 'the'], '-': ['Bad, bad plot.']}
+
+        self.assertEqual(self.normalizer.clean_reviews(reviews),
+                         {'+': ['good film'], '-': ['bad bad plot']})
+        self.assertEqual(
+            list(self.normalizer.clean_review_chunks([reviews, reviews],
+                                                     workers=2)),
+            [self.normalizer.clean_reviews(reviews)] * 2)
+
+    def test_as_normalizer(self):
+        self.assertIs(as_normalizer(self.normalizer), self.normalizer)
+        self.assertEqual(as_normalizer(STOPWORDS).stopwords,
+                         frozenset(STOPWORDS))
+
+
+if __name__ == '__main__':
+    unittest.main()
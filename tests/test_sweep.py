@@ -0,0 +1,117 @@
+"""
+Tests of cs4041.sweep: every point of the grid against a cross evaluation
+with the same parameters.
+
+    python3 -m unittest discover tests
+"""
+import os
+import tempfile
+import unittest
+from benchmarks.synthetic import make_reviews
+from cs4041.classify import calculate_accuracy
+from cs4041.corpus import Corpus, write_corpus
+from cs4041.evaluate import (evaluate, evaluate_with_bigram_features,
+                             join_reviews, split_reviews)
+from cs4041.stopwords import Normalizer
+from cs4041.sweep import sweep
+from cs4041.train import get_model_from_frequencies
+from cs4041.vocabulary import get_word_frequencies
+
+STOPWORDS = ['the', 'a', 'and', 'is']
+SEED = 5
+
+
+def smoothed_accuracies(reviews, min_occur, alpha, no_of_parts=10,
+                        seed=None):
+    """
+    Cross evaluate models with word features and add-alpha smoothing,
+    training a model on the remaining parts for every part.
+    """
+    normalizer = Normalizer(STOPWORDS)
+    parts = split_reviews(reviews, no_of_parts, seed)
+    accuracies = []
+
+    for i, part in enumerate(parts):
+        training = normalizer.clean_reviews(
+            join_reviews(parts[:i] + parts[i+1:]))
+        model = get_model_from_frequencies(
+            {class_: len(review_list)
+             for class_, review_list in training.items()},
+            {class_: get_word_frequencies(review_list)
+             for class_, review_list in training.items()},
+            min_occur, alpha=alpha)
+        accuracies.append(calculate_accuracy(part, normalizer, model))
+
+    return accuracies
+
+
+class SweepTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.reviews = make_reviews(600, vocabulary_size=1000,
+                                   stopwords=STOPWORDS, seed=14)
+
+    def test_same_as_evaluate(self):
+        results = sweep(self.reviews, STOPWORDS, min_occurs=[1, 2, 3],
+                        alphas=[1], seed=SEED)
+
+        self.assertEqual(sorted(results),
+                         [(1, None, 1), (2, None, 1), (3, None, 1)])
+        self.assertEqual(results[(2, None, 1)],
+                         evaluate(self.reviews, STOPWORDS, seed=SEED))
+        for min_occur in [1, 3]:
+            self.assertEqual(results[(min_occur, None, 1)],
+                             evaluate(self.reviews, STOPWORDS, min_occur,
+                                      seed=SEED))
+
+    def test_alphas(self):
+        results = sweep(self.reviews, STOPWORDS, min_occurs=[2],
+                        alphas=[0.1, 0.5, 2], seed=SEED)
+
+        for alpha in [0.1, 0.5, 2]:
+            self.assertEqual(results[(2, None, alpha)],
+                             smoothed_accuracies(self.reviews, 2, alpha,
+                                                 seed=SEED))
+
+    def test_bigrams_same_as_evaluate(self):
+        results = sweep(self.reviews, STOPWORDS, min_occurs=[2, 3],
+                        alphas=[1], min_bigram_occurs=[3],
+                        bigram_features=True, seed=SEED)
+
+        for min_occur in [2, 3]:
+            self.assertEqual(results[(min_occur, 3, 1)],
+                             evaluate_with_bigram_features(
+                                 self.reviews, STOPWORDS, min_occur,
+                                 seed=SEED))
+
+    def test_workers(self):
+        self.assertEqual(
+            sweep(self.reviews, STOPWORDS, min_occurs=[1, 2], alphas=[0.5, 1],
+                  min_bigram_occurs=[2, 3], bigram_features=True, workers=2,
+                  seed=SEED),
+            sweep(self.reviews, STOPWORDS, min_occurs=[1, 2], alphas=[0.5, 1],
+                  min_bigram_occurs=[2, 3], bigram_features=True, seed=SEED))
+
+    def test_corpus(self):
+        cleaned = Normalizer(STOPWORDS).clean_reviews(self.reviews)
+
+        with tempfile.TemporaryDirectory() as dirname:
+            fname = os.path.join(dirname, 'corpus.bin')
+            write_corpus(((class_, review) for class_, review_list
+                          in cleaned.items()
+                          for review in review_list), fname)
+            corpus = Corpus(fname)
+
+            for bigram_features in [False, True]:
+                self.assertEqual(
+                    sweep(corpus, STOPWORDS, min_occurs=[2, 3],
+                          alphas=[0.5, 1], bigram_features=bigram_features,
+                          seed=SEED),
+                    sweep(cleaned, STOPWORDS, min_occurs=[2, 3],
+                          alphas=[0.5, 1], bigram_features=bigram_features,
+                          seed=SEED))
+
+
+if __name__ == '__main__':
+    unittest.main()
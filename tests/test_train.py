@@ -0,0 +1,96 @@
+"""
+Tests of cs4041.train: the models trained from a corpus file and within a
+memory budget against the models trained from the reviews in memory.
+
+    python3 -m unittest discover tests
+"""
+import os
+import tempfile
+import unittest
+import numpy as np
+from benchmarks.synthetic import make_reviews
+from cs4041.corpus import Corpus, write_corpus
+from cs4041.modelfile import write_model
+from cs4041.review import iter_review_chunks, iter_reviews, write_reviews
+from cs4041.stopwords import Normalizer
+from cs4041.train import (read_trained_model, train, train_corpus,
+                          train_with_bigram_features,
+                          train_with_memory_budget, write_trained_model)
+
+STOPWORDS = ['the', 'a', 'and', 'is']
+
+
+class TrainTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.reviews = make_reviews(600, vocabulary_size=2000,
+                                   stopwords=STOPWORDS, seed=6)
+        cls.dirname = tempfile.mkdtemp()
+        cls.reviews_fname = os.path.join(cls.dirname, 'reviews.txt')
+        write_reviews(cls.reviews, cls.reviews_fname, seed=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        for fname in os.listdir(cls.dirname):
+            os.remove(os.path.join(cls.dirname, fname))
+        os.rmdir(cls.dirname)
+
+    def assertSameModel(self, model, expected):
+        self.assertEqual(list(model.tokens), list(expected.tokens))
+        self.assertEqual(sorted(model.classes), sorted(expected.classes))
+
+        for class_ in expected.classes:
+            i = model.class_index[class_]
+            j = expected.class_index[class_]
+            np.testing.assert_allclose(model.log_likelihoods[i],
+                                       expected.log_likelihoods[j])
+            self.assertAlmostEqual(model.log_priors[i],
+                                   expected.log_priors[j])
+
+    def test_memory_budget(self):
+        # A sketch far too small to hold every word without collisions
+        model = train_with_memory_budget(
+            lambda: iter_review_chunks(self.reviews_fname, 100), STOPWORDS,
+            memory_budget=4096)
+
+        self.assertSameModel(model, train(self.reviews, STOPWORDS))
+
+    def test_memory_budget_bigrams(self):
+        model = train_with_memory_budget(
+            lambda: iter_review_chunks(self.reviews_fname, 100), STOPWORDS,
+            min_occur=3, bigram_features=True, memory_budget=4096)
+
+        self.assertSameModel(model, train_with_bigram_features(
+            self.reviews, STOPWORDS, min_occur=3))
+
+    def test_corpus(self):
+        normalizer = Normalizer(STOPWORDS)
+        corpus_fname = os.path.join(self.dirname, 'corpus.bin')
+        write_corpus(((class_, normalizer.clean(review_text))
+                      for class_, review_text
+                      in iter_reviews(self.reviews_fname)),
+                     corpus_fname)
+        corpus = Corpus(corpus_fname)
+
+        self.assertSameModel(train_corpus(corpus),
+                             train(self.reviews, STOPWORDS))
+        self.assertSameModel(
+            train_corpus(corpus, min_occur=3, bigram_features=True),
+            train_with_bigram_features(self.reviews, STOPWORDS, min_occur=3))
+
+    def test_read_trained_model(self):
+        model = train(self.reviews, STOPWORDS)
+        pickle_fname = os.path.join(self.dirname, 'model.p')
+        tuple_fname = os.path.join(self.dirname, 'tuple.p')
+        binary_fname = os.path.join(self.dirname, 'model.bin')
+        write_trained_model(model, pickle_fname)
+        write_trained_model(model.to_tuple(), tuple_fname)
+        write_model(model, binary_fname)
+
+        for fname in [pickle_fname, tuple_fname, binary_fname]:
+            self.assertSameModel(read_trained_model(fname), model)
+
+
+if __name__ == '__main__':
+    unittest.main()